@@ -1,11 +1,26 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session
-from utils.story_generator import StoryGenerator
-from utils.config import AVAILABLE_MODELS, EXPERTISE_LEVELS, TONE_STYLES, WRITING_STYLES
+from flask import Flask, Response, render_template, request, jsonify, send_file, redirect, url_for, session
+from utils.story_generator import get_story_generator
+from utils.config import AVAILABLE_MODELS, EXPERTISE_LEVELS, TONE_STYLES, WRITING_STYLES, JOB_WORKER_ENABLED
 from utils.prompt_routes import prompt_routes
 from utils.prompt_preview import prompt_preview
+from utils.batch_routes import batch_routes
+from utils.job_routes import job_routes
+from utils.metrics_routes import metrics_routes, instrument_app, traced
+from utils.story_routes import story_routes
+from utils.story_store import story_store, store_streamed_story
+from utils.topic_index import topic_index, find_reusable, offer_similar, replay_story, reuse_mode
+from utils.model_client import run_blocking
+from utils.client_pool import key_fingerprint
+from utils.job_queue import job_queue
+from utils.streaming import iter_sse
+from utils.generation_cache import generation_cache
+from utils.reference_cache import reference_cache
+from utils.context_cache import context_cache
+from utils.request_utils import admit_story_request, get_api_key, parse_generation_request
+from utils.retry_policy import breaker_states
+from utils.model_router import model_router
 from dotenv import load_dotenv
 import os
-import asyncio
 import io
 
 app = Flask(__name__)
@@ -19,9 +34,18 @@ app.config['PERMANENT_SESSION_LIFETIME'] = int(os.getenv('MAX_EXECUTION_TIME', 3
 # Register the blueprints
 app.register_blueprint(prompt_routes)
 app.register_blueprint(prompt_preview)
+app.register_blueprint(batch_routes)
+app.register_blueprint(job_routes)
+app.register_blueprint(metrics_routes)
+app.register_blueprint(story_routes)
+instrument_app(app)
 
-def get_api_key():
-    return os.getenv('GEMINI_API_KEY') or session.get('api_key')
+# Pick up queued jobs, including ones interrupted by a previous crash
+if JOB_WORKER_ENABLED:
+    job_queue.start_worker()
+
+# Index stored stories' topics so near-duplicate requests can reuse them
+topic_index.start()
 
 @app.route('/')
 def index():
@@ -45,6 +69,7 @@ def setup():
     return render_template('setup.html')
 
 @app.route('/generate', methods=['POST'])
+@traced
 async def generate_story():
     try:
         api_key = get_api_key()
@@ -53,44 +78,57 @@ async def generate_story():
                 'error': 'API key not found. Please set up your API key first.'
             }), 401
 
-        data = request.json
-        topic = data.get('topic')
-        model_name = data.get('model', 'gemini-2.0-flash-exp')
-        expertise = data.get('expertise')
-        tone = data.get('tone')
-        context = data.get('context', '')
-        youtube_urls = data.get('youtube_urls', [])
-        total_parts = min(int(data.get('total_parts', 2)), 2)  # Limit parts
-        prompt_id = data.get('prompt_id', 'default')
-        writing_style = data.get('writing_style', 'balanced')
-
-        if not all([topic, expertise, tone]):
+        params = parse_generation_request(request.json)
+
+        if not all([params['topic'], params['expertise'], params['tone']]):
             return jsonify({
                 'error': 'Missing required fields'
             }), 400
 
-        generator = StoryGenerator(model_name, api_key)
-        story = await generator.generate_complete_story(
-            topic=topic,
-            expertise=expertise,
-            tone=tone,
-            context=context,
-            youtube_urls=youtube_urls,
-            total_parts=total_parts,
-            prompt_id=prompt_id,
-            writing_style=writing_style
+        model_name = params.pop('model_name')
+        generator = get_story_generator(model_name, api_key)
+        similar, reusable = await find_reusable(
+            topic_index, params['topic'], model_name, params, key_fingerprint(api_key),
+            reuse_mode(request.json.get('reuse'))
         )
-
-        try:
-            error_check = json.loads(story)
-            if isinstance(error_check, dict) and 'error' in error_check:
-                return jsonify({'error': error_check['error']}), 500
-        except json.JSONDecodeError:
-            pass
+        if reusable:
+            match, parts = reusable
+            return jsonify({
+                'success': True,
+                'reused': True,
+                'story_id': match['story_id'],
+                'similarity': match['similarity'],
+                'story': '\n\n'.join(parts),
+                'parts': [
+                    {'part': number, 'text': text, 'chars': len(text)}
+                    for number, text in enumerate(parts, 1)
+                ]
+            })
+
+        rejected = await admit_story_request(api_key, params)
+        if rejected:
+            return rejected
+
+        result = await generator.generate_story(**params)
+        if result.error:
+            return jsonify({'error': result.error}), 500
+
+        story_id = None
+        if story_store.enabled and result.parts:
+            try:
+                story_id = await run_blocking(
+                    story_store.save, [part.text for part in result.parts], params['topic'], model_name,
+                    params, key_fingerprint(api_key)
+                )
+                await run_blocking(topic_index.refresh)
+            except Exception as e:
+                print(f"Story store write failed: {str(e)}")
 
         return jsonify({
             'success': True,
-            'story': story
+            'story_id': story_id,
+            'similar': similar,
+            **result.to_dict()
         })
 
     except Exception as e:
@@ -98,16 +136,85 @@ async def generate_story():
             'error': str(e)
         }), 500
 
+@app.route('/generate/stream', methods=['POST'])
+async def generate_story_stream():
+    """Stream the story as Server-Sent Events while the model produces it.
+
+    Async so that the ASGI entry (asgi.py) streams it on the server's loop.
+    """
+    try:
+        api_key = get_api_key()
+        if not api_key:
+            return jsonify({
+                'error': 'API key not found. Please set up your API key first.'
+            }), 401
+
+        params = parse_generation_request(request.json)
+
+        if not all([params['topic'], params['expertise'], params['tone']]):
+            return jsonify({
+                'error': 'Missing required fields'
+            }), 400
+
+        model_name = params.pop('model_name')
+        generator = get_story_generator(model_name, api_key)
+        similar, reusable = await find_reusable(
+            topic_index, params['topic'], model_name, params, key_fingerprint(api_key),
+            reuse_mode(request.json.get('reuse'))
+        )
+        if reusable:
+            events = replay_story(*reusable)
+        else:
+            rejected = await admit_story_request(api_key, params)
+            if rejected:
+                return rejected
+            events = store_streamed_story(
+                generator.stream_complete_story(**params), story_store, model_name, params,
+                key_fingerprint(api_key), on_saved=topic_index.refresh
+            )
+            if similar:
+                events = offer_similar(similar, events)
+
+        return Response(
+            iter_sse(events),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'  # Disable proxy buffering
+            }
+        )
+
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+@app.route('/health/models', methods=['GET'])
+def model_health():
+    return jsonify(breaker_states())
+
+@app.route('/health/router', methods=['GET'])
+def router_health():
+    """Recent latency percentiles and current hedge delay per model and kind of call."""
+    return jsonify(model_router.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    stats = generation_cache.stats()
+    stats['references'] = reference_cache.stats()
+    stats['context'] = context_cache.stats()
+    return jsonify(stats)
+
 @app.route('/download', methods=['POST'])
 def download_story():
+    """Download a story sent by the client; stored stories use /download/<id>."""
     try:
         story = request.json.get('story', '')
         if not story:
             return jsonify({'error': 'No story content provided'}), 400
 
-        file_stream = io.StringIO(story)
         return send_file(
-            io.BytesIO(file_stream.getvalue().encode('utf-8')),
+            io.BytesIO(story.encode('utf-8')),
             mimetype='text/plain',
             as_attachment=True,
             download_name='generated_story.txt'
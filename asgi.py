@@ -0,0 +1,10 @@
+from app import app as flask_app
+from utils.asgi_server import AsgiApp
+import os
+
+# Serve with an ASGI server, e.g.: uvicorn asgi:app --timeout-graceful-shutdown 60
+app = AsgiApp(flask_app)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
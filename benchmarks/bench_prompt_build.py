@@ -0,0 +1,44 @@
+"""Microbenchmark: cost of building one part's prompt.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_prompt_build [--parts 5] [--repeat 2000]
+"""
+import argparse
+import timeit
+
+from utils.prompt_builder import build_story_prompt
+from utils.prompt_manager import prompt_manager
+
+
+def bench_parts(total_parts: int, repeat: int, custom_template=None):
+    previous = ['Summary of an earlier part. ' * 10] * (total_parts - 1)
+    results = []
+    for part in range(1, total_parts + 1):
+        seconds = timeit.timeit(
+            lambda: build_story_prompt(
+                'AI in education', 'educator', 'casual', 'Some extra context',
+                part, total_parts, previous[:part - 1],
+                custom_template=custom_template, writing_style='practical'
+            ),
+            number=repeat
+        )
+        results.append((part, seconds / repeat * 1e6))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--parts', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    custom = prompt_manager.get_prompt('default')['template']
+    for label, template in (('built-in', None), ('custom template', custom)):
+        print(f"{label}:")
+        for part, micros in bench_parts(args.parts, args.repeat, template):
+            print(f"  part {part}/{args.parts}: {micros:8.2f} us")
+
+
+if __name__ == '__main__':
+    main()
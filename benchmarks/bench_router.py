@@ -0,0 +1,90 @@
+"""Benchmark: story latency on a model with a slow tail, with and without hedging.
+
+A share of fake model calls (--slow-rate) waits --slow-latency seconds
+before its first token instead of --latency. Each mode runs the same
+one-part stories; the router's latency history is warmed up first so the
+hedge delay is the measured p90 rather than the default.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_router [--stories 200] [--concurrency 20] [--slow-rate 0.05]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stories', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.2, help='usual seconds to first token')
+    parser.add_argument('--slow-rate', type=float, default=0.05, help='share of calls in the tail')
+    parser.add_argument('--slow-latency', type=float, default=3.0, help='seconds to first token in the tail')
+    return parser.parse_args()
+
+
+args = parse_args()
+scratch = tempfile.mkdtemp(prefix='storyx-bench-')
+# Must be set before any utils module reads the configuration
+os.environ.update(
+    MODEL_BACKEND='fake', GEMINI_API_KEY='benchmark-key', JOB_WORKER_ENABLED='false',
+    GENERATION_CACHE_PATH='', REFERENCE_CACHE_PATH='',
+    ADMISSION_PATH='', STORY_STORE_PATH='', TOPIC_REUSE='off', TOPIC_INDEX_REFRESH='3600',
+    JOB_QUEUE_PATH=os.path.join(scratch, 'jobs.db'),
+    BATCH_STORE_PATH=os.path.join(scratch, 'batches.db'),
+    FAKE_MODEL_LATENCY=str(args.latency), FAKE_MODEL_TOKENS_PER_SEC='5000',
+    FAKE_MODEL_OUTPUT_TOKENS='300', FAKE_MODEL_SLOW_RATE=str(args.slow_rate),
+    FAKE_MODEL_SLOW_LATENCY=str(args.slow_latency), ROUTER_HEDGE_MIN_DELAY='0.05',
+    MODEL_CONCURRENCY=str(args.concurrency * 2),
+    MODEL_STREAM_CONCURRENCY=str(args.concurrency * 2)
+)
+
+import asyncio
+import time
+
+from benchmarks.run_suite import STORY_PARAMS, summarize
+from utils.metrics import metrics
+from utils.model_router import model_router
+from utils.story_generator import get_story_generator
+
+MODEL = 'gemini-1.5-flash'
+
+
+async def run_stories(count, concurrency):
+    generator = get_story_generator(MODEL)
+    params = dict(STORY_PARAMS, total_parts=1)
+    gate = asyncio.Semaphore(concurrency)
+    latencies, errors = [], [0]
+
+    async def one():
+        async with gate:
+            started = time.perf_counter()
+            result = await generator.generate_story(**params)
+            latencies.append(time.perf_counter() - started)
+            if result.error:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def main():
+    asyncio.run(run_stories(model_router.min_samples * 2, args.concurrency))
+    print(f"hedge delay after warm-up: {model_router.hedge_delay(MODEL, 'stream'):.3f}s "
+          f"(p90 of {len(model_router.tracker(MODEL, 'stream'))} streams)")
+
+    print(f"{'mode':10s} {'errors':>6s} {'p50 ms':>10s} {'p95 ms':>10s} {'p99 ms':>10s} {'hedges':>7s}")
+    for mode, enabled in (('no hedge', False), ('hedge', True)):
+        model_router.hedge_enabled = enabled
+        hedges = metrics.value('router_decisions', decision='hedge', model=MODEL)
+        result = asyncio.run(run_stories(args.stories, args.concurrency))
+        hedges = metrics.value('router_decisions', decision='hedge', model=MODEL) - hedges
+        print(f"{mode:10s} {result['errors']:6d} {result['p50_ms']:10.1f} {result['p95_ms']:10.1f} "
+              f"{result['p99_ms']:10.1f} {int(hedges):7d}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
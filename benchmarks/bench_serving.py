@@ -0,0 +1,138 @@
+"""Benchmark: concurrent /generate requests under WSGI (gunicorn) vs ASGI (uvicorn).
+
+Starts each server on the offline fake model backend, fires N concurrent
+clients at POST /generate and reports p50/p95/p99 latency, throughput and
+errors per mode. See benchmarks/README.md for how to read the results.
+
+Run from the repository root (needs gunicorn and uvicorn installed):
+
+    python -m benchmarks.bench_serving [--clients 50,200] [--modes wsgi,asgi]
+        [--wsgi-threads 8] [--latency 2]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.run_suite import summarize
+
+SERVERS = {
+    # The usual deployment: sync workers, one thread pinned per request
+    'wsgi': lambda port, args: [
+        sys.executable, '-m', 'gunicorn', 'wsgi:app', '--bind', f'127.0.0.1:{port}',
+        '--workers', '1', '--threads', str(args.wsgi_threads), '--timeout', '120'
+    ],
+    'asgi': lambda port, args: [
+        sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+        '--timeout-graceful-shutdown', '30', '--log-level', 'warning'
+    ]
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def fire(port, clients, parts):
+    """Send one request per client, all at once, and summarize the latencies."""
+    latencies, errors, lock = [], [0], threading.Lock()
+
+    def client(index):
+        payload = {
+            'topic': f'How cities manage water, take {index}', 'expertise': 'educator',
+            'tone': 'neutral', 'model': 'gemini-1.5-flash', 'total_parts': parts, 'no_cache': True
+        }
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{port}/generate', data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                response.read()
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError):
+            ok = False
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors[0] += 1
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def run_mode(mode, args, clients):
+    port = free_port()
+    scratch = tempfile.mkdtemp(prefix='storyx-bench-')
+    env = dict(
+        os.environ,
+        MODEL_BACKEND='fake', GEMINI_API_KEY='benchmark-key', JOB_WORKER_ENABLED='false',
+        GENERATION_CACHE_PATH='', REFERENCE_CACHE_PATH='',
+        ADMISSION_PATH='', STORY_STORE_PATH='', TOPIC_REUSE='off', TOPIC_INDEX_REFRESH='3600',
+        JOB_QUEUE_PATH=os.path.join(scratch, 'jobs.db'),
+        BATCH_STORE_PATH=os.path.join(scratch, 'batches.db'),
+        FAKE_MODEL_LATENCY=str(args.latency), FAKE_MODEL_TOKENS_PER_SEC='2000',
+        FAKE_MODEL_OUTPUT_TOKENS='500', MODEL_CONCURRENCY=str(max(clients) * args.parts),
+        MODEL_STREAM_CONCURRENCY=str(max(clients) * args.parts)
+    )
+    server = subprocess.Popen(SERVERS[mode](port, args), env=env)
+    try:
+        wait_for_port(port)
+        return {str(count): fire(port, count, args.parts) for count in clients}
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', default='50,200', help='comma-separated concurrency levels')
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--wsgi-threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--latency', type=float, default=2.0, help='fake model seconds to first token')
+    parser.add_argument('--parts', type=int, default=1, help='story parts per request')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    clients = [int(count) for count in args.clients.split(',')]
+    results = {mode: run_mode(mode, args, clients) for mode in args.modes.split(',')}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':6s} {'clients':>7s} {'errors':>6s} {'p50 ms':>10s} {'p95 ms':>10s} "
+          f"{'p99 ms':>10s} {'req/s':>8s}")
+    for mode, by_clients in results.items():
+        for count, result in by_clients.items():
+            print(f"{mode:6s} {count:>7s} {result['errors']:6d} {result['p50_ms']:10.1f} "
+                  f"{result['p95_ms']:10.1f} {result['p99_ms']:10.1f} {result['throughput_per_s']:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
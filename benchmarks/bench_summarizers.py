@@ -0,0 +1,127 @@
+"""Benchmark: LLM vs local extractive summaries between story parts.
+
+Offline (default) it times the extractive summarizer on each part of a
+story and reports how much of each part's vocabulary its summary keeps.
+With ``--live`` it also generates the next part from each kind of summary
+with the real model and reports summarizer latency and the word overlap of
+the two continuations.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_summarizers [--story parts.txt] [--words 60] [--repeat 200]
+    GEMINI_API_KEY=... python -m benchmarks.bench_summarizers --live gemini-1.5-flash
+"""
+import argparse
+import asyncio
+import re
+import time
+
+from utils.config import EXTRACTIVE_SUMMARY_WORDS
+from utils.summary_generator import extractive_summary
+
+# Parts are separated by a line holding only '==='
+SAMPLE_STORY = """
+Cities have always grown around water. Rivers carried goods, fed crops and carried waste away,
+and the first large settlements appeared where a reliable supply met fertile land. Over
+centuries engineers learned to move water further, from Roman aqueducts to the reservoirs that
+still supply many European capitals. Each step let cities grow beyond the limits of their
+local rivers.
+
+The industrial era changed the scale of the problem. Factories needed water for cooling and
+processing, and crowded districts suffered repeated cholera outbreaks until sewers separated
+drinking water from waste. Public health became an engineering discipline. The great sewer
+projects of the nineteenth century were among the largest public works of their time.
+===
+Today the pressure comes from both directions. Populations keep rising while droughts grow
+longer, and aquifers that took thousands of years to fill are drained in decades. Some
+cities now recycle wastewater to drinking standard, a practice that was unthinkable a
+generation ago. Singapore and Orange County show that public trust can follow careful
+engineering and open communication.
+
+Leaks remain a quiet crisis. Many networks lose a quarter of their treated water before it
+reaches a tap. Acoustic sensors and pressure management can find and reduce those losses,
+but replacing old pipes is slow and expensive. Utilities must decide where each repair will
+save the most water.
+===
+Pricing is the most contested tool. When water is cheap, people use more of it, but steep
+prices fall hardest on poor households. Tiered tariffs try to square the circle by keeping a
+basic allowance affordable while charging more for heavy use. The design of those tiers
+decides who carries the cost of scarcity.
+
+The next decades will test whether cities can adapt faster than their climates change.
+Desalination, recycling, smarter networks and fair pricing are all part of the answer. None
+of them is enough alone, and each depends on public institutions that people trust.
+"""
+
+
+def load_parts(path=None):
+    text = open(path, encoding='utf-8').read() if path else SAMPLE_STORY
+    return [part.strip() for part in re.split(r'^===\s*$', text, flags=re.M) if part.strip()]
+
+
+def words(text):
+    return set(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+def overlap(a, b):
+    """Jaccard overlap of the word sets of two texts."""
+    a, b = words(a), words(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def bench_offline(parts, max_words, repeat):
+    print("extractive summarizer (offline):")
+    for number, part in enumerate(parts, 1):
+        seconds = time_per_call(lambda: extractive_summary(part, max_words), repeat)
+        summary = extractive_summary(part, max_words)
+        kept = len(words(summary) & words(part)) / len(words(part))
+        print(f"  part {number}: {seconds * 1e6:8.1f} us, "
+              f"{len(summary.split()):4d}/{len(part.split())} words, vocabulary kept {kept:.0%}")
+
+
+def time_per_call(call, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - started) / repeat
+
+
+async def bench_live(parts, model_name):
+    from utils.story_generator import get_story_generator
+
+    generator = get_story_generator(model_name)
+    topic = 'How cities manage water'
+    print(f"continuations with {model_name}:")
+    for number in range(1, len(parts)):
+        continuations = {}
+        for name in ('llm', 'extractive'):
+            summarizer = generator.get_summarizer(name, use_cache=False)
+            started = time.perf_counter()
+            summary = await summarizer.summarize(parts[number - 1])
+            elapsed = time.perf_counter() - started
+            prompt = generator.build_prompt(
+                topic, 'educator', 'neutral', None,
+                number + 1, len(parts), [summary or ''], 'default', 'balanced'
+            )
+            continuations[name] = await generator.safe_generate_content(prompt, use_cache=False)
+            print(f"  part {number + 1} from {name:10s} summary: summarize {elapsed * 1000:8.1f} ms")
+        print(f"  part {number + 1} continuation overlap: "
+              f"{overlap(continuations['llm'], continuations['extractive']):.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--story', help="text file with parts separated by '===' lines")
+    parser.add_argument('--words', type=int, default=EXTRACTIVE_SUMMARY_WORDS, help='summary length')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--live', metavar='MODEL', help='also compare continuations with this model')
+    args = parser.parse_args()
+
+    parts = load_parts(args.story)
+    bench_offline(parts, args.words, args.repeat)
+    if args.live:
+        asyncio.run(bench_live(parts, args.live))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Microbenchmark: topic classification cost as the taxonomy grows.
+
+Compares a substring scan over every keyword (how get_topic_category used
+to work) with the word automaton in utils/topic_classifier.py, on synthetic
+taxonomies of increasing size. The classifier's LRU is disabled so every
+call does the full work.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_topic_classifier [--sizes 1000,10000,100000] [--repeat 2000]
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from utils.config import TOPIC_TAXONOMY_PATH
+from utils.topic_classifier import TopicClassifier, get_classifier
+
+TOPICS = [
+    'AI in education',
+    'How small businesses use machine learning for marketing strategy',
+    'The history of jazz music and its influence on modern songwriting',
+    'Quantum computing explained for high school students',
+    'Why do cats purr'
+]
+
+
+def synthetic_taxonomy(size, rng):
+    """The shipped taxonomy padded with random one- to three-word keywords to ``size``."""
+    with open(TOPIC_TAXONOMY_PATH, encoding='utf-8') as f:
+        taxonomy = json.load(f)['categories']
+    categories = list(taxonomy)
+    total = sum(len(keywords) for keywords in taxonomy.values())
+    while total < size:
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+                 for _ in range(rng.randint(1, 3))]
+        keywords = taxonomy[rng.choice(categories)]
+        keyword = ' '.join(words)
+        if keyword not in keywords:
+            keywords[keyword] = rng.choice((1, 2, 3))
+            total += 1
+    return taxonomy
+
+
+def substring_scan(taxonomy, topic):
+    topic_lower = topic.lower()
+    for category, keywords in taxonomy.items():
+        if any(keyword in topic_lower for keyword in keywords):
+            return category
+    return 'general'
+
+
+def per_topic_us(classify, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for topic in TOPICS:
+            classify(topic)
+    return (time.perf_counter() - started) / (repeat * len(TOPICS)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000', help='keywords per taxonomy')
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'keywords':>9s} {'build ms':>9s} {'scan us':>9s} {'automaton us':>13s} {'cached us':>10s}")
+    # Size 0: the shipped taxonomy as is
+    for size in [0] + [int(size) for size in args.sizes.split(',')]:
+        taxonomy = synthetic_taxonomy(size, rng)
+        started = time.perf_counter()
+        classifier = TopicClassifier(taxonomy, cache_size=0)
+        build_ms = (time.perf_counter() - started) * 1000
+        cached = TopicClassifier(taxonomy)
+        # The scan is too slow to repeat as often on big taxonomies
+        scan_repeat = max(1, args.repeat * 100 // max(classifier.keywords, 100))
+        print(f"{classifier.keywords:9d} {build_ms:9.1f} "
+              f"{per_topic_us(lambda topic: substring_scan(taxonomy, topic), scan_repeat):9.1f} "
+              f"{per_topic_us(classifier.classify, args.repeat):13.2f} "
+              f"{per_topic_us(cached.classify, args.repeat):10.2f}")
+
+    print()
+    for topic in TOPICS:
+        print(f"{topic!r}: {get_classifier().classify(topic)} {get_classifier().scores(topic)}")
+
+
+if __name__ == '__main__':
+    main()
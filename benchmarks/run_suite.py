@@ -0,0 +1,306 @@
+"""End-to-end benchmark suite on the offline fake model backend.
+
+Measures prompt building, output chunking, generate_story, reference processing
+and the /generate endpoint with N concurrent clients, and reports
+p50/p95/p99 latency and throughput per scenario. Results can be saved as a
+baseline and later runs compared against it.
+
+Run from the repository root:
+
+    python -m benchmarks.run_suite [--clients 8] [--requests 5] [--only story,endpoint]
+    python -m benchmarks.run_suite --save-baseline        # writes benchmarks/baselines/<name>.json
+    python -m benchmarks.run_suite --compare --tolerance 0.2
+    python -m benchmarks.run_suite --only story --profile benchmarks/profiles   # cProfile dumps
+
+The fake model is configured with the usual FAKE_MODEL_* variables; this
+script only changes their defaults so that a full run takes seconds.
+"""
+import os
+import tempfile
+
+# Must be set before any utils module reads the configuration
+os.environ.setdefault('MODEL_BACKEND', 'fake')
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark-key')
+os.environ.setdefault('FAKE_MODEL_LATENCY', '0.05')
+os.environ.setdefault('FAKE_MODEL_TOKENS_PER_SEC', '5000')
+os.environ.setdefault('FAKE_MODEL_OUTPUT_TOKENS', '800')
+os.environ.setdefault('JOB_WORKER_ENABLED', 'false')
+os.environ.setdefault('GENERATION_CACHE_PATH', '')
+os.environ.setdefault('REFERENCE_CACHE_PATH', '')
+# Nothing is written under data/, and no request is rate-limited or reused
+os.environ.setdefault('ADMISSION_PATH', '')
+os.environ.setdefault('STORY_STORE_PATH', '')
+os.environ.setdefault('TOPIC_REUSE', 'off')
+os.environ.setdefault('TOPIC_INDEX_REFRESH', '3600')
+_scratch = tempfile.mkdtemp(prefix='storyx-bench-')
+os.environ.setdefault('JOB_QUEUE_PATH', os.path.join(_scratch, 'jobs.db'))
+os.environ.setdefault('BATCH_STORE_PATH', os.path.join(_scratch, 'batches.db'))
+
+import argparse
+import asyncio
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# With --profile, one profiler per thread running a scenario (None when off)
+_profilers = None
+
+STORY_PARAMS = {
+    'topic': 'How cities manage water',
+    'expertise': 'educator',
+    'tone': 'neutral',
+    'context': 'Focus on the last fifty years.',
+    'total_parts': 3,
+    'writing_style': 'balanced',
+    'use_cache': False
+}
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, wall):
+    count = len(latencies)
+    return {
+        'count': count,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'throughput_per_s': round(count / wall, 3) if wall else 0.0
+    }
+
+
+def start_profiler():
+    """Profile the calling thread if --profile is on."""
+    if _profilers is None:
+        return None
+    profiler = cProfile.Profile()
+    _profilers.append(profiler)
+    profiler.enable()
+    return profiler
+
+
+def run_concurrently(call, clients, requests):
+    """Run ``call`` ``requests`` times in each of ``clients`` threads.
+
+    Each thread stands in for a server worker thread; ``call`` returns
+    True on success.
+    """
+    latencies, lock = [], threading.Lock()
+    errors = [0]
+
+    def client():
+        profiler = start_profiler()
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                ok = call()
+            except Exception as e:
+                print(f"  request failed: {e}", file=sys.stderr)
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+        if profiler is not None:
+            profiler.disable()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def bench_prompt_build(clients, requests):
+    from utils.prompt_builder import build_story_prompt
+
+    previous = ['Summary of an earlier part. ' * 10] * 2
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(max(requests * clients * 100, 1000)):
+        call_started = time.perf_counter()
+        build_story_prompt(
+            STORY_PARAMS['topic'], 'educator', 'neutral', STORY_PARAMS['context'],
+            3, 3, previous, writing_style='balanced'
+        )
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, 0, time.perf_counter() - started)
+
+
+def bench_chunking(clients, requests):
+    from utils.chunker import iter_chunks
+
+    paragraph = 'A sentence about how cities manage their water. ' * 12
+    text = '\n\n'.join([paragraph] * 200)
+    # Streamed in pieces the size of model chunks
+    pieces = [text[i:i + 100] for i in range(0, len(text), 100)]
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(max(requests * clients * 5, 50)):
+        call_started = time.perf_counter()
+        for _ in iter_chunks(pieces, 1500):
+            pass
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, 0, time.perf_counter() - started)
+
+
+def bench_story(clients, requests):
+    from utils.story_generator import get_story_generator
+
+    generator = get_story_generator('gemini-1.5-flash')
+
+    def call():
+        return asyncio.run(generator.generate_story(**STORY_PARAMS)).error is None
+
+    return run_concurrently(call, clients, requests)
+
+
+def bench_references(clients, requests):
+    from utils.reference_cache import ReferenceCache
+    from utils.reference_processor import ReferenceProcessor
+    from utils.story_generator import get_story_generator
+    from utils.youtube_extractor import VideoContent, extract_video_id
+
+    def fetch(url):
+        time.sleep(0.02)
+        captions = ''.join(
+            f"{i}\n00:00:{i % 60:02d},000 --> 00:00:{i % 60:02d},900\nLine {i} of the talk about water.\n\n"
+            for i in range(1, 400)
+        )
+        return VideoContent(extract_video_id(url), 'Water talk', 'A talk about water.', captions)
+
+    generator = get_story_generator('gemini-1.5-flash')
+    processor = ReferenceProcessor(generator.model, generator.model_name, cache=ReferenceCache(None, fetcher=fetch))
+    counter = iter(range(10 ** 9))
+
+    def call():
+        # Distinct videos per request, so nothing is shared between calls
+        base = next(counter) * 3
+        urls = [f'https://youtu.be/video{base + i}' for i in range(3)]
+        result = asyncio.run(processor.process_youtube_references(urls))
+        return bool(result) and not result.startswith('Error')
+
+    return run_concurrently(call, clients, requests)
+
+
+def bench_endpoint(clients, requests):
+    try:
+        from app import app
+    except ImportError as e:
+        print(f"  skipped: {e}", file=sys.stderr)
+        return None
+
+    payload = dict(STORY_PARAMS, model='gemini-1.5-flash', no_cache=True)
+    payload.pop('use_cache')
+
+    def call():
+        with app.test_client() as client:
+            response = client.post('/generate', json=payload)
+            return response.status_code == 200
+
+    return run_concurrently(call, clients, requests)
+
+
+SCENARIOS = {
+    'prompt_build': bench_prompt_build,
+    'chunking': bench_chunking,
+    'story': bench_story,
+    'references': bench_references,
+    'endpoint': bench_endpoint
+}
+
+
+def compare(results, baseline, tolerance):
+    """Print a comparison and return the names of regressed scenarios."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not result:
+            continue
+        p95_change = result['p95_ms'] / base['p95_ms'] - 1 if base['p95_ms'] else 0.0
+        throughput_change = (
+            result['throughput_per_s'] / base['throughput_per_s'] - 1 if base['throughput_per_s'] else 0.0
+        )
+        regressed = p95_change > tolerance or throughput_change < -tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:12s} p95 {p95_change:+7.1%}  throughput {throughput_change:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=5, help='requests per client')
+    parser.add_argument('--only', help='comma-separated scenarios: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--name', default='default', help='baseline name')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='compare against the saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--profile', metavar='DIR', help='write a cProfile dump per scenario to DIR')
+    args = parser.parse_args()
+
+    global _profilers
+    names = args.only.split(',') if args.only else list(SCENARIOS)
+    results = {}
+    for name in names:
+        print(f"{name}...", file=sys.stderr)
+        if args.profile:
+            _profilers = []
+            profiler = start_profiler()
+        results[name] = SCENARIOS[name](args.clients, args.requests)
+        if args.profile:
+            profiler.disable()
+            os.makedirs(args.profile, exist_ok=True)
+            path = os.path.join(args.profile, f'{name}.prof')
+            # Merge the main thread with the client threads
+            pstats.Stats(*_profilers).dump_stats(path)
+            _profilers = None
+            print(f"  profile written to {path}", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'scenario':12s} {'count':>6s} {'errors':>6s} {'p50 ms':>10s} "
+              f"{'p95 ms':>10s} {'p99 ms':>10s} {'req/s':>10s}")
+        for name, result in results.items():
+            if result is None:
+                print(f"{name:12s} skipped")
+                continue
+            print(f"{name:12s} {result['count']:6d} {result['errors']:6d} {result['p50_ms']:10.3f} "
+                  f"{result['p95_ms']:10.3f} {result['p99_ms']:10.3f} {result['throughput_per_s']:10.2f}")
+
+    baseline_path = os.path.join(BASELINE_DIR, f'{args.name}.json')
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump({'clients': args.clients, 'requests': args.requests, 'results': results}, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+    if args.compare:
+        if not os.path.exists(baseline_path):
+            sys.exit(f"No baseline at {baseline_path}; run with --save-baseline first")
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline_path}:")
+        if compare(results, baseline['results'], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
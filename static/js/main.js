@@ -39,7 +39,8 @@ async function initializeForm() {
 // Load available prompt templates
 async function loadPrompts() {
     try {
-        const response = await fetch('/prompts');
+        // Revalidate with the server's ETag; unchanged templates come back as 304
+        const response = await fetch('/prompts', { cache: 'no-cache' });
         const prompts = await response.json();
         const promptSelect = document.getElementById('promptTemplate');
         promptSelect.innerHTML = ''; // Clear existing options
@@ -61,6 +62,49 @@ function addYouTubeField() {
     container.appendChild(newField);
 }
 
+// Stream a story from the server, calling onEvent for each SSE event
+async function streamStory(formData, onEvent) {
+    const response = await fetch('/generate/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(formData)
+    });
+
+    if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.error || 'Generation failed');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            const dataLines = [];
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) {
+                    event = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    dataLines.push(line.slice(6));
+                }
+            });
+            onEvent(event, JSON.parse(dataLines.join('\n')));
+        }
+    }
+}
+
 // Form submission handler
 document.getElementById('storyForm').addEventListener('submit', async (e) => {
     e.preventDefault();
@@ -89,23 +133,23 @@ document.getElementById('storyForm').addEventListener('submit', async (e) => {
     };
 
     try {
-        const response = await fetch('/generate', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(formData)
-        });
-
-        const data = await response.json();
-
-        if (data.error) {
-            throw new Error(data.error);
-        }
-
-        document.getElementById('storyContent').textContent = data.story;
+        const storyContent = document.getElementById('storyContent');
+        storyContent.textContent = '';
         document.getElementById('storyOutput').classList.remove('hidden');
 
+        await streamStory(formData, (event, data) => {
+            if (event === 'part_start') {
+                if (data.part > 1) {
+                    storyContent.textContent += '\n\n';
+                }
+                generateBtnText.textContent = `Generating part ${data.part} of ${data.total_parts}...`;
+            } else if (event === 'delta') {
+                storyContent.textContent += data.text;
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
+
         showToast('Story generated successfully!');
 
     } catch (error) {
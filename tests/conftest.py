@@ -0,0 +1,38 @@
+import os
+import pytest
+import sys
+import tempfile
+
+# Must be set before any utils module reads the configuration: the offline
+# fake model, fast, and nothing written under data/
+_scratch = tempfile.mkdtemp(prefix='storyx-tests-')
+os.environ.update(
+    MODEL_BACKEND='fake', FAKE_MODEL_LATENCY='0.01', FAKE_MODEL_TOKENS_PER_SEC='100000',
+    FAKE_MODEL_OUTPUT_TOKENS='60', JOB_WORKER_ENABLED='false',
+    GENERATION_CACHE_PATH='', REFERENCE_CACHE_PATH='', ADMISSION_PATH='',
+    STORY_STORE_PATH='', TOPIC_REUSE='off', CONTEXT_CACHE_BACKEND='off',
+    JOB_QUEUE_PATH=os.path.join(_scratch, 'jobs.db'),
+    BATCH_STORE_PATH=os.path.join(_scratch, 'batches.db')
+)
+os.environ.pop('GEMINI_API_KEY', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STORY_PARAMS = {
+    'topic': 'How cities manage water',
+    'model_name': 'gemini-1.5-flash',
+    'expertise': 'educator',
+    'tone': 'neutral',
+    'context': '',
+    'youtube_urls': [],
+    'total_parts': 2,
+    'prompt_id': 'default',
+    'writing_style': 'balanced',
+    'pipelined': None,
+    'summarizer': None,
+    'use_cache': False
+}
+
+
+@pytest.fixture
+def story_params():
+    return dict(STORY_PARAMS)
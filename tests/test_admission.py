@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from utils import admission as admission_module
+from utils.admission import AdmissionController, expected_model_calls
+from utils.model_router import model_router
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission_module.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def controller(tmp_path, clock):
+    # 1 call per second, bursts of 5, queue for at most 2 seconds
+    return AdmissionController(str(tmp_path / 'admission.db'), rate=1.0, burst=5, max_wait=2)
+
+
+def test_burst_is_admitted_at_once(controller):
+    assert [controller.reserve('k', 1) for _ in range(5)] == [(True, 0.0)] * 5
+
+
+def test_requests_beyond_the_burst_queue_then_get_rejected(controller):
+    assert controller.reserve('k', 5) == (True, 0.0)
+    assert controller.reserve('k', 2) == (True, 2.0)
+    admitted, retry_in = controller.reserve('k', 1)
+    assert not admitted
+    assert retry_in == pytest.approx(1.0)
+
+
+def test_buckets_refill_over_time_up_to_the_burst(controller, clock):
+    controller.reserve('k', 5)
+    clock.now += 3
+    assert controller.reserve('k', 3) == (True, 0.0)
+    clock.now += 60
+    assert controller.reserve('k', 5) == (True, 0.0)
+    assert controller.reserve('k', 1) == (True, 1.0)
+
+
+def test_keys_have_separate_buckets(controller):
+    controller.reserve('a', 5)
+    assert controller.reserve('b', 5) == (True, 0.0)
+
+
+def test_stories_larger_than_the_bucket_wait_for_a_full_one(controller):
+    assert controller.reserve('k', 50) == (True, 0.0)
+    assert controller.reserve('k', 50, max_wait=float('inf')) == (True, 5.0)
+
+
+def test_disabled_controller_admits_everything(clock):
+    controller = AdmissionController('', rate=1.0, burst=1, max_wait=0)
+    assert asyncio.run(controller.admit('k', 100)) == (True, 0.0)
+
+
+@pytest.mark.parametrize('params, calls', [
+    ({'total_parts': 1}, 1),
+    ({'total_parts': 2, 'pipelined': True}, 3),
+    ({'total_parts': 3, 'pipelined': True}, 4),
+    ({'total_parts': 4, 'pipelined': True}, 6),
+    ({'total_parts': 3, 'pipelined': False}, 5),
+    ({'total_parts': 3, 'summarizer': 'extractive'}, 3),
+])
+def test_expected_model_calls(params, calls, monkeypatch):
+    monkeypatch.setattr(model_router, 'hedge_enabled', False)
+    assert expected_model_calls(dict(params, summarizer=params.get('summarizer', 'llm'))) == calls
+
+
+def test_expected_model_calls_skip_completed_parts_and_add_hedges(monkeypatch):
+    monkeypatch.setattr(model_router, 'hedge_enabled', False)
+    params = {'total_parts': 4, 'pipelined': True, 'summarizer': 'llm'}
+    assert expected_model_calls(params, completed_parts=2) == 2
+    monkeypatch.setattr(model_router, 'hedge_enabled', True)
+    monkeypatch.setattr(model_router, 'hedge_percentile', 0.9)
+    assert expected_model_calls(params) == 7
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from utils import batch_jobs as batch_jobs_module
+from utils.batch_jobs import BatchManager
+from utils.client_pool import key_fingerprint
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return BatchManager(str(tmp_path / 'batches.db'), concurrency=4, per_key_concurrency=2)
+
+
+class RecordingGenerator:
+    """Stands in for a StoryGenerator and records each generate_story call."""
+
+    class Result:
+        error = None
+        text = 'story'
+        truncated = False
+        timings = {}
+
+    def __init__(self):
+        self.calls = []
+
+    async def generate_story(self, **params):
+        self.calls.append(params)
+        return self.Result()
+
+
+def wait_until_completed(manager, batch_id, owner, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        batch = manager.get(batch_id, owner)
+        if batch['status'] == 'completed':
+            return batch
+        time.sleep(0.02)
+    raise AssertionError(f'batch {batch_id} did not finish')
+
+
+def test_batch_runs_every_item(manager, story_params):
+    items = [
+        dict(story_params, topic='Rivers'), dict(story_params, topic='Lakes'),
+        {'error': 'Missing required fields'}
+    ]
+    batch = manager.submit(items, 'key-a')
+    assert batch['total'] == 3 and 'results' not in batch
+
+    owner = key_fingerprint('key-a')
+    batch = wait_until_completed(manager, batch['job_id'], owner)
+    assert batch['completed'] == 3
+    assert [result['status'] for result in batch['results']] == ['completed', 'completed', 'error']
+    assert batch['results'][0]['topic'] == 'Rivers' and batch['results'][0]['story']
+
+
+def test_batches_are_visible_to_their_owner_only(manager, story_params):
+    batch = manager.submit([{'error': 'bad item'}], 'key-a')
+    assert manager.get(batch['job_id'], key_fingerprint('key-b')) is None
+    assert manager.get(batch['job_id'], key_fingerprint('key-a')) is not None
+
+
+def test_state_is_shared_through_the_store(manager, story_params):
+    batch = manager.submit([dict(story_params)], 'key-a')
+    other_worker = BatchManager(manager.path)
+    owner = key_fingerprint('key-a')
+    batch = wait_until_completed(other_worker, batch['job_id'], owner)
+    assert batch['results'][0]['status'] == 'completed'
+
+
+def test_events_follow_completion_order_then_done(manager, story_params):
+    batch = manager.submit([dict(story_params), {'error': 'bad item'}], 'key-a')
+    events = list(manager.iter_events(batch['job_id'], poll_interval=0.01))
+    assert [event['event'] for event in events] == ['item', 'item', 'done']
+    # The invalid item is recorded at once, ahead of the generated one
+    assert [event['index'] for event in events[:2]] == [1, 0]
+
+
+def test_items_run_without_a_request_deadline(manager, story_params, monkeypatch):
+    generator = RecordingGenerator()
+    monkeypatch.setattr(batch_jobs_module, 'get_story_generator', lambda *args: generator)
+    batch = manager.submit([dict(story_params)], 'key-a')
+    wait_until_completed(manager, batch['job_id'], key_fingerprint('key-a'))
+    assert generator.calls[0]['time_budget'] is None
+
+
+def test_identical_items_share_one_generation(manager, story_params, monkeypatch):
+    generator = RecordingGenerator()
+    monkeypatch.setattr(batch_jobs_module, 'get_story_generator', lambda *args: generator)
+    batch = manager.submit([dict(story_params), dict(story_params)], 'key-a')
+    batch = wait_until_completed(manager, batch['job_id'], key_fingerprint('key-a'))
+    assert len(generator.calls) == 1
+    assert [result['story'] for result in batch['results']] == ['story', 'story']
+
+
+def test_finished_batches_are_pruned_past_the_limit(tmp_path):
+    manager = BatchManager(str(tmp_path / 'batches.db'), max_jobs=2)
+    owner = key_fingerprint('key-a')
+    ids = []
+    for _ in range(3):
+        batch = manager.submit([{'error': 'bad item'}], 'key-a')
+        wait_until_completed(manager, batch['job_id'], owner)
+        ids.append(batch['job_id'])
+    manager.submit([{'error': 'bad item'}], 'key-a')
+    assert manager.get(ids[0], owner) is None
+    assert manager.get(ids[1], owner) is None
+    assert manager.get(ids[2], owner) is not None
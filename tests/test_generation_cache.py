@@ -0,0 +1,96 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from utils.generation_cache import GenerationCache
+
+
+@pytest.fixture
+def disk_cache(tmp_path):
+    return GenerationCache(
+        max_entries=2, disk_path=str(tmp_path / 'generations.db'), disk_max_bytes=250, touch_batch=2
+    )
+
+
+def disk_rows(cache):
+    db = sqlite3.connect(cache.disk_path)
+    keys = [key for (key,) in db.execute('SELECT key FROM generations ORDER BY key')]
+    (total,) = db.execute('SELECT total FROM generation_bytes').fetchone()
+    (actual,) = db.execute('SELECT COALESCE(SUM(size), 0) FROM generations').fetchone()
+    return keys, total, actual
+
+
+def test_memory_tier_is_a_bounded_lru():
+    cache = GenerationCache(max_entries=2)
+
+    async def scenario():
+        await cache.set('a', 'A')
+        await cache.set('b', 'B')
+        assert await cache.get('a') == 'A'
+        await cache.set('c', 'C')
+        return [await cache.get(key) for key in 'abc']
+
+    assert asyncio.run(scenario()) == ['A', None, 'C']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = GenerationCache(ttl=-1)
+
+    async def scenario():
+        await cache.set('a', 'A')
+        return await cache.get('a')
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_disk_tier_serves_entries_the_memory_tier_dropped(disk_cache):
+    async def scenario():
+        await disk_cache.set('a', 'A')
+        disk_cache._memory.clear()
+        return await disk_cache.get('a')
+
+    assert asyncio.run(scenario()) == 'A'
+    assert disk_cache.stats()['disk_hits'] == 1
+
+
+def test_size_counter_tracks_inserts_replacements_and_evictions(disk_cache):
+    async def scenario():
+        for key in 'abcde':
+            await disk_cache.set(key, 'x' * 100)
+        await disk_cache.set('e', 'y' * 50)
+
+    asyncio.run(scenario())
+    keys, total, actual = disk_rows(disk_cache)
+    assert keys == ['d', 'e']
+    assert total == actual == 150
+
+
+def test_eviction_keeps_recently_read_entries(disk_cache):
+    async def scenario():
+        await disk_cache.set('a', 'x' * 100)
+        await disk_cache.set('b', 'x' * 100)
+        disk_cache._memory.clear()
+        # Read 'a' from disk so it is more recent than 'b'
+        assert await disk_cache.get('a') is not None
+        await disk_cache.set('c', 'x' * 100)
+
+    asyncio.run(scenario())
+    keys, total, actual = disk_rows(disk_cache)
+    assert keys == ['a', 'c']
+    assert total == actual
+
+
+def test_access_times_are_written_in_batches(disk_cache):
+    async def scenario():
+        await disk_cache.set('a', 'A')
+        await disk_cache.set('b', 'B')
+        disk_cache._memory.clear()
+        await disk_cache.get('a')
+        pending = dict(disk_cache._touched)
+        await disk_cache.get('b')
+        return pending
+
+    assert list(asyncio.run(scenario())) == ['a']
+    assert disk_cache._touched == {}
@@ -0,0 +1,152 @@
+import asyncio
+import glob
+import sqlite3
+import time
+
+import pytest
+
+from utils import job_queue as job_queue_module
+from utils.client_pool import key_fingerprint
+from utils.job_queue import JobQueue
+from utils.retry_policy import FATAL, SERVER
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.db'), lease_seconds=60, max_attempts=3)
+
+
+def run_claimed(queue):
+    claimed = queue._claim()
+    assert claimed is not None
+    asyncio.run(queue._process(*claimed))
+
+
+class FailingGenerator:
+    """Stands in for a StoryGenerator whose first part fails with ``kind``."""
+
+    def __init__(self, kind):
+        self.kind = kind
+
+    def validate_inputs(self, *args):
+        pass
+
+    async def prepare_context(self, context, youtube_urls):
+        return context
+
+    def create_scheduler(self, *args, **kwargs):
+        kind = self.kind
+
+        class Scheduler:
+            async def run(self):
+                yield {'event': 'part_start', 'part': 1, 'total_parts': 2}
+                yield {'event': 'error', 'part': 1, 'kind': kind, 'error': 'boom'}
+
+        return Scheduler()
+
+
+def test_api_key_is_never_stored(queue, story_params):
+    job_id = queue.enqueue(story_params, 'secret-session-key')
+    for path in glob.glob(queue.path + '*'):  # the database and its WAL
+        with open(path, 'rb') as f:
+            assert b'secret-session-key' not in f.read()
+    row = sqlite3.connect(queue.path).execute('SELECT owner FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    assert row == (key_fingerprint('secret-session-key'),)
+
+
+def test_jobs_are_visible_to_their_owner_only(queue, story_params):
+    job_id = queue.enqueue(story_params, 'key-a')
+    assert queue.get(job_id, key_fingerprint('key-a'))['status'] == 'queued'
+    assert queue.get(job_id, key_fingerprint('key-b')) is None
+
+
+def test_worker_completes_a_job_and_forgets_its_key(queue, story_params):
+    job_id = queue.enqueue(story_params, 'key-a')
+    run_claimed(queue)
+    job = queue.get(job_id, key_fingerprint('key-a'))
+    assert job['status'] == 'completed'
+    assert job['completed_parts'] == 2
+    assert job['story']
+    assert job_id not in queue._keys
+
+
+def test_claim_skips_jobs_whose_key_is_held_elsewhere(tmp_path, story_params):
+    path = str(tmp_path / 'jobs.db')
+    first, second = JobQueue(path, lease_seconds=60), JobQueue(path, lease_seconds=60)
+    job_id = first.enqueue(story_params, 'key-a')
+    assert second._claim() is None
+    assert first._claim()[0] == job_id
+
+
+def test_orphaned_job_fails_and_its_owner_can_resume_it(tmp_path, story_params):
+    path = str(tmp_path / 'jobs.db')
+    job_id = JobQueue(path, lease_seconds=0.05).enqueue(story_params, 'key-a')
+    other = JobQueue(path, lease_seconds=60)
+    time.sleep(0.1)
+    assert other._claim() is None
+    job = other.get(job_id, key_fingerprint('key-a'))
+    assert job['status'] == 'failed'
+    assert 'resume' in job['error']
+
+    assert not other.requeue(job_id, 'key-b')
+    assert other.requeue(job_id, 'key-a')
+    assert other._claim()[0] == job_id
+
+
+def test_expired_lease_on_the_server_key_is_reclaimed(tmp_path, story_params, monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'server-key')
+    path = str(tmp_path / 'jobs.db')
+    job_id = JobQueue(path, lease_seconds=0.05).enqueue(story_params, 'server-key')
+    assert JobQueue(path, lease_seconds=0.05)._claim()[0] == job_id
+    time.sleep(0.1)
+    claimed = JobQueue(path, lease_seconds=60)._claim()
+    assert claimed[0] == job_id
+    assert claimed[2] == 2
+
+
+def test_resumed_job_keeps_its_checkpoints(queue, story_params):
+    job_id = queue.enqueue(story_params, 'key-a')
+    queue._claim()
+    queue._save_part(job_id, 1, 'First part, already written.')
+    queue._finish(job_id, 'failed', 'worker died')
+    assert queue.requeue(job_id, 'key-a')
+    run_claimed(queue)
+    job = queue.get(job_id, key_fingerprint('key-a'))
+    assert job['status'] == 'completed'
+    assert job['story'].startswith('First part, already written.')
+
+
+@pytest.mark.parametrize('kind, status', [(SERVER, 'queued'), (FATAL, 'failed')])
+def test_error_events_retry_unless_fatal(queue, story_params, monkeypatch, kind, status):
+    monkeypatch.setattr(job_queue_module, 'get_story_generator', lambda *args: FailingGenerator(kind))
+    job_id = queue.enqueue(story_params, 'key-a')
+    run_claimed(queue)
+    job = queue.get(job_id, key_fingerprint('key-a'))
+    assert job['status'] == status
+    assert (job_id in queue._keys) == (status == 'queued')
+
+
+def test_error_events_fail_on_the_last_attempt(queue, story_params, monkeypatch):
+    monkeypatch.setattr(job_queue_module, 'get_story_generator', lambda *args: FailingGenerator(SERVER))
+    job_id = queue.enqueue(story_params, 'key-a')
+    for _ in range(queue.max_attempts):
+        run_claimed(queue)
+    assert queue.get(job_id, key_fingerprint('key-a'))['status'] == 'failed'
+    assert queue._claim() is None
+
+
+def test_migration_moves_stored_keys_to_owners(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    db = sqlite3.connect(path)
+    db.execute(
+        'CREATE TABLE jobs (id TEXT PRIMARY KEY, params TEXT NOT NULL, api_key TEXT, status TEXT NOT NULL, '
+        'total_parts INTEGER NOT NULL, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, '
+        'lease_until REAL NOT NULL DEFAULT 0, created REAL NOT NULL, updated REAL NOT NULL)'
+    )
+    db.execute("INSERT INTO jobs VALUES ('old', '{}', 'key-a', 'completed', 1, NULL, 1, 0, 1, 1)")
+    db.commit()
+    db.close()
+    queue = JobQueue(path)
+    assert queue.get('old', key_fingerprint('key-a'))['status'] == 'completed'
+    row = sqlite3.connect(path).execute("SELECT api_key FROM jobs WHERE id = 'old'").fetchone()
+    assert row == (None,)
@@ -0,0 +1,113 @@
+import asyncio
+
+from utils.part_scheduler import PartScheduler, closing_excerpt
+from utils.retry_policy import FATAL
+
+
+class Story:
+    """Scripted part and summary calls that record what each part was given."""
+
+    def __init__(self, part_chars=100, part_delay=0.01, summary_delay=0.02, fail_part=None):
+        self.part_chars = part_chars
+        self.part_delay = part_delay
+        self.summary_delay = summary_delay
+        self.fail_part = fail_part
+        self.previous = {}
+        self.generated = []
+        self.summarized = []
+
+    async def generate_part(self, part, previous_parts):
+        self.previous[part] = list(previous_parts)
+        self.generated.append(part)
+        await asyncio.sleep(self.part_delay)
+        if part == self.fail_part:
+            raise ValueError('bad request')
+        yield f'{part}' * self.part_chars
+
+    async def summarize(self, text):
+        self.summarized.append(text[0])
+        await asyncio.sleep(self.summary_delay)
+        return f'summary of {text[0]}'
+
+    def run(self, total_parts, **kwargs):
+        scheduler = PartScheduler(self.generate_part, self.summarize, total_parts, **kwargs)
+
+        async def collect():
+            return [event async for event in scheduler.run()]
+
+        return asyncio.run(collect())
+
+
+def test_closing_excerpt_starts_on_a_boundary():
+    text = 'First sentence here. Second sentence here. Third one.'
+    assert closing_excerpt(text, 100) == text
+    assert closing_excerpt(text, 40) == 'Second sentence here. Third one.'
+
+
+def test_short_previous_part_is_passed_in_full():
+    story = Story(part_chars=100)
+    story.run(2, full_part_chars=2000)
+    assert story.previous[2] == ['Part 1:\n' + '1' * 100]
+    assert story.summarized == []
+
+
+def test_part_two_waits_for_a_summary_of_a_long_part_one():
+    story = Story(part_chars=3000)
+    events = story.run(2, full_part_chars=2000, excerpt_chars=50)
+    assert story.previous[2][0] == 'summary of 1'
+    assert story.previous[2][1].startswith('End of part 1:')
+    assert [event['part'] for event in events if event['event'] == 'summary'] == [1]
+
+
+def test_pipelined_parts_read_earlier_summaries_and_the_latest_excerpt():
+    story = Story(part_chars=3000)
+    story.run(4, full_part_chars=2000, excerpt_chars=50)
+    assert story.previous[4][:2] == ['summary of 1', 'summary of 2']
+    assert story.previous[4][2].startswith('End of part 3:')
+    # Nobody reads a summary of part 3 or 4
+    assert story.summarized == ['1', '2']
+
+
+def test_strict_mode_waits_for_every_summary():
+    story = Story(part_chars=3000)
+    events = story.run(3, pipelined=False)
+    assert story.previous[3] == ['summary of 1', 'summary of 2']
+    assert [event['part'] for event in events if event['event'] == 'summary'] == [1, 2]
+
+
+def test_completed_parts_are_replayed_not_generated():
+    story = Story(part_chars=3000)
+    events = story.run(
+        3, full_part_chars=2000,
+        completed_parts={1: 'Resumed part one.'}, completed_summaries={1: 'Stored summary.'}
+    )
+    assert story.generated == [2, 3]
+    assert story.previous[3][0] == 'Stored summary.'
+    first = [event for event in events if event.get('part') == 1]
+    assert [event['event'] for event in first] == ['part_start', 'delta', 'part_end']
+    assert all(event.get('resumed') for event in first if event['event'] != 'delta')
+
+
+def test_part_failure_ends_the_story_with_its_error_kind():
+    story = Story(fail_part=2)
+    events = story.run(3)
+    assert events[-1]['event'] == 'error'
+    assert events[-1]['part'] == 2
+    assert events[-1]['kind'] == FATAL
+    assert story.generated == [1, 2]
+
+
+def test_running_out_of_time_stops_before_the_next_part():
+    story = Story(part_delay=0.05)
+    events = story.run(5, time_budget=0.08)
+    kinds = [event['event'] for event in events]
+    assert 'budget_exhausted' in kinds
+    assert events[-1]['event'] == 'done'
+    assert events[-1]['total_parts'] < 5
+
+
+def test_done_reports_timings():
+    story = Story()
+    events = story.run(2)
+    timings = events[-1]['timings']
+    assert {'part_1', 'part_2', 'total'} <= set(timings)
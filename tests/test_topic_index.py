@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from utils.story_store import StoryStore
+from utils.topic_index import TopicIndex, find_reusable, normalize_topic, replay_story
+
+OWNER = 'owner-a'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StoryStore(str(tmp_path / 'stories.db'), str(tmp_path / 'stories'))
+
+
+@pytest.fixture
+def index(store):
+    return TopicIndex(store, threshold=0.6)
+
+
+def test_topics_normalize_to_sorted_content_words():
+    assert normalize_topic('AI in Education ') == normalize_topic('education, AI') == ('ai', 'education')
+
+
+def test_similar_topics_match_within_one_owner_and_parameters(index, story_params):
+    model = story_params['model_name']
+    index.add('s1', 'How cities manage their water supply', model, story_params, OWNER)
+
+    matches = index.find('How cities manage water', model, story_params, OWNER)
+    assert [match['story_id'] for match in matches] == ['s1']
+    assert 0.6 <= matches[0]['similarity'] < 1
+
+    assert index.find('How cities manage water supply', model, story_params, 'owner-b') == []
+    assert index.find('How cities manage water supply', model, dict(story_params, tone='casual'), OWNER) == []
+    assert index.find('Volcanoes of Iceland', model, story_params, OWNER) == []
+
+
+def test_matches_are_ranked_and_limited(index, story_params):
+    model = story_params['model_name']
+    index.add('exact', 'Water management in cities', model, story_params, OWNER)
+    index.add('close', 'Water management in big cities', model, story_params, OWNER)
+    matches = index.find('cities water management', model, story_params, OWNER, limit=2)
+    assert [match['story_id'] for match in matches] == ['exact', 'close']
+    assert len(index.find('cities water management', model, story_params, OWNER, limit=1)) == 1
+
+
+def test_refresh_indexes_owned_stories_from_the_store(index, store, story_params):
+    model = story_params['model_name']
+    story_id = store.save(['Part one.', 'Part two.'], 'Urban water systems', model, story_params, OWNER)
+    store.save(['Orphan.'], 'Urban water systems', model, story_params, None)
+    assert index.refresh()
+    assert index.stats()['stories'] == 1
+    assert index.find('urban water systems', model, story_params, OWNER)[0]['story_id'] == story_id
+
+
+def test_serve_mode_returns_the_stored_parts_and_replays_them(index, store, story_params):
+    model = story_params['model_name']
+    params = dict(story_params, use_cache=True)
+    story_id = store.save(['Part one.', 'Part two.'], 'Urban water systems', model, params, OWNER)
+    index.refresh()
+
+    async def scenario():
+        similar, served = await find_reusable(index, 'Urban water systems', model, params, OWNER, 'serve')
+        match, parts = served
+        events = [event async for event in replay_story(match, parts)]
+        return similar, match, parts, events
+
+    similar, match, parts, events = asyncio.run(scenario())
+    assert match['story_id'] == story_id and similar[0] == match
+    assert parts == ['Part one.', 'Part two.']
+    deltas = [event for event in events if event['event'] == 'delta']
+    assert [(event['part'], event['text']) for event in deltas] == [(1, 'Part one.'), (2, 'Part two.')]
+    assert events[-1]['event'] == 'done'
+
+
+def test_offer_mode_and_uncached_requests_are_never_served(index, store, story_params):
+    model = story_params['model_name']
+    store.save(['Text.'], 'Urban water systems', model, story_params, OWNER)
+    index.refresh()
+
+    async def lookup(params, mode):
+        return await find_reusable(index, 'Urban water systems', model, params, OWNER, mode)
+
+    similar, served = asyncio.run(lookup(dict(story_params, use_cache=True), 'offer'))
+    assert similar and served is None
+    similar, served = asyncio.run(lookup(dict(story_params, use_cache=False), 'serve'))
+    assert similar and served is None
@@ -0,0 +1,133 @@
+from typing import Any, Dict, Optional, Tuple
+from .client_pool import key_fingerprint
+from .config import (
+    ADMISSION_PATH, ADMISSION_CALLS_PER_MINUTE, ADMISSION_BURST, ADMISSION_MAX_WAIT,
+    ENABLE_YOUTUBE_REFERENCES, PIPELINE_PARTS, SUMMARIZER
+)
+from .metrics import metrics, record_stage
+from .model_client import run_blocking
+from .model_router import model_router
+from .storage import get_connection
+import asyncio
+import math
+import time
+
+_SCHEMA = '''CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+)'''
+
+
+def expected_model_calls(params: Dict[str, Any], completed_parts: int = 0) -> int:
+    """Model calls a story request is expected to make.
+
+    One per part, one per LLM summary that a later part needs, and, with
+    YouTube references on, one analysis per video plus one to combine them.
+    With hedging on, the share of those calls expected to run past the hedge
+    percentile is added for their duplicates.
+    """
+    total_parts = params.get('total_parts') or 1
+    parts = max(0, total_parts - completed_parts)
+    summaries = 0
+    if (params.get('summarizer') or SUMMARIZER) == 'llm':
+        pipelined = PIPELINE_PARTS if params.get('pipelined') is None else params['pipelined']
+        if pipelined:
+            # Parts 1..n-2, and part 1 of a two-part story unless it is short
+            summarized = max(total_parts - 2, 1) if total_parts >= 2 else 0
+        else:
+            summarized = total_parts - 1
+        summaries = max(0, summarized - completed_parts)
+    references = 0
+    videos = len(params.get('youtube_urls') or [])
+    if ENABLE_YOUTUBE_REFERENCES and videos and not completed_parts:
+        references = videos + 1
+    calls = parts + summaries + references
+    if model_router.hedge_enabled:
+        calls += math.ceil(calls * (1 - model_router.hedge_percentile))
+    return calls
+
+
+def admission_key(api_key: Optional[str], client_ip: Optional[str] = None) -> str:
+    """Bucket key: the API key's fingerprint, plus the client IP if given."""
+    key = key_fingerprint(api_key)
+    return f"{key}:{client_ip}" if client_ip else key
+
+
+class AdmissionController:
+    """Token buckets of model calls per key, shared by workers through SQLite.
+
+    Each key earns ``rate`` calls per second up to ``burst``. A request
+    costing more than is available reserves the calls anyway (the balance
+    goes negative) and waits until they have been earned, as long as that
+    wait is at most ``max_wait``; later requests queue behind it. Otherwise
+    it is turned away with the time after which it would be admitted.
+    """
+
+    def __init__(self, path: str, rate: float, burst: float, max_wait: float):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        if self.enabled:
+            get_connection(self.path).execute(_SCHEMA)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.rate > 0
+
+    def reserve(self, key: str, cost: float, max_wait: Optional[float] = None) -> Tuple[bool, float]:
+        """Reserve ``cost`` calls for ``key``.
+
+        Returns ``(True, seconds to wait before starting)`` or ``(False,
+        seconds until a retry would be admitted)``. ``max_wait=None`` uses
+        the configured limit; ``float('inf')`` always reserves.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        # A story bigger than the bucket only has to wait for a full bucket
+        cost = min(cost, self.burst)
+        db = get_connection(self.path)
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = db.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            wait = max(0.0, (cost - tokens) / self.rate)
+            admitted = wait <= max_wait
+            if admitted:
+                tokens -= cost
+            db.execute(
+                'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now)
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        if admitted:
+            return True, wait
+        return False, wait - max_wait
+
+    async def admit(self, key: str, cost: float, max_wait: Optional[float] = None) -> Tuple[bool, float]:
+        """``reserve`` and, if admitted, sleep until the calls are earned.
+
+        Returns what ``reserve`` returned.
+        """
+        if not self.enabled or cost <= 0:
+            return True, 0.0
+        admitted, seconds = await run_blocking(self.reserve, key, cost, max_wait)
+        if not admitted:
+            metrics.inc('admission', result='rejected')
+            return admitted, seconds
+        metrics.inc('admission', result='queued' if seconds > 0 else 'admitted')
+        if seconds > 0:
+            started = time.monotonic()
+            await asyncio.sleep(seconds)
+            record_stage('admission_wait', time.monotonic() - started)
+        return admitted, seconds
+
+
+admission = AdmissionController(
+    ADMISSION_PATH, ADMISSION_CALLS_PER_MINUTE / 60, ADMISSION_BURST, ADMISSION_MAX_WAIT
+)
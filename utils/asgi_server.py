@@ -0,0 +1,233 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from .config import ASGI_DRAIN_TIMEOUT, ASGI_WSGI_THREADS
+import asyncio
+import inspect
+import io
+import json
+import sys
+
+
+def build_environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+    """Translate an ASGI HTTP scope and its body into a WSGI environ."""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = name
+        else:
+            key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+class AsgiApp:
+    """Serves the Flask app over ASGI on one shared event loop.
+
+    Routes with ``async def`` views (``/generate``, ``/generate/stream``)
+    are awaited directly on the server's loop inside Flask's request
+    context, with the app's before/after request hooks, so a waiting
+    generation holds no thread. Other routes run through the WSGI app on a
+    bounded thread pool. Streaming bodies that are async iterables (see
+    ``streaming.SSEStream``) are consumed on the loop as well.
+
+    On lifespan shutdown new requests get a 503 while requests in flight
+    are given up to ``drain_timeout`` seconds to finish.
+    """
+
+    def __init__(
+        self,
+        flask_app,
+        drain_timeout: float = ASGI_DRAIN_TIMEOUT,
+        wsgi_threads: int = ASGI_WSGI_THREADS
+    ):
+        self.flask_app = flask_app
+        self.drain_timeout = drain_timeout
+        self.executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix='wsgi')
+        self.draining = False
+        self.in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._idle = asyncio.Event()
+                self._idle.set()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.drain()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def drain(self):
+        """Refuse new requests and wait for the ones in flight."""
+        self.draining = True
+        if self._idle is None or self._idle.is_set():
+            return
+        print(f"Draining {self.in_flight} in-flight request(s)")
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Shutting down with {self.in_flight} request(s) still in flight")
+
+    async def _http(self, scope, receive, send):
+        if self.draining:
+            body = json.dumps({'error': 'Server is shutting down, please retry'}).encode('utf-8')
+            await send({'type': 'http.response.start', 'status': 503, 'headers': [
+                (b'content-type', b'application/json'), (b'retry-after', b'5')
+            ]})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        if self._idle is None:
+            # Servers without lifespan support
+            self._idle = asyncio.Event()
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            environ = build_environ(scope, await read_body(receive))
+            if not await self._dispatch_async(environ, receive, send):
+                await self._dispatch_wsgi(environ, receive, send)
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+
+    async def _dispatch_async(self, environ, receive, send) -> bool:
+        """Serve a request whose view is a coroutine on this loop; False if it is not."""
+        app = self.flask_app
+        try:
+            rule, _ = app.url_map.bind_to_environ(environ).match(return_rule=True)
+        except Exception:
+            # Not found, redirects and the like are left to the WSGI app
+            return False
+        if not inspect.iscoroutinefunction(app.view_functions.get(rule.endpoint)):
+            return False
+
+        ctx = app.request_context(environ)
+        ctx.push()
+        error = None
+        try:
+            request = ctx.request
+            view = app.view_functions[rule.endpoint]
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(**request.view_args)
+                response = app.process_response(app.make_response(rv))
+            except Exception as e:
+                error = e
+                try:
+                    response = app.make_response(app.handle_user_exception(e))
+                except Exception as e:
+                    response = app.make_response(app.handle_exception(e))
+                response = app.process_response(response)
+        finally:
+            ctx.pop(error)
+
+        headers = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in response.headers.items()
+        ]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        body = response.response
+        if hasattr(body, '__aiter__'):
+            await self._send_stream(body.__aiter__(), receive, send)
+        else:
+            await send({'type': 'http.response.body', 'body': b''.join(response.iter_encoded())})
+            response.close()
+        return True
+
+    async def _send_stream(self, chunks, receive, send):
+        # Stop generating as soon as the client goes away
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            async for chunk in chunks:
+                if disconnected.done():
+                    break
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            else:
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await chunks.aclose()
+
+    async def _dispatch_wsgi(self, environ, receive, send):
+        """Run the WSGI app on the thread pool, sending its body as it is produced."""
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+
+        def begin():
+            result = self.flask_app.wsgi_app(environ, start_response)
+            return result, iter(result)
+
+        def advance(iterator):
+            return next(iterator, None)
+
+        result, iterator = await loop.run_in_executor(self.executor, begin)
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            chunk = await loop.run_in_executor(self.executor, advance, iterator)
+            await send({'type': 'http.response.start', 'status': started['status'],
+                        'headers': started['headers']})
+            while chunk is not None and not disconnected.done():
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, advance, iterator)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            close = getattr(result, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
@@ -0,0 +1,33 @@
+from concurrent.futures import Future
+from typing import Coroutine, Optional
+import asyncio
+import threading
+
+
+class BackgroundLoop:
+    """A long-lived event loop on a daemon thread for work that outlives a request.
+
+    Flask runs each async view on a throwaway loop, so anything that must
+    keep running after the response is sent is submitted here instead.
+    """
+
+    def __init__(self, name: str = 'background-loop'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                thread.start()
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the background loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+background_loop = BackgroundLoop()
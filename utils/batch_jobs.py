@@ -0,0 +1,260 @@
+from typing import Any, Dict, Iterator, List, Optional
+from .admission import admission, admission_key, expected_model_calls
+from .background import background_loop
+from .client_pool import key_fingerprint
+from .config import (
+    BATCH_CONCURRENCY, BATCH_PER_KEY_CONCURRENCY, BATCH_JOB_TTL, BATCH_MAX_JOBS, BATCH_STORE_PATH
+)
+from .model_client import run_blocking
+from .storage import get_connection
+from .story_generator import get_story_generator
+import asyncio
+import json
+import time
+import uuid
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS batches (
+        id TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        status TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        completed INTEGER NOT NULL DEFAULT 0,
+        created REAL NOT NULL,
+        finished REAL
+    )''',
+    'CREATE INDEX IF NOT EXISTS batches_finished ON batches (finished)',
+    '''CREATE TABLE IF NOT EXISTS batch_items (
+        batch_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        result TEXT,
+        seq INTEGER,
+        PRIMARY KEY (batch_id, idx)
+    )''',
+    'CREATE INDEX IF NOT EXISTS batch_items_seq ON batch_items (batch_id, seq)'
+)
+
+
+class BatchManager:
+    """Fans batch items out over the story generator on the background loop.
+
+    At most ``concurrency`` stories are generated at once overall and at
+    most ``per_key_concurrency`` per API key. Identical items, whether in
+    the same batch or in batches running concurrently for the same key,
+    share one generation.
+
+    Batch state and results live in SQLite, so any worker can report on a
+    batch; each result is numbered in completion order (``seq``). The
+    items run in the process that accepted the batch, which holds the API
+    key in memory only. Every batch belongs to the fingerprint of that key
+    (``owner``), and only its owner can read it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        concurrency: int = 8,
+        per_key_concurrency: int = 4,
+        job_ttl: float = 3600,
+        max_jobs: int = 200
+    ):
+        self.path = path
+        self.concurrency = concurrency
+        self.per_key_concurrency = per_key_concurrency
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        for statement in _SCHEMA:
+            self._db().execute(statement)
+        # Only touched from the background loop
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+        self._key_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _db(self):
+        return get_connection(self.path)
+
+    def submit(self, items: List[Dict[str, Any]], api_key: str) -> Dict[str, Any]:
+        """Store a new batch for ``api_key`` and start running it."""
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            self._prune(db, now)
+            db.execute(
+                "INSERT INTO batches (id, owner, status, total, created) VALUES (?, ?, 'queued', ?, ?)",
+                (batch_id, key_fingerprint(api_key), len(items), now)
+            )
+            db.executemany(
+                'INSERT INTO batch_items (batch_id, idx) VALUES (?, ?)',
+                [(batch_id, index) for index in range(len(items))]
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        background_loop.submit(self._run(batch_id, items, api_key))
+        return self.get(batch_id, key_fingerprint(api_key), include_results=False)
+
+    def get(self, batch_id: str, owner: str, include_results: bool = True) -> Optional[Dict[str, Any]]:
+        row = self._db().execute(
+            'SELECT id, status, total, completed, created, finished FROM batches '
+            'WHERE id = ? AND owner = ?', (batch_id, owner)
+        ).fetchone()
+        if not row:
+            return None
+        data = {
+            'job_id': row[0],
+            'status': row[1],
+            'total': row[2],
+            'completed': row[3],
+            'created': row[4],
+            'finished': row[5]
+        }
+        if include_results:
+            data['results'] = [
+                json.loads(result) if result else None
+                for (result,) in self._db().execute(
+                    'SELECT result FROM batch_items WHERE batch_id = ? ORDER BY idx', (batch_id,)
+                )
+            ]
+        return data
+
+    def iter_events(
+        self,
+        batch_id: str,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = 15.0
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield one ``item`` event per finished item, then ``done``.
+
+        The store is polled every ``poll_interval`` seconds; a ``heartbeat``
+        event is sent whenever nothing finishes within ``heartbeat_interval``
+        seconds, keeping proxies from closing the stream.
+        """
+        sent = 0
+        quiet_since = time.monotonic()
+        while True:
+            db = self._db()
+            rows = db.execute(
+                'SELECT result FROM batch_items WHERE batch_id = ? AND seq > ? ORDER BY seq',
+                (batch_id, sent)
+            ).fetchall()
+            status, total = db.execute(
+                'SELECT status, total FROM batches WHERE id = ?', (batch_id,)
+            ).fetchone()
+            for (result,) in rows:
+                yield {'event': 'item', **json.loads(result)}
+            sent += len(rows)
+            if status == 'completed' and sent == total:
+                yield {'event': 'done', 'job_id': batch_id, 'total': total}
+                return
+            if rows:
+                quiet_since = time.monotonic()
+            elif time.monotonic() - quiet_since >= heartbeat_interval:
+                yield {'event': 'heartbeat'}
+                quiet_since = time.monotonic()
+            time.sleep(poll_interval)
+
+    def _prune(self, db, now: float):
+        """Drop finished batches past their TTL, then the oldest beyond ``max_jobs``."""
+        expired = [batch_id for (batch_id,) in db.execute(
+            'SELECT id FROM batches WHERE finished IS NOT NULL AND finished < ?', (now - self.job_ttl,)
+        )]
+        (count,) = db.execute('SELECT COUNT(*) FROM batches').fetchone()
+        excess = count - len(expired) - self.max_jobs + 1
+        if excess > 0:
+            expired += [batch_id for (batch_id,) in db.execute(
+                'SELECT id FROM batches WHERE finished IS NOT NULL AND finished >= ? '
+                'ORDER BY finished LIMIT ?', (now - self.job_ttl, excess)
+            )]
+        for batch_id in expired:
+            db.execute('DELETE FROM batch_items WHERE batch_id = ?', (batch_id,))
+            db.execute('DELETE FROM batches WHERE id = ?', (batch_id,))
+
+    def _set_running(self, batch_id: str):
+        self._db().execute("UPDATE batches SET status = 'running' WHERE id = ?", (batch_id,))
+
+    def _record(self, batch_id: str, index: int, result: Dict[str, Any]):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            completed, total = db.execute(
+                'SELECT completed, total FROM batches WHERE id = ?', (batch_id,)
+            ).fetchone()
+            completed += 1
+            db.execute(
+                'UPDATE batch_items SET result = ?, seq = ? WHERE batch_id = ? AND idx = ?',
+                (json.dumps(result), completed, batch_id, index)
+            )
+            if completed == total:
+                db.execute(
+                    "UPDATE batches SET completed = ?, status = 'completed', finished = ? WHERE id = ?",
+                    (completed, time.time(), batch_id)
+                )
+            else:
+                db.execute('UPDATE batches SET completed = ? WHERE id = ?', (completed, batch_id))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    async def _run(self, batch_id: str, items: List[Dict[str, Any]], api_key: str):
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.concurrency)
+        await run_blocking(self._set_running, batch_id)
+        await asyncio.gather(*(
+            self._run_item(batch_id, api_key, index, item) for index, item in enumerate(items)
+        ))
+
+    async def _run_item(self, batch_id: str, api_key: str, index: int, item: Dict[str, Any]):
+        if 'error' in item:
+            await run_blocking(
+                self._record, batch_id, index, {'index': index, 'status': 'error', 'error': item['error']}
+            )
+            return
+
+        fingerprint = key_fingerprint(api_key)
+        work_key = fingerprint + ':' + json.dumps(item, sort_keys=True)
+        task = self._inflight.get(work_key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(fingerprint, api_key, dict(item)))
+            self._inflight[work_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(work_key, None))
+
+        try:
+            result = await asyncio.shield(task)
+        except Exception as e:
+            result = {'status': 'error', 'error': str(e)}
+        await run_blocking(
+            self._record, batch_id, index, {'index': index, 'topic': item.get('topic'), **result}
+        )
+
+    async def _generate(self, fingerprint: str, api_key: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        semaphore = self._key_semaphores.get(fingerprint)
+        if semaphore is None:
+            semaphore = self._key_semaphores[fingerprint] = asyncio.Semaphore(self.per_key_concurrency)
+
+        async with self._global_semaphore, semaphore:
+            # Background work has no client waiting on it, so it queues for as long as it takes
+            await admission.admit(admission_key(api_key), expected_model_calls(params), max_wait=float('inf'))
+            generator = get_story_generator(params.pop('model_name'), api_key)
+            result = await generator.generate_story(**params, time_budget=None)
+
+        if result.error:
+            return {'status': 'error', 'error': result.error}
+        return {
+            'status': 'completed',
+            'story': result.text,
+            'truncated': result.truncated,
+            'timings': result.timings
+        }
+
+
+batch_manager = BatchManager(
+    BATCH_STORE_PATH,
+    concurrency=BATCH_CONCURRENCY,
+    per_key_concurrency=BATCH_PER_KEY_CONCURRENCY,
+    job_ttl=BATCH_JOB_TTL,
+    max_jobs=BATCH_MAX_JOBS
+)
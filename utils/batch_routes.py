@@ -0,0 +1,75 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from .batch_jobs import batch_manager
+from .client_pool import key_fingerprint
+from .config import BATCH_MAX_ITEMS
+from .request_utils import get_api_key, parse_generation_request
+from .streaming import format_sse
+
+batch_routes = Blueprint('batch_routes', __name__)
+
+@batch_routes.route('/generate/batch', methods=['POST'])
+def create_batch():
+    api_key = get_api_key()
+    if not api_key:
+        return jsonify({
+            'error': 'API key not found. Please set up your API key first.'
+        }), 401
+
+    data = request.json or {}
+    raw_items = data.get('items')
+    if not isinstance(raw_items, list) or not raw_items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {BATCH_MAX_ITEMS} items per batch'}), 400
+
+    # Batch-level fields (e.g. model, context) apply to every item unless overridden
+    defaults = {key: value for key, value in data.items() if key != 'items'}
+    items = []
+    for raw_item in raw_items:
+        try:
+            params = parse_generation_request({**defaults, **raw_item})
+            if not all([params['topic'], params['expertise'], params['tone']]):
+                params = {'error': 'Missing required fields'}
+        except (TypeError, ValueError) as e:
+            params = {'error': str(e)}
+        items.append(params)
+
+    return jsonify(batch_manager.submit(items, api_key)), 202
+
+@batch_routes.route('/generate/batch/<job_id>', methods=['GET'])
+def get_batch(job_id):
+    api_key = get_api_key()
+    if not api_key:
+        return jsonify({
+            'error': 'API key not found. Please set up your API key first.'
+        }), 401
+
+    job = batch_manager.get(job_id, key_fingerprint(api_key))
+    if not job:
+        return jsonify({'error': 'Batch job not found'}), 404
+    return jsonify(job)
+
+@batch_routes.route('/generate/batch/<job_id>/events', methods=['GET'])
+def stream_batch(job_id):
+    api_key = get_api_key()
+    if not api_key:
+        return jsonify({
+            'error': 'API key not found. Please set up your API key first.'
+        }), 401
+
+    if not batch_manager.get(job_id, key_fingerprint(api_key), include_results=False):
+        return jsonify({'error': 'Batch job not found'}), 404
+
+    def events():
+        for event in batch_manager.iter_events(job_id):
+            event = dict(event)
+            yield format_sse(event.pop('event'), event)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
\ No newline at end of file
@@ -0,0 +1,153 @@
+from typing import AsyncIterator, Iterable, Iterator, List, Tuple
+import re
+
+_SENTENCE_END = re.compile(r'[.!?]["\')\]]*\s')
+
+
+def iter_paragraphs(pieces: Iterable[str]) -> Iterator[str]:
+    """Yield the paragraphs of text arriving in arbitrary pieces.
+
+    Paragraphs are separated by blank lines, which may straddle two pieces.
+    Each piece is scanned once, so the cost is linear in the total length.
+    """
+    current: List[str] = []
+    held_newline = False
+    for piece in pieces:
+        if not piece:
+            continue
+        if held_newline:
+            held_newline = False
+            if piece[0] == '\n':
+                piece = piece[1:]
+                paragraph = ''.join(current).strip()
+                current = []
+                if paragraph:
+                    yield paragraph
+            else:
+                current.append('\n')
+        segments = piece.split('\n\n')
+        for segment in segments[:-1]:
+            current.append(segment)
+            paragraph = ''.join(current).strip()
+            current = []
+            if paragraph:
+                yield paragraph
+        last = segments[-1]
+        if last.endswith('\n'):
+            # Might be the first half of a blank line
+            last = last[:-1]
+            held_newline = True
+        current.append(last)
+    paragraph = ''.join(current).strip()
+    if paragraph:
+        yield paragraph
+
+
+def iter_chunks(pieces: Iterable[str], chunk_size: int) -> Iterator[str]:
+    """Pack paragraphs into chunks of at most ``chunk_size`` characters.
+
+    A paragraph longer than ``chunk_size`` becomes a chunk of its own.
+    """
+    current: List[str] = []
+    length = 0
+    for paragraph in iter_paragraphs(pieces):
+        if current and length + 2 + len(paragraph) > chunk_size:
+            yield '\n\n'.join(current)
+            current, length = [], 0
+        length += len(paragraph) + (2 if current else 0)
+        current.append(paragraph)
+    if current:
+        yield '\n\n'.join(current)
+
+
+def cut_at_boundary(text: str, limit: int, hard: bool = True) -> str:
+    """Cut ``text`` to at most ``limit`` characters at the last paragraph,
+    sentence or word boundary (in that order of preference).
+
+    Without any boundary it cuts at ``limit``, or returns '' if not ``hard``.
+    """
+    if len(text) <= limit:
+        return text
+    head = text[:limit + 1]
+    index = head.rfind('\n\n')
+    if index > 0:
+        return head[:index].rstrip()
+    ends = [match.end() for match in _SENTENCE_END.finditer(head)]
+    if ends:
+        return head[:ends[-1]].rstrip()
+    index = head.rfind(' ')
+    if index > 0:
+        return head[:index].rstrip()
+    return text[:limit] if hard else ''
+
+
+def fit_chunks(chunks: Iterable[str], max_chars: int) -> Tuple[List[str], bool]:
+    """Keep whole chunks while they fit ``max_chars`` (0 = no limit).
+
+    Returns the kept chunks and whether anything was dropped. Stops reading
+    ``chunks`` at the first one that does not fit.
+    """
+    kept: List[str] = []
+    used = 0
+    for chunk in chunks:
+        needed = len(chunk) + (2 if kept else 0)
+        if max_chars and used + needed > max_chars:
+            if not kept:
+                kept.append(cut_at_boundary(chunk, max_chars))
+            return kept, True
+        kept.append(chunk)
+        used += needed
+    return kept, False
+
+
+class OutputBudget:
+    """Caps streamed output at ``max_chars`` (0 = no limit).
+
+    ``limit`` forwards pieces until the budget is reached, cuts the last one
+    at a natural boundary and stops reading, so the rest of the response is
+    never waited for. ``truncated`` tells whether that happened. With a
+    budget, a trailing partial word is held back until the next piece so
+    the cut never splits a word.
+    """
+
+    def __init__(self, max_chars: int = 0):
+        self.max_chars = max_chars
+        self.used = 0
+        self.truncated = False
+
+    def _take(self, text: str) -> str:
+        room = self.max_chars - self.used
+        if len(text) > room:
+            self.truncated = True
+            # Mid-stream, rather stop early than split a word
+            text = cut_at_boundary(text, room, hard=not self.used)
+        self.used += len(text)
+        return text
+
+    async def limit(self, pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+        if not self.max_chars:
+            async for piece in pieces:
+                yield piece
+            return
+        pending = ''
+        try:
+            async for piece in pieces:
+                text = pending + piece
+                split = max(text.rfind(' '), text.rfind('\n')) + 1
+                if split == 0 and len(text) < 200:
+                    pending = text
+                    continue
+                text, pending = (text[:split], text[split:]) if split else (text, '')
+                text = self._take(text)
+                if text:
+                    yield text
+                if self.truncated:
+                    return
+            text = self._take(pending)
+            if text:
+                yield text
+        finally:
+            # Stop the upstream stream now rather than when it is collected
+            aclose = getattr(pieces, 'aclose', None)
+            if aclose is not None:
+                await aclose()
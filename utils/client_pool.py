@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+import hashlib
+import threading
+import time
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Stable, non-reversible identifier for an API key."""
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+
+class ClientPool:
+    """Thread-safe pool of reusable objects keyed by (API key, model name).
+
+    Objects are built by ``factory(model_name, api_key)`` on first use and
+    reused afterwards. Entries unused for ``idle_timeout`` seconds are
+    dropped, as are the least recently used ones beyond ``max_size``.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str, str], Any],
+        idle_timeout: float = 900,
+        max_size: int = 128
+    ):
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Tuple[Hashable, ...], list]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str, api_key: str) -> Any:
+        key = (key_fingerprint(api_key), model_name)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = [self.factory(model_name, api_key), now]
+                self._entries[key] = entry
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            entry[1] = now
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _evict_idle(self, now: float):
+        while self._entries:
+            key, (_, last_used) = next(iter(self._entries.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'size': len(self._entries)}
@@ -1,9 +1,147 @@
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
+import functools
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Model backend: 'gemini', or 'fake' for an offline, deterministic stand-in
+# used by benchmarks and local runs (no API key needed)
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'gemini')
+FAKE_MODEL_LATENCY = float(os.getenv('FAKE_MODEL_LATENCY', 0.3))  # seconds to first token
+FAKE_MODEL_TOKENS_PER_SEC = float(os.getenv('FAKE_MODEL_TOKENS_PER_SEC', 150))
+FAKE_MODEL_OUTPUT_TOKENS = int(os.getenv('FAKE_MODEL_OUTPUT_TOKENS', 1000))
+FAKE_MODEL_ERROR_RATE = float(os.getenv('FAKE_MODEL_ERROR_RATE', 0))  # share of calls failing with a 503
+FAKE_MODEL_RATE_LIMIT_RATE = float(os.getenv('FAKE_MODEL_RATE_LIMIT_RATE', 0))  # share failing with a 429
+FAKE_MODEL_SEED = int(os.getenv('FAKE_MODEL_SEED', 0))
+# Latency tail: this share of calls waits FAKE_MODEL_SLOW_LATENCY seconds instead
+FAKE_MODEL_SLOW_RATE = float(os.getenv('FAKE_MODEL_SLOW_RATE', 0))
+FAKE_MODEL_SLOW_LATENCY = float(os.getenv('FAKE_MODEL_SLOW_LATENCY', 10))
+
+# Maximum number of model calls in flight per process
+MODEL_CONCURRENCY = int(os.getenv('MODEL_CONCURRENCY', 16))
+# Maximum number of open model streams per process (a stream holds a thread until it ends)
+MODEL_STREAM_CONCURRENCY = int(os.getenv('MODEL_STREAM_CONCURRENCY', 16))
+
+# Minimum spacing between calls to the same model (seconds); widened automatically on 429s
+MODEL_MIN_INTERVAL = float(os.getenv('MODEL_MIN_INTERVAL', 0))
+
+# Retry policy for model calls and the per-model circuit breaker
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', 4))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 0.5))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 20))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', 30))
+
+# YouTube reference ingestion (off by default: it adds model calls before part 1)
+ENABLE_YOUTUBE_REFERENCES = os.getenv('ENABLE_YOUTUBE_REFERENCES', 'false').lower() == 'true'
+# Concurrent video fetches, and model calls (chunk analyses and combines)
+# per reference run; one video's chunks use at most REFERENCE_VIDEO_CONCURRENCY
+# of those calls so every video keeps making progress
+REFERENCE_CONCURRENCY = int(os.getenv('REFERENCE_CONCURRENCY', 5))
+REFERENCE_MODEL_CONCURRENCY = int(os.getenv('REFERENCE_MODEL_CONCURRENCY', 16))
+REFERENCE_VIDEO_CONCURRENCY = int(os.getenv('REFERENCE_VIDEO_CONCURRENCY', 4))
+# Token budgets: transcript chunk per analysis call, and the condensed
+# reference material that is added to the story context
+REFERENCE_CHUNK_TOKENS = int(os.getenv('REFERENCE_CHUNK_TOKENS', 6000))
+REFERENCE_TOKEN_BUDGET = int(os.getenv('REFERENCE_TOKEN_BUDGET', 1500))
+REFERENCE_MAX_CHUNKS = int(os.getenv('REFERENCE_MAX_CHUNKS', 12))  # per video
+
+# Transcript and per-video analysis cache shared by workers (empty path disables it)
+REFERENCE_CACHE_PATH = os.getenv('REFERENCE_CACHE_PATH', 'data/references.db')
+REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 7 * 24 * 3600))
+REFERENCE_CACHE_MAX_BYTES = int(os.getenv('REFERENCE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Observability: X-Debug-Timings: 1 on /generate returns per-stage timings in
+# an X-Storyx-Timings header
+DEBUG_TIMINGS_HEADER = os.getenv('DEBUG_TIMINGS_HEADER', 'true').lower() == 'true'
+
+# ASGI serving (asgi.py): seconds to let in-flight requests finish on shutdown,
+# and threads for routes served through the WSGI app
+ASGI_DRAIN_TIMEOUT = float(os.getenv('ASGI_DRAIN_TIMEOUT', 60))
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 16))
+
+# Admission control: each API key (and, with ADMISSION_PER_IP, each client
+# IP) earns this many model calls per minute, up to ADMISSION_BURST. A story
+# is charged its expected calls up front and waits up to ADMISSION_MAX_WAIT
+# seconds for them, else gets a 429. Buckets live in SQLite so gunicorn
+# workers share them (empty path disables admission control).
+ADMISSION_PATH = os.getenv('ADMISSION_PATH', 'data/admission.db')
+ADMISSION_CALLS_PER_MINUTE = float(os.getenv('ADMISSION_CALLS_PER_MINUTE', 60))
+ADMISSION_BURST = float(os.getenv('ADMISSION_BURST', 20))
+ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', 15))
+ADMISSION_PER_IP = os.getenv('ADMISSION_PER_IP', 'false').lower() == 'true'
+
+# Story length limits and the serverless time budget they must fit in
+MAX_STORY_PARTS = int(os.getenv('MAX_STORY_PARTS', 5))
+MAX_EXECUTION_TIME = int(os.getenv('MAX_EXECUTION_TIME', 30))
+
+# Parts are split at paragraph boundaries into chunks of about this many
+# characters; a part's stream is stopped once it reaches PART_MAX_CHARS (0 = no limit)
+OUTPUT_CHUNK_CHARS = int(os.getenv('OUTPUT_CHUNK_CHARS', 1500))
+PART_MAX_CHARS = int(os.getenv('PART_MAX_CHARS', 0))
+
+# Overlap summary calls with the generation of the next part
+PIPELINE_PARTS = os.getenv('PIPELINE_PARTS', 'true').lower() == 'true'
+# When pipelined, a previous part up to this many characters is passed to the
+# next part in full instead of as its closing excerpt
+PIPELINE_FULL_PART_CHARS = int(os.getenv('PIPELINE_FULL_PART_CHARS', 2000))
+
+# How finished parts are summarized for later parts: 'llm' (model call) or
+# 'extractive' (local sentence scoring); requests may pick either
+SUMMARIZERS = ['llm', 'extractive']
+SUMMARIZER = os.getenv('SUMMARIZER', 'llm')
+EXTRACTIVE_SUMMARY_WORDS = int(os.getenv('EXTRACTIVE_SUMMARY_WORDS', 150))
+
+# Generated stories kept for /download/<id> and /stories: metadata in SQLite,
+# rendered files under the directory (empty path disables the store)
+STORY_STORE_PATH = os.getenv('STORY_STORE_PATH', 'data/stories.db')
+STORY_STORE_DIR = os.getenv('STORY_STORE_DIR', 'data/stories')
+STORY_LIST_MAX_LIMIT = int(os.getenv('STORY_LIST_MAX_LIMIT', 100))
+
+# Near-duplicate topics: stored stories with the same parameters and a topic
+# this similar (Jaccard over normalized words) are offered with the response
+# ('offer'), returned instead of generating ('serve'), or ignored ('off').
+# Requests may pick a mode with "reuse"; no_cache always generates.
+TOPIC_REUSE_MODES = ['off', 'offer', 'serve']
+TOPIC_REUSE = os.getenv('TOPIC_REUSE', 'offer')
+TOPIC_MATCH_THRESHOLD = float(os.getenv('TOPIC_MATCH_THRESHOLD', 0.6))
+# MinHash LSH shape: more bands find less similar topics, more rows per band
+# give fewer false candidates
+TOPIC_LSH_BANDS = int(os.getenv('TOPIC_LSH_BANDS', 12))
+TOPIC_LSH_ROWS = int(os.getenv('TOPIC_LSH_ROWS', 3))
+# Stories read per batch while loading, and seconds between syncs with the store
+TOPIC_INDEX_BATCH = int(os.getenv('TOPIC_INDEX_BATCH', 5000))
+TOPIC_INDEX_REFRESH = float(os.getenv('TOPIC_INDEX_REFRESH', 30))
+
+# Response cache: in-memory LRU plus an optional SQLite tier shared by workers
+GENERATION_CACHE_SIZE = int(os.getenv('GENERATION_CACHE_SIZE', 256))
+GENERATION_CACHE_TTL = int(os.getenv('GENERATION_CACHE_TTL', 3600))
+GENERATION_CACHE_PATH = os.getenv('GENERATION_CACHE_PATH', '')  # e.g. data/cache/generations.db
+GENERATION_CACHE_MAX_BYTES = int(os.getenv('GENERATION_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Pooled model clients and generators, keyed by API key and model name
+CLIENT_POOL_IDLE_TIMEOUT = int(os.getenv('CLIENT_POOL_IDLE_TIMEOUT', 900))
+CLIENT_POOL_MAX_SIZE = int(os.getenv('CLIENT_POOL_MAX_SIZE', 128))
+
+# Batch generation: overall and per-API-key story concurrency, job retention
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+BATCH_PER_KEY_CONCURRENCY = int(os.getenv('BATCH_PER_KEY_CONCURRENCY', 4))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+BATCH_JOB_TTL = int(os.getenv('BATCH_JOB_TTL', 3600))
+BATCH_MAX_JOBS = int(os.getenv('BATCH_MAX_JOBS', 200))
+# Batch state and results, shared by every worker
+BATCH_STORE_PATH = os.getenv('BATCH_STORE_PATH', 'data/batches.db')
+
+# Durable background jobs for stories too long for one request
+JOB_WORKER_ENABLED = os.getenv('JOB_WORKER_ENABLED', 'true').lower() == 'true'
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'data/jobs.db')
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', 2))
+JOB_MAX_PARTS = int(os.getenv('JOB_MAX_PARTS', 20))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 120))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+
 AVAILABLE_MODELS = [
     'gemini-1.0-pro',
     'gemini-1.5-flash',
@@ -15,6 +153,63 @@ AVAILABLE_MODELS = [
     'gemini-2.0-flash-exp'
 ]
 
+# Input (context window) and output token limits per model
+MODEL_LIMITS = {
+    'gemini-1.0-pro': {'context_tokens': 30720, 'output_tokens': 2048},
+    'gemini-1.5-flash': {'context_tokens': 1048576, 'output_tokens': 8192},
+    'gemini-1.5-flash-8b': {'context_tokens': 1048576, 'output_tokens': 8192},
+    'gemini-1.5-flash-8b-exp': {'context_tokens': 1048576, 'output_tokens': 8192},
+    'gemini-1.5-flash-exp': {'context_tokens': 1048576, 'output_tokens': 8192},
+    'gemini-1.5-pro': {'context_tokens': 2097152, 'output_tokens': 8192},
+    'gemini-1.5-pro-exp': {'context_tokens': 2097152, 'output_tokens': 8192},
+    'gemini-2.0-flash-exp': {'context_tokens': 1048576, 'output_tokens': 8192}
+}
+
+# List price in USD per million input tokens, used to pick the cheapest model
+MODEL_COSTS = {
+    'gemini-1.0-pro': 0.5,
+    'gemini-1.5-flash': 0.075,
+    'gemini-1.5-flash-8b': 0.0375,
+    'gemini-1.5-pro': 1.25,
+    'gemini-2.0-flash-exp': 0.1
+}
+
+# Model routing (utils/model_router.py). A call still unanswered after the
+# model's recent ROUTER_HEDGE_PERCENTILE latency gets a second, hedged call
+# (to the model mapped in ROUTER_HEDGE_MODELS, e.g. "gemini-1.5-pro=gemini-1.5-flash",
+# else the same model) and the first answer wins. Calls to a model whose
+# breaker is open go to ROUTER_FALLBACK_MODEL. Summaries go to
+# ROUTER_SUMMARY_MODEL: empty (default) for the story's model, a model name, or
+# 'cheapest' for the lowest-cost entry in MODEL_COSTS.
+ROUTER_HEDGE_ENABLED = os.getenv('ROUTER_HEDGE_ENABLED', 'true').lower() == 'true'
+ROUTER_HEDGE_PERCENTILE = float(os.getenv('ROUTER_HEDGE_PERCENTILE', 0.9))
+ROUTER_HEDGE_MIN_DELAY = float(os.getenv('ROUTER_HEDGE_MIN_DELAY', 1))
+# Hedge delay until a model has ROUTER_MIN_SAMPLES recent latencies
+ROUTER_HEDGE_DEFAULT_DELAY = float(os.getenv('ROUTER_HEDGE_DEFAULT_DELAY', 10))
+ROUTER_MIN_SAMPLES = int(os.getenv('ROUTER_MIN_SAMPLES', 20))
+ROUTER_HEDGE_MODELS = dict(
+    pair.split('=', 1) for pair in os.getenv('ROUTER_HEDGE_MODELS', '').split(',') if '=' in pair
+)
+ROUTER_FALLBACK_MODEL = os.getenv('ROUTER_FALLBACK_MODEL', 'gemini-1.5-flash-8b')
+ROUTER_SUMMARY_MODEL = os.getenv('ROUTER_SUMMARY_MODEL', '')
+
+# Provider-side caching of the stable prompt prefix: 'off', 'gemini' or 'stub'
+# (in-process, for local runs). Opt-in: it only pays off for prompts with a large
+# context or reference section. Gemini 1.5 models need a prefix of at least 32,768
+# tokens, so with 'gemini' PROMPT_TOKEN_BUDGET must be raised above that.
+CONTEXT_CACHE_BACKEND = os.getenv('CONTEXT_CACHE_BACKEND', 'off')
+CONTEXT_CACHE_TTL = int(os.getenv('CONTEXT_CACHE_TTL', 600))
+# Smallest prefix to cache; empty uses the backend's minimum (gemini 32768, stub 1024)
+CONTEXT_CACHE_MIN_TOKENS = (
+    int(os.getenv('CONTEXT_CACHE_MIN_TOKENS')) if os.getenv('CONTEXT_CACHE_MIN_TOKENS') else None
+)
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv('CONTEXT_CACHE_MAX_ENTRIES', 64))
+
+# Story prompts are trimmed to fit this many tokens (or the model's window, if smaller)
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 32000))
+# 'estimate' counts tokens locally; 'exact' asks the model's count_tokens endpoint
+TOKEN_COUNT_MODE = os.getenv('TOKEN_COUNT_MODE', 'estimate')
+
 EXPERTISE_LEVELS = [
     'storyteller',
     'novelist',
@@ -50,6 +245,11 @@ WRITING_STYLES = [
     'balanced'    # Present multiple viewpoints
 ]
 
+# Topics are classified by keyword using this taxonomy file (see
+# utils/topic_classifier.py); recent topics' results are cached
+TOPIC_TAXONOMY_PATH = os.getenv('TOPIC_TAXONOMY_PATH', 'data/topic_taxonomy.json')
+TOPIC_CLASSIFIER_CACHE_SIZE = int(os.getenv('TOPIC_CLASSIFIER_CACHE_SIZE', 4096))
+
 # Define topic categories
 TOPIC_CATEGORIES = {
     'general': {
@@ -83,35 +283,29 @@ def init_gemini(model_name='gemini-2.0-flash-exp', api_key=None):
     
     if not api_key:
         raise ValueError("API key not found")
-        
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel(model_name)
 
-def get_topic_category(topic: str) -> str:
-    """
-    Determine the most likely category for a given topic based on keywords.
-    
-    Args:
-        topic (str): The topic to categorize
-        
-    Returns:
-        str: The determined category name
+    return bind_client(genai.GenerativeModel(model_name), api_key)
+
+
+@functools.lru_cache(maxsize=CLIENT_POOL_MAX_SIZE)
+def generative_client(api_key: str):
+    """The shared GenerativeServiceClient for one API key."""
+    return glm.GenerativeServiceClient(client_options={'api_key': api_key})
+
+
+def bind_client(model, api_key: str):
+    """Make ``model`` (a GenerativeModel) send its calls with ``api_key``.
+
+    The SDK only configures keys process-wide (``genai.configure``), which
+    races between requests using different keys, and has no public
+    per-model client. This is the one place that sets the model's private
+    ``_client``; if an SDK upgrade drops it, fail here rather than silently
+    falling back to the default key.
     """
-    # Convert topic to lowercase for case-insensitive matching
-    topic_lower = topic.lower()
-    
-    # Define keyword mappings for each category
-    category_keywords = {
-        'technical': ['programming', 'technology', 'science', 'engineering', 'math', 'data', 'algorithm', 'system'],
-        'creative': ['art', 'music', 'writing', 'design', 'creative', 'story', 'poetry', 'fiction'],
-        'educational': ['learning', 'education', 'teaching', 'study', 'academic', 'school', 'university', 'course'],
-        'business': ['business', 'marketing', 'finance', 'management', 'strategy', 'entrepreneurship', 'startup']
-    }
-    
-    # Check for keyword matches
-    for category, keywords in category_keywords.items():
-        if any(keyword in topic_lower for keyword in keywords):
-            return category
-            
-    # Default to general if no specific category is matched
-    return 'general'
\ No newline at end of file
+    if not hasattr(model, '_client'):
+        raise RuntimeError(
+            "This google-generativeai version has no GenerativeModel._client; "
+            "per-key clients in config.bind_client need updating"
+        )
+    model._client = generative_client(api_key)
+    return model
@@ -0,0 +1,347 @@
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+from .config import (
+    bind_client, CONTEXT_CACHE_BACKEND, CONTEXT_CACHE_TTL, CONTEXT_CACHE_MIN_TOKENS, CONTEXT_CACHE_MAX_ENTRIES,
+    PROMPT_TOKEN_BUDGET
+)
+from .client_pool import key_fingerprint
+from .metrics import metrics
+from .model_client import run_blocking
+from .tokens import estimate_tokens
+from google.ai import generativelanguage as glm
+import google.generativeai as genai
+import asyncio
+import datetime
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+
+class ContextCacheBackend:
+    """Provider-side storage for a prompt prefix that later calls refer to."""
+
+    # Smallest prefix the provider accepts, in tokens
+    min_tokens = 0
+
+    def supports(self, model_name: str) -> bool:
+        return True
+
+    def create(self, model_name: str, api_key: str, prefix: str, ttl: float) -> str:
+        """Register ``prefix`` and return a handle for it."""
+        raise NotImplementedError
+
+    def bind(self, model, model_name: str, api_key: str, handle: str):
+        """Return a model whose ``generate_content`` prepends the cached prefix."""
+        raise NotImplementedError
+
+    def delete(self, api_key: str, handle: str):
+        pass
+
+
+class GeminiContextCache(ContextCacheBackend):
+    """Gemini context caching (``cachedContents``).
+
+    Cached content must name an explicit model version, so only models
+    listed in ``MODEL_VERSIONS`` are cached. Gemini 1.5 models only accept
+    prefixes of at least 32,768 tokens.
+    """
+
+    min_tokens = 32768
+
+    MODEL_VERSIONS = {
+        'gemini-1.5-flash': 'models/gemini-1.5-flash-002',
+        'gemini-1.5-flash-8b': 'models/gemini-1.5-flash-8b-001',
+        'gemini-1.5-pro': 'models/gemini-1.5-pro-002'
+    }
+
+    def supports(self, model_name: str) -> bool:
+        return model_name in self.MODEL_VERSIONS
+
+    def _client(self, api_key: str):
+        return glm.CacheServiceClient(client_options={'api_key': api_key})
+
+    def create(self, model_name: str, api_key: str, prefix: str, ttl: float) -> str:
+        cached = self._client(api_key).create_cached_content(
+            cached_content=glm.CachedContent(
+                model=self.MODEL_VERSIONS[model_name],
+                contents=[glm.Content(role='user', parts=[glm.Part(text=prefix)])],
+                ttl=datetime.timedelta(seconds=ttl)
+            )
+        )
+        return cached.name
+
+    def bind(self, model, model_name: str, api_key: str, handle: str):
+        cached_model = genai.GenerativeModel(self.MODEL_VERSIONS[model_name])
+        # from_cached_content would fetch the handle with the default key, so
+        # set the attribute it sets, and check the public property reads it
+        cached_model._cached_content = handle
+        if getattr(cached_model, 'cached_content', None) != handle:
+            raise RuntimeError(
+                "This google-generativeai version does not bind cached content this way; "
+                "GeminiContextCache.bind needs updating"
+            )
+        return bind_client(cached_model, api_key or os.getenv('GEMINI_API_KEY'))
+
+    def delete(self, api_key: str, handle: str):
+        self._client(api_key).delete_cached_content(name=handle)
+
+
+class NotFound(LookupError):
+    """Raised by the stub for a missing or expired handle, like the provider's
+    NotFound (which the retry policy does not retry)."""
+
+
+class StubContextCache(ContextCacheBackend):
+    """In-process stand-in for provider caching, for local runs and checks.
+
+    Bound models send the stored prefix plus the suffix to the real model,
+    so output matches an uncached call; an expired or deleted handle fails
+    the way a provider would.
+    """
+
+    min_tokens = 1024
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, model_name: str, api_key: str, prefix: str, ttl: float) -> str:
+        handle = f"cachedContents/stub-{uuid.uuid4().hex}"
+        with self._lock:
+            self.entries[handle] = (prefix, time.time() + ttl)
+        return handle
+
+    def lookup(self, handle: str) -> str:
+        with self._lock:
+            prefix, expires = self.entries.get(handle, (None, 0))
+        if prefix is None or expires <= time.time():
+            raise NotFound(f"Cached content {handle} not found or expired")
+        return prefix
+
+    def bind(self, model, model_name: str, api_key: str, handle: str):
+        return _StubCachedModel(self, model, handle)
+
+    def delete(self, api_key: str, handle: str):
+        with self._lock:
+            self.entries.pop(handle, None)
+
+
+class _StubCachedModel:
+    def __init__(self, backend: StubContextCache, model, handle: str):
+        self.backend = backend
+        self.model = model
+        self.handle = handle
+
+    def generate_content(self, suffix: str, **kwargs):
+        return self.model.generate_content(self.backend.lookup(self.handle) + suffix, **kwargs)
+
+
+class _Entry:
+    __slots__ = ('handle', 'api_key', 'expires', 'tokens', 'users', 'retired')
+
+    def __init__(self, handle: str, api_key: str, expires: float, tokens: int):
+        self.handle = handle
+        self.api_key = api_key
+        self.expires = expires
+        self.tokens = tokens
+        self.users = 0  # calls currently holding the handle
+        self.retired = False  # no longer in the table; delete once unused
+
+
+class ContextCacheManager:
+    """Registers stable prompt prefixes with a backend and reuses the handles.
+
+    Handles are shared by every request with the same API key, model and
+    prefix, renewed shortly before their TTL runs out, and the least
+    recently used ones are dropped beyond ``max_entries``. A dropped,
+    renewed or invalidated handle is deleted once no call holds it. Prefixes
+    shorter than ``min_tokens`` (by default the backend's minimum) are not
+    cached. Each reuse of a handle counts the prefix's tokens as saved.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[ContextCacheBackend],
+        ttl: float = 600,
+        min_tokens: Optional[int] = None,
+        max_entries: int = 64,
+        count: Callable[[str], int] = estimate_tokens
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        if min_tokens is None:
+            min_tokens = backend.min_tokens if backend else 0
+        self.min_tokens = min_tokens
+        self.max_entries = max_entries
+        self.count = count
+        self._entries: 'OrderedDict[Tuple[str, str, str], _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._creating: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._stats = {
+            'created': 0, 'reused': 0, 'too_small': 0, 'failures': 0,
+            'invalidated': 0, 'saved_tokens': 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _key(self, model_name: str, api_key: str, prefix: str) -> Tuple[str, str, str]:
+        return (
+            key_fingerprint(api_key), model_name,
+            hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+        )
+
+    def _fresh(self, key) -> Optional[_Entry]:
+        # Renew a little early so a handle never expires mid-call
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires - min(60, self.ttl / 4) > time.time():
+            self._entries.move_to_end(key)
+            return entry
+        return None
+
+    @asynccontextmanager
+    async def use(
+        self, model, model_name: str, api_key: Optional[str], prefix: str
+    ) -> AsyncIterator[Optional[Any]]:
+        """Yield ``model`` bound to the cached ``prefix``, or None to send it in full.
+
+        The handle is not deleted while the block runs.
+        """
+        entry = await self._acquire(model_name, api_key, prefix)
+        if entry is None:
+            yield None
+            return
+        try:
+            yield self.backend.bind(model, model_name, api_key, entry.handle)
+        finally:
+            self._release(entry)
+
+    async def _acquire(self, model_name: str, api_key: Optional[str], prefix: str) -> Optional[_Entry]:
+        if not self.enabled or not self.backend.supports(model_name):
+            return None
+        api_key = api_key or os.getenv('GEMINI_API_KEY')
+        key = self._key(model_name, api_key, prefix)
+        with self._lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                entry.users += 1
+                self._stats['reused'] += 1
+                self._stats['saved_tokens'] += entry.tokens
+        if entry is not None:
+            metrics.inc('cache_requests', cache='context', result='hit')
+            return entry
+        tokens = self.count(prefix)
+        if tokens < self.min_tokens:
+            with self._lock:
+                self._stats['too_small'] += 1
+            metrics.inc('cache_requests', cache='context', result='too_small')
+            return None
+        try:
+            return await run_blocking(self._create, key, model_name, api_key, prefix, tokens)
+        except Exception as e:
+            print(f"Context cache create failed: {str(e)}")
+            with self._lock:
+                self._stats['failures'] += 1
+            return None
+
+    def _create(self, key, model_name: str, api_key: str, prefix: str, tokens: int) -> _Entry:
+        # One creation per prefix at a time; latecomers reuse the result
+        with self._lock:
+            creating = self._creating.setdefault(key, threading.Lock())
+        with creating:
+            with self._lock:
+                entry = self._fresh(key)
+                if entry is not None:
+                    entry.users += 1
+                    self._stats['reused'] += 1
+                    self._stats['saved_tokens'] += entry.tokens
+                    metrics.inc('cache_requests', cache='context', result='hit')
+                    return entry
+            handle = self.backend.create(model_name, api_key, prefix, self.ttl)
+            entry = _Entry(handle, api_key, time.time() + self.ttl, tokens)
+            entry.users = 1
+            with self._lock:
+                unused = self._retire(self._entries.pop(key, None))
+                self._entries[key] = entry
+                self._stats['created'] += 1
+                while len(self._entries) > self.max_entries:
+                    unused += self._retire(self._entries.popitem(last=False)[1])
+                self._creating.pop(key, None)
+        metrics.inc('cache_requests', cache='context', result='miss')
+        for old in unused:
+            self._delete(old)
+        return entry
+
+    def _retire(self, entry: Optional[_Entry]) -> list:
+        """Mark a dropped entry; returns it if nothing holds it and it can go now.
+
+        Call with the lock held.
+        """
+        if entry is None:
+            return []
+        entry.retired = True
+        return [entry] if entry.users == 0 else []
+
+    def _release(self, entry: _Entry):
+        with self._lock:
+            entry.users -= 1
+            unused = entry.retired and entry.users == 0
+        if unused:
+            self._delete_later(entry)
+
+    def _delete_later(self, entry: _Entry):
+        # Deleting is a network call; keep it off the event loop
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._delete, entry)
+        except RuntimeError:
+            self._delete(entry)
+
+    def invalidate(self, model_name: str, api_key: Optional[str], prefix: str):
+        """Forget a handle the provider rejected; the next call recreates it."""
+        key = self._key(model_name, api_key or os.getenv('GEMINI_API_KEY'), prefix)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._stats['invalidated'] += 1
+            unused = self._retire(entry)
+        for old in unused:
+            self._delete_later(old)
+
+    def _delete(self, entry: _Entry):
+        try:
+            self.backend.delete(entry.api_key, entry.handle)
+        except Exception as e:
+            print(f"Context cache delete failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['backend'] = type(self.backend).__name__ if self.backend else None
+        return stats
+
+
+def make_backend(name: str) -> Optional[ContextCacheBackend]:
+    if name == 'gemini':
+        return GeminiContextCache()
+    if name == 'stub':
+        return StubContextCache()
+    return None
+
+
+context_cache = ContextCacheManager(
+    make_backend(CONTEXT_CACHE_BACKEND),
+    ttl=CONTEXT_CACHE_TTL,
+    min_tokens=CONTEXT_CACHE_MIN_TOKENS,
+    max_entries=CONTEXT_CACHE_MAX_ENTRIES
+)
+
+if context_cache.enabled and context_cache.min_tokens > PROMPT_TOKEN_BUDGET:
+    print(
+        f"Context cache minimum ({context_cache.min_tokens} tokens) is above PROMPT_TOKEN_BUDGET "
+        f"({PROMPT_TOKEN_BUDGET}); no prompt prefix will be cached"
+    )
@@ -0,0 +1,206 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from .config import (
+    GENERATION_CACHE_SIZE, GENERATION_CACHE_TTL,
+    GENERATION_CACHE_PATH, GENERATION_CACHE_MAX_BYTES
+)
+from .metrics import metrics
+from .model_client import run_blocking
+from .storage import get_connection
+import hashlib
+import threading
+import time
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS generations (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        expires REAL NOT NULL,
+        accessed REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS generations_accessed ON generations (accessed)',
+    'CREATE INDEX IF NOT EXISTS generations_expires ON generations (expires)',
+    # Running total of the values' sizes, so writes never have to sum the table
+    'CREATE TABLE IF NOT EXISTS generation_bytes (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO generation_bytes VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM generations))',
+    '''CREATE TRIGGER IF NOT EXISTS generations_added AFTER INSERT ON generations BEGIN
+        UPDATE generation_bytes SET total = total + NEW.size;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS generations_resized AFTER UPDATE OF size ON generations BEGIN
+        UPDATE generation_bytes SET total = total + NEW.size - OLD.size;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS generations_removed AFTER DELETE ON generations BEGIN
+        UPDATE generation_bytes SET total = total - OLD.size;
+    END'''
+)
+
+
+class GenerationCache:
+    """Cache of model responses keyed by model name and rendered prompt.
+
+    A bounded in-memory LRU sits in front of an optional SQLite tier that is
+    shared by every worker pointing at the same file. Both tiers expire
+    entries after ``ttl`` seconds; the disk tier also evicts least recently
+    used entries once it grows past ``disk_max_bytes``.
+
+    Disk access runs through ``run_blocking``, off the event loop. The disk
+    tier's total size is kept up to date by triggers, and access times of
+    disk hits are written in batches of ``touch_batch``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600,
+        disk_path: Optional[str] = None,
+        disk_max_bytes: int = 64 * 1024 * 1024,
+        touch_batch: int = 64
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self.touch_batch = touch_batch
+        self._memory: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0,
+            'stores': 0, 'evictions': 0
+        }
+        if disk_path:
+            for statement in _SCHEMA:
+                self._db().execute(statement)
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return f"{model_name}:{digest}"
+
+    def _db(self):
+        return get_connection(self.disk_path)
+
+    def _count(self, *names: str):
+        with self._lock:
+            for name in names:
+                self._stats[name] += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    self._stats['hits'] += 1
+                    self._stats['memory_hits'] += 1
+                    metrics.inc('cache_requests', cache='generation', result='memory_hit')
+                    return value
+                del self._memory[key]
+
+        if self.disk_path:
+            try:
+                row = await run_blocking(self._disk_get, key, now)
+                if row:
+                    self._remember(key, *row)
+                    self._count('hits', 'disk_hits')
+                    metrics.inc('cache_requests', cache='generation', result='disk_hit')
+                    return row[0]
+            except Exception as e:
+                print(f"Generation cache read failed: {str(e)}")
+
+        self._count('misses')
+        metrics.inc('cache_requests', cache='generation', result='miss')
+        return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        row = self._db().execute(
+            'SELECT value, expires FROM generations WHERE key = ? AND expires > ?', (key, now)
+        ).fetchone()
+        if row:
+            with self._lock:
+                self._touched[key] = now
+                flush = len(self._touched) >= self.touch_batch
+            if flush:
+                self._flush_touched(self._db())
+        return row
+
+    def _flush_touched(self, db):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            db.executemany(
+                'UPDATE generations SET accessed = ? WHERE key = ?',
+                [(accessed, key) for key, accessed in touched.items()]
+            )
+
+    def _remember(self, key: str, value: str, expires: float):
+        with self._lock:
+            self._memory[key] = (expires, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    async def set(self, key: str, value: str):
+        now = time.time()
+        expires = now + self.ttl
+        self._remember(key, value, expires)
+        self._count('stores')
+
+        if self.disk_path:
+            try:
+                await run_blocking(self._disk_set, key, value, now, expires)
+            except Exception as e:
+                print(f"Generation cache write failed: {str(e)}")
+
+    def _disk_set(self, key: str, value: str, now: float, expires: float):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Recent hits count as recent before choosing what to evict
+            self._flush_touched(db)
+            db.execute(
+                'INSERT INTO generations (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                'expires = excluded.expires, accessed = excluded.accessed',
+                (key, value, len(value.encode('utf-8')), expires, now)
+            )
+            db.execute('DELETE FROM generations WHERE expires <= ?', (now,))
+            excess = db.execute('SELECT total FROM generation_bytes').fetchone()[0] - self.disk_max_bytes
+            doomed = []
+            if excess > 0:
+                for row_key, size in db.execute('SELECT key, size FROM generations ORDER BY accessed'):
+                    if excess <= 0:
+                        break
+                    doomed.append((row_key,))
+                    excess -= size
+                db.executemany('DELETE FROM generations WHERE key = ?', doomed)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self._count(*(['evictions'] * len(doomed)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+        if self.disk_path:
+            self._db().execute('DELETE FROM generations')
+
+
+generation_cache = GenerationCache(
+    max_entries=GENERATION_CACHE_SIZE,
+    ttl=GENERATION_CACHE_TTL,
+    disk_path=GENERATION_CACHE_PATH or None,
+    disk_max_bytes=GENERATION_CACHE_MAX_BYTES
+)
@@ -0,0 +1,345 @@
+from typing import Any, Dict, List, Optional, Tuple
+from .admission import admission, admission_key, expected_model_calls
+from .background import background_loop
+from .client_pool import key_fingerprint
+from .config import (
+    JOB_QUEUE_PATH, JOB_WORKER_CONCURRENCY, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+)
+from .model_client import run_blocking
+from .retry_policy import FATAL
+from .storage import get_connection
+from .story_generator import get_story_generator
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        params TEXT NOT NULL,
+        owner TEXT,
+        status TEXT NOT NULL,
+        total_parts INTEGER NOT NULL,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        lease_until REAL NOT NULL DEFAULT 0,
+        created REAL NOT NULL,
+        updated REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)',
+    '''CREATE TABLE IF NOT EXISTS job_parts (
+        job_id TEXT NOT NULL,
+        part INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        summary TEXT,
+        created REAL NOT NULL,
+        PRIMARY KEY (job_id, part)
+    )'''
+)
+
+
+class JobQueue:
+    """Durable queue of long story generations backed by SQLite.
+
+    Every finished part and summary is checkpointed as soon as it is
+    produced. A worker holds a lease on the job it is running and renews it
+    while it works; if the process dies the lease runs out and the next
+    worker to claim the job resumes after the last checkpointed part.
+
+    The worker's SQLite calls run through ``run_blocking`` so they never
+    block the shared background loop.
+
+    Every job belongs to the fingerprint of the API key that created it
+    (``owner``), and only that owner can read or resume it. API keys are
+    never written to the database: the process that enqueued a job holds
+    its key in memory and keeps the job reserved while it waits. A job
+    whose key is gone (the process exited) fails once its lease runs out
+    and its owner can resume it; jobs on the server's own key can be
+    picked up by any worker.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        concurrency: int = 2,
+        lease_seconds: float = 120,
+        max_attempts: int = 3,
+        poll_interval: float = 1.0
+    ):
+        self.path = path
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._worker_started = False
+        self._keys: Dict[str, str] = {}
+        self._keys_lock = threading.Lock()
+        for statement in _SCHEMA:
+            self._db().execute(statement)
+        self._migrate()
+
+    def _migrate(self):
+        db = self._db()
+        columns = {row[1] for row in db.execute('PRAGMA table_info(jobs)')}
+        if 'owner' not in columns:
+            # Jobs that stored a session key now belong to its fingerprint and
+            # the key is dropped; the rest stay hidden from everyone
+            db.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+            for job_id, api_key in db.execute(
+                'SELECT id, api_key FROM jobs WHERE api_key IS NOT NULL'
+            ).fetchall():
+                db.execute('UPDATE jobs SET owner = ? WHERE id = ?', (key_fingerprint(api_key), job_id))
+        if 'api_key' in columns:
+            db.execute('UPDATE jobs SET api_key = NULL WHERE api_key IS NOT NULL')
+        db.execute('CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, id)')
+
+    def _db(self):
+        return get_connection(self.path)
+
+    def _hold_key(self, job_id: str, api_key: str):
+        with self._keys_lock:
+            self._keys[job_id] = api_key
+
+    def _drop_key(self, job_id: str):
+        with self._keys_lock:
+            self._keys.pop(job_id, None)
+
+    def _held_jobs(self) -> List[str]:
+        with self._keys_lock:
+            return list(self._keys)
+
+    @staticmethod
+    def _server_owner() -> str:
+        api_key = os.getenv('GEMINI_API_KEY')
+        return key_fingerprint(api_key) if api_key else ''
+
+    def enqueue(self, params: Dict[str, Any], api_key: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._hold_key(job_id, api_key)
+        self._db().execute(
+            'INSERT INTO jobs (id, params, owner, status, total_parts, lease_until, created, updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, json.dumps(params), key_fingerprint(api_key), 'queued', params['total_parts'],
+             now + self.lease_seconds, now, now)
+        )
+        return job_id
+
+    def get(self, job_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        row = self._db().execute(
+            'SELECT id, params, status, total_parts, error, attempts, created, updated '
+            'FROM jobs WHERE id = ? AND owner = ?', (job_id, owner)
+        ).fetchone()
+        if not row:
+            return None
+        parts, summaries = self.load_checkpoints(job_id)
+        job = {
+            'job_id': row[0],
+            'params': {k: v for k, v in json.loads(row[1]).items() if k != 'use_cache'},
+            'status': row[2],
+            'total_parts': row[3],
+            'completed_parts': len(parts),
+            'error': row[4],
+            'attempts': row[5],
+            'created': row[6],
+            'updated': row[7],
+            'parts': [
+                {'part': part, 'chars': len(text), 'summarized': part in summaries}
+                for part, text in sorted(parts.items())
+            ]
+        }
+        if row[2] == 'completed':
+            job['story'] = '\n\n'.join(text for _, text in sorted(parts.items()))
+        return job
+
+    def requeue(self, job_id: str, api_key: str) -> bool:
+        """Put one of ``api_key``'s failed jobs back in the queue.
+
+        It resumes from its checkpoints and runs on ``api_key``.
+        """
+        now = time.time()
+        self._hold_key(job_id, api_key)
+        cursor = self._db().execute(
+            "UPDATE jobs SET status = 'queued', error = NULL, attempts = 0, lease_until = ?, updated = ? "
+            "WHERE id = ? AND owner = ? AND status = 'failed'",
+            (now + self.lease_seconds, now, job_id, key_fingerprint(api_key))
+        )
+        if cursor.rowcount == 0:
+            self._drop_key(job_id)
+            return False
+        return True
+
+    def load_checkpoints(self, job_id: str) -> Tuple[Dict[int, str], Dict[int, str]]:
+        rows = self._db().execute(
+            'SELECT part, text, summary FROM job_parts WHERE job_id = ? ORDER BY part', (job_id,)
+        ).fetchall()
+        parts = {part: text for part, text, _ in rows}
+        summaries = {part: summary for part, _, summary in rows if summary}
+        return parts, summaries
+
+    def _claim(self) -> Optional[Tuple[str, Dict[str, Any], int]]:
+        """Atomically lease the oldest job this process can run.
+
+        That is a queued job, or one whose lease expired, whose key this
+        process holds or that runs on the server's key. Jobs whose key is
+        held nowhere fail once their lease has run out.
+        """
+        db = self._db()
+        now = time.time()
+        held = self._held_jobs()
+        placeholders = ','.join('?' * len(held))
+        server_owner = self._server_owner()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Keep the jobs waiting on this process's keys reserved
+            db.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE status = 'queued' AND id IN ({placeholders})",
+                (now + self.lease_seconds, *held)
+            )
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_until = 0, updated = ? "
+                "WHERE status IN ('queued', 'running') AND lease_until < ? "
+                f"AND owner IS NOT ? AND id NOT IN ({placeholders})",
+                ('The API key for this job is no longer available; resume it to continue',
+                 now, now, server_owner, *held)
+            )
+            row = db.execute(
+                "SELECT id, params, attempts FROM jobs "
+                "WHERE (status = 'queued' OR (status = 'running' AND lease_until < ?)) "
+                f"AND (owner = ? OR id IN ({placeholders})) "
+                "ORDER BY created LIMIT 1",
+                (now, server_owner, *held)
+            ).fetchone()
+            if not row:
+                db.execute('COMMIT')
+                return None
+            if row[2] >= self.max_attempts:
+                db.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_until = 0, updated = ? WHERE id = ?",
+                    ('Gave up after repeated worker failures', now, row[0])
+                )
+                db.execute('COMMIT')
+                self._drop_key(row[0])
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                "lease_until = ?, updated = ? WHERE id = ?",
+                (now + self.lease_seconds, now, row[0])
+            )
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return row[0], json.loads(row[1]), row[2] + 1
+
+    def _renew(self, job_id: str):
+        now = time.time()
+        self._db().execute(
+            'UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ?',
+            (now + self.lease_seconds, now, job_id)
+        )
+
+    def _save_part(self, job_id: str, part: int, text: str):
+        self._db().execute(
+            'INSERT OR REPLACE INTO job_parts (job_id, part, text, created) VALUES (?, ?, ?, ?)',
+            (job_id, part, text, time.time())
+        )
+        self._renew(job_id)
+
+    def _save_summary(self, job_id: str, part: int, summary: str):
+        self._db().execute(
+            'UPDATE job_parts SET summary = ? WHERE job_id = ? AND part = ?',
+            (summary, job_id, part)
+        )
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None):
+        now = time.time()
+        # A job going back to the queue stays reserved for the key this process holds
+        self._db().execute(
+            'UPDATE jobs SET status = ?, error = ?, lease_until = ?, updated = ? WHERE id = ?',
+            (status, error, now + self.lease_seconds if status == 'queued' else 0, now, job_id)
+        )
+        if status != 'queued':
+            self._drop_key(job_id)
+
+    def start_worker(self):
+        """Start polling for jobs on the background loop (idempotent)."""
+        if self._worker_started:
+            return
+        self._worker_started = True
+        background_loop.submit(self._worker())
+
+    async def _worker(self):
+        running = set()
+        while True:
+            try:
+                while len(running) < self.concurrency:
+                    claimed = await run_blocking(self._claim)
+                    if not claimed:
+                        break
+                    task = asyncio.ensure_future(self._process(*claimed))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+            except Exception as e:
+                print(f"Job queue poll failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await run_blocking(self._renew, job_id)
+
+    async def _process(self, job_id: str, params: Dict[str, Any], attempt: int):
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id))
+        try:
+            parts, summaries = await run_blocking(self.load_checkpoints, job_id)
+            with self._keys_lock:
+                api_key = self._keys.get(job_id) or os.getenv('GEMINI_API_KEY')
+            await admission.admit(
+                admission_key(api_key), expected_model_calls(params, len(parts)), max_wait=float('inf')
+            )
+            generator = get_story_generator(params['model_name'], api_key)
+            generator.validate_inputs(params['expertise'], params['tone'], params.get('summarizer'))
+            context = await generator.prepare_context(params['context'], params.get('youtube_urls'))
+            scheduler = generator.create_scheduler(
+                params['topic'], params['expertise'], params['tone'], context,
+                params['total_parts'], params['prompt_id'], params['writing_style'],
+                params.get('pipelined'), params.get('use_cache', True), params.get('summarizer'),
+                time_budget=None,
+                completed_parts=parts,
+                completed_summaries=summaries
+            )
+
+            pieces = []
+            async for event in scheduler.run():
+                if event['event'] == 'delta':
+                    pieces.append(event['text'])
+                elif event['event'] == 'part_end':
+                    if not event.get('resumed'):
+                        await run_blocking(self._save_part, job_id, event['part'], ''.join(pieces).strip())
+                    pieces = []
+                elif event['event'] == 'summary':
+                    await run_blocking(self._save_summary, job_id, event['part'], event['text'])
+                elif event['event'] == 'error':
+                    retry = event.get('kind') != FATAL and attempt < self.max_attempts
+                    await run_blocking(self._finish, job_id, 'queued' if retry else 'failed', event['error'])
+                    return
+            await run_blocking(self._finish, job_id, 'completed')
+        except ValueError as e:
+            await run_blocking(self._finish, job_id, 'failed', str(e))
+        except Exception as e:
+            status = 'queued' if attempt < self.max_attempts else 'failed'
+            await run_blocking(self._finish, job_id, status, str(e))
+        finally:
+            heartbeat.cancel()
+
+
+job_queue = JobQueue(
+    JOB_QUEUE_PATH,
+    concurrency=JOB_WORKER_CONCURRENCY,
+    lease_seconds=JOB_LEASE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS
+)
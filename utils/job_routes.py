@@ -0,0 +1,52 @@
+from flask import Blueprint, request, jsonify
+from .client_pool import key_fingerprint
+from .config import JOB_MAX_PARTS, JOB_WORKER_ENABLED
+from .job_queue import job_queue
+from .request_utils import get_api_key, parse_generation_request
+
+job_routes = Blueprint('job_routes', __name__)
+
+@job_routes.route('/jobs', methods=['POST'])
+def create_job():
+    if not JOB_WORKER_ENABLED:
+        return jsonify({'error': 'Background jobs are disabled on this server'}), 503
+
+    api_key = get_api_key()
+    if not api_key:
+        return jsonify({
+            'error': 'API key not found. Please set up your API key first.'
+        }), 401
+
+    params = parse_generation_request(request.json or {}, max_parts=JOB_MAX_PARTS)
+    if not all([params['topic'], params['expertise'], params['tone']]):
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    job_id = job_queue.enqueue(params, api_key)
+    job_queue.start_worker()
+    return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+
+@job_routes.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    api_key = get_api_key()
+    if not api_key:
+        return jsonify({
+            'error': 'API key not found. Please set up your API key first.'
+        }), 401
+
+    job = job_queue.get(job_id, key_fingerprint(api_key))
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@job_routes.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    api_key = get_api_key()
+    if not api_key:
+        return jsonify({
+            'error': 'API key not found. Please set up your API key first.'
+        }), 401
+
+    if not job_queue.requeue(job_id, api_key):
+        return jsonify({'error': 'Job not found or not failed'}), 404
+    job_queue.start_worker()
+    return jsonify({'job_id': job_id, 'status': 'queued'}), 202
\ No newline at end of file
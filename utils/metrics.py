@@ -0,0 +1,177 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+import json
+import threading
+import time
+
+# Histogram buckets for stage durations, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(text: str, quotes: bool = True) -> str:
+    # The text format escapes backslashes and newlines, and quotes in label values
+    text = str(text).replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quotes else text
+
+
+def _format_labels(labels: Labels, extra: str = '') -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Metrics:
+    """Process-wide counters and duration histograms.
+
+    Rendered in the Prometheus text format by ``render``. Names are
+    registered on first use; ``help`` text is optional.
+    """
+
+    def __init__(self, prefix: str = 'storyx'):
+        self.prefix = prefix
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, list]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.count(name, amount)
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            values = series.get(key)
+            if values is None:
+                # One count per bucket, then sum and total count
+                values = series[key] = [0] * len(BUCKETS) + [0.0, 0]
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    values[index] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+    def value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = f"{self.prefix}_{name}_total"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {_escape(self._help[name], quotes=False)}")
+                lines.append(f"# TYPE {full} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{full}{_format_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                full = f"{self.prefix}_{name}_seconds"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {_escape(self._help[name], quotes=False)}")
+                lines.append(f"# TYPE {full} histogram")
+                for labels, values in sorted(series.items()):
+                    for bound, count in zip(BUCKETS, values):
+                        le = f'le="{bound:g}"'
+                        lines.append(f"{full}_bucket{_format_labels(labels, le)} {count}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{full}_bucket{_format_labels(labels, le)} {values[-1]}")
+                    lines.append(f"{full}_sum{_format_labels(labels)} {values[-2]:.6f}")
+                    lines.append(f"{full}_count{_format_labels(labels)} {values[-1]}")
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTrace:
+    """Per-request totals of stage time and counters, for the debug header."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages: Dict[str, list] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def count(self, name: str, amount: float):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'total': round(time.monotonic() - self.started, 3),
+                'stages': {
+                    stage: {'seconds': round(seconds, 3), 'count': count}
+                    for stage, (seconds, count) in sorted(self.stages.items())
+                },
+                'counters': dict(sorted(self.counters.items()))
+            }
+
+    def as_header(self) -> str:
+        return json.dumps(self.summary(), separators=(',', ':'))
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar('storyx_trace', default=None)
+
+
+def start_trace() -> RequestTrace:
+    """Start collecting stage timings for the current request (context)."""
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def record_stage(stage: str, seconds: float, **labels):
+    """Add a measured duration to the stage histogram and the request trace."""
+    metrics.observe('stage', seconds, stage=stage, **labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str, **labels) -> Iterator[None]:
+    """Time a block as ``stage`` (see ``record_stage``)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started, **labels)
+
+
+metrics = Metrics()
+metrics.describe('stage', 'Time spent per pipeline stage')
+metrics.describe('model_calls', 'Model calls by model and kind')
+metrics.describe('model_errors', 'Failed model calls by model and error kind')
+metrics.describe('model_retries', 'Model call retries by error kind')
+metrics.describe('tokens_in', 'Prompt tokens sent to the model')
+metrics.describe('tokens_out', 'Tokens received from the model')
+metrics.describe('cache_requests', 'Cache lookups by cache and result')
+metrics.describe('http_requests', 'HTTP requests by endpoint and status')
+metrics.describe('admission', 'Story requests by admission result (admitted, queued, rejected)')
+metrics.describe('router_decisions', 'Model routing decisions (summary, fallback, hedge, hedge_won, cancelled) by model')
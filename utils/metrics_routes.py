@@ -0,0 +1,54 @@
+from flask import Blueprint, Response, current_app, g, request
+from .config import DEBUG_TIMINGS_HEADER
+from .metrics import current_trace, metrics, record_stage, start_trace
+import functools
+import inspect
+import time
+
+metrics_routes = Blueprint('metrics_routes', __name__)
+
+@metrics_routes.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def instrument_app(app):
+    """Count and time every request by endpoint and status."""
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unknown'
+            record_stage('http_request', time.perf_counter() - started, endpoint=endpoint)
+            metrics.inc('http_requests', endpoint=endpoint, status=response.status_code)
+        return response
+
+def _finish(result):
+    response = current_app.make_response(result)
+    trace = current_trace()
+    if trace is not None and DEBUG_TIMINGS_HEADER and request.headers.get('X-Debug-Timings') == '1':
+        response.headers['X-Storyx-Timings'] = trace.as_header()
+    return response
+
+def traced(view):
+    """Trace ``view``'s stages for the X-Storyx-Timings debug header.
+
+    Views are not profiled here: async views share the server's event loop,
+    and a profiler on it would slow every other connection. Profile the
+    same code paths offline with ``benchmarks/run_suite.py --profile``.
+    """
+    if inspect.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            start_trace()
+            return _finish(await view(*args, **kwargs))
+    else:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            start_trace()
+            return _finish(view(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,137 @@
+from typing import Iterator, Optional
+from .config import (
+    init_gemini, AVAILABLE_MODELS, MODEL_BACKEND,
+    FAKE_MODEL_LATENCY, FAKE_MODEL_TOKENS_PER_SEC, FAKE_MODEL_OUTPUT_TOKENS,
+    FAKE_MODEL_ERROR_RATE, FAKE_MODEL_RATE_LIMIT_RATE, FAKE_MODEL_SEED,
+    FAKE_MODEL_SLOW_RATE, FAKE_MODEL_SLOW_LATENCY
+)
+from .tokens import estimate_tokens
+import hashlib
+import random
+import threading
+import time
+
+_VOCABULARY = (
+    'the system data people policy change research future market energy city model '
+    'evidence growth risk design network public local global study impact value '
+    'history process cost quality practice community health learning technology '
+    'analysis approach question result example structure pressure balance'
+).split()
+
+# Tokens per streamed chunk
+_CHUNK_TOKENS = 25
+
+
+class ResourceExhausted(Exception):
+    """Fake 429, classified like the real quota error."""
+    code = 429
+
+
+class ServiceUnavailable(Exception):
+    """Fake 503, classified like the real server error."""
+    code = 503
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeTokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+
+class FakeGenerativeModel:
+    """Offline stand-in for ``genai.GenerativeModel``.
+
+    Output text depends only on the seed and the prompt, so repeated runs
+    are comparable. Each call waits ``latency`` seconds before the first
+    token and then produces ``tokens_per_sec``; a seeded share of calls fails
+    with a 503 or a 429 instead, and another share (``slow_rate``) waits
+    ``slow_latency`` seconds. Streaming yields chunks at the same pace.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        latency: float = FAKE_MODEL_LATENCY,
+        tokens_per_sec: float = FAKE_MODEL_TOKENS_PER_SEC,
+        output_tokens: int = FAKE_MODEL_OUTPUT_TOKENS,
+        error_rate: float = FAKE_MODEL_ERROR_RATE,
+        rate_limit_rate: float = FAKE_MODEL_RATE_LIMIT_RATE,
+        seed: int = FAKE_MODEL_SEED,
+        slow_rate: float = FAKE_MODEL_SLOW_RATE,
+        slow_latency: float = FAKE_MODEL_SLOW_LATENCY
+    ):
+        self.model_name = model_name
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.calls = 0
+        self._failures = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _text(self, prompt: str) -> str:
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode('utf-8')).hexdigest()
+        rng = random.Random(digest)
+        paragraphs, sentences, words = [], [], []
+        text_tokens = 0
+        while text_tokens < self.output_tokens:
+            word = rng.choice(_VOCABULARY)
+            words.append(word)
+            text_tokens += estimate_tokens(word + ' ')
+            if len(words) >= rng.randint(8, 16):
+                sentences.append(' '.join(words).capitalize() + '.')
+                words = []
+                if len(sentences) == 5:
+                    paragraphs.append(' '.join(sentences))
+                    sentences = []
+        if words:
+            sentences.append(' '.join(words).capitalize() + '.')
+        if sentences:
+            paragraphs.append(' '.join(sentences))
+        return '\n\n'.join(paragraphs)
+
+    def _start_call(self):
+        with self._lock:
+            self.calls += 1
+            roll = self._failures.random()
+            slow = self.slow_rate > 0 and self._failures.random() < self.slow_rate
+        time.sleep(self.slow_latency if slow else self.latency)
+        if roll < self.rate_limit_rate:
+            raise ResourceExhausted("429 Resource has been exhausted (fake quota)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise ServiceUnavailable("503 The service is currently unavailable (fake)")
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        self._start_call()
+        text = self._text(prompt)
+        if stream:
+            return self._stream(text)
+        time.sleep(estimate_tokens(text) / self.tokens_per_sec)
+        return FakeResponse(text)
+
+    def _stream(self, text: str) -> Iterator[FakeResponse]:
+        step = _CHUNK_TOKENS * 4
+        for start in range(0, len(text), step):
+            piece = text[start:start + step]
+            time.sleep(estimate_tokens(piece) / self.tokens_per_sec)
+            yield FakeResponse(piece)
+
+    def count_tokens(self, contents) -> FakeTokenCount:
+        return FakeTokenCount(estimate_tokens(str(contents)))
+
+
+def create_model(model_name: str, api_key: Optional[str] = None):
+    """Build a model client with the configured backend (``MODEL_BACKEND``)."""
+    if MODEL_BACKEND == 'fake':
+        if model_name not in AVAILABLE_MODELS:
+            raise ValueError(f"Model {model_name} not supported")
+        return FakeGenerativeModel(model_name)
+    return init_gemini(model_name, api_key)
@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable
+from .config import MODEL_CONCURRENCY, MODEL_STREAM_CONCURRENCY
+from .metrics import metrics, record_stage, span
+from .tokens import estimate_tokens
+import asyncio
+import contextvars
+import functools
+import threading
+
+# One executor per process bounds the number of concurrent model calls no
+# matter how many event loops (one per Flask request) are awaiting them.
+_model_executor = ThreadPoolExecutor(
+    max_workers=MODEL_CONCURRENCY,
+    thread_name_prefix='model-call'
+)
+# Streams get their own executor: each holds its thread until the stream
+# ends, and long streams must not starve the blocking calls above.
+_stream_executor = ThreadPoolExecutor(
+    max_workers=MODEL_STREAM_CONCURRENCY,
+    thread_name_prefix='model-stream'
+)
+
+_STREAM_END = object()
+
+
+def _in_context(func: Callable, *args, **kwargs) -> Callable:
+    # Carry the caller's context (e.g. the request trace) into the worker thread
+    return functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def _model_label(model) -> str:
+    return str(getattr(model, 'model_name', 'unknown')).replace('models/', '')
+
+
+def _output_tokens(response, text: str) -> int:
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'candidates_token_count', None) or estimate_tokens(text)
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking, non-model call (e.g. network I/O) off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _in_context(func, *args, **kwargs))
+
+
+async def generate_content(model, prompt: str, **kwargs) -> Any:
+    """Call ``model.generate_content`` without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    label = _model_label(model)
+    metrics.inc('model_calls', model=label, kind='generate')
+    metrics.inc('tokens_in', estimate_tokens(prompt), model=label)
+    with span('model_call', model=label):
+        response = await loop.run_in_executor(
+            _model_executor,
+            _in_context(model.generate_content, prompt, **kwargs)
+        )
+    try:
+        metrics.inc('tokens_out', _output_tokens(response, response.text), model=label)
+    except Exception:
+        pass  # Blocked or empty responses have no text; the caller reports them
+    return response
+
+
+async def stream_content(model, prompt: str, **kwargs) -> AsyncIterator[str]:
+    """Stream text chunks from ``model.generate_content(stream=True)``.
+
+    The blocking iterator is consumed on the stream executor and chunks are
+    handed back to the event loop through a queue.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+    label = _model_label(model)
+    produced = []
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # The consumer's loop is gone; nobody is listening any more.
+            stopped.set()
+
+    def produce():
+        try:
+            # A stream cancelled while it waited for a thread (e.g. a hedge
+            # loser) never calls the model
+            if stopped.is_set():
+                return
+            metrics.inc('model_calls', model=label, kind='stream')
+            metrics.inc('tokens_in', estimate_tokens(prompt), model=label)
+            for chunk in model.generate_content(prompt, stream=True, **kwargs):
+                if stopped.is_set():
+                    break
+                text = chunk.text
+                if text:
+                    produced.append(text)
+                    put(text)
+        except Exception as e:
+            put(e)
+        finally:
+            put(_STREAM_END)
+
+    loop.run_in_executor(_stream_executor, produce)
+    started = loop.time()
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        record_stage('model_stream', loop.time() - started, model=label)
+        metrics.inc('tokens_out', estimate_tokens(''.join(produced)), model=label)
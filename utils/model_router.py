@@ -0,0 +1,247 @@
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from .config import (
+    AVAILABLE_MODELS, MODEL_COSTS, ROUTER_HEDGE_ENABLED, ROUTER_HEDGE_PERCENTILE,
+    ROUTER_HEDGE_MIN_DELAY, ROUTER_HEDGE_DEFAULT_DELAY, ROUTER_MIN_SAMPLES,
+    ROUTER_HEDGE_MODELS, ROUTER_FALLBACK_MODEL, ROUTER_SUMMARY_MODEL
+)
+from .metrics import metrics
+from .retry_policy import get_breaker
+import asyncio
+import threading
+
+T = TypeVar('T')
+
+
+class LatencyTracker:
+    """Recent latencies of one model and kind of call, in seconds."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ModelRouter:
+    """Chooses the model for each call and hedges slow ones.
+
+    ``choose`` applies the routing policies: summaries go to
+    ``summary_model`` if set ('cheapest' picks the lowest entry in
+    MODEL_COSTS), and a model whose circuit breaker is open is replaced by
+    ``fallback_model``. ``race``/``race_stream`` run the call and, if it
+    has not answered (or, for streams, produced its first text) within the
+    model's recent ``hedge_percentile`` latency, start the same call on the
+    hedge model. The first success wins and the other call is cancelled.
+
+    Full-call latencies ('call') and stream times to first text ('stream')
+    are tracked separately, since they differ by the whole generation
+    time. Latencies of calls cancelled as losers are recorded too, so the
+    percentile is not skewed towards the fast calls.
+    """
+
+    def __init__(
+        self,
+        hedge_enabled: bool = True,
+        hedge_percentile: float = 0.9,
+        hedge_min_delay: float = 1.0,
+        hedge_default_delay: float = 10.0,
+        min_samples: int = 20,
+        hedge_models: Optional[Dict[str, str]] = None,
+        fallback_model: Optional[str] = None,
+        summary_model: Optional[str] = None
+    ):
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.min_samples = min_samples
+        self.hedge_models = hedge_models or {}
+        self.fallback_model = fallback_model
+        self.summary_model = summary_model
+        self._trackers: Dict[Tuple[str, str], LatencyTracker] = {}
+        self._lock = threading.Lock()
+
+    def tracker(self, model_name: str, kind: str = 'call') -> LatencyTracker:
+        """Latencies of ``model_name``'s ``kind`` ('call' or 'stream') of call."""
+        with self._lock:
+            if (model_name, kind) not in self._trackers:
+                self._trackers[model_name, kind] = LatencyTracker()
+            return self._trackers[model_name, kind]
+
+    def cheapest(self) -> Optional[str]:
+        """The lowest-cost model whose breaker is not open."""
+        candidates = [
+            name for name in MODEL_COSTS
+            if name in AVAILABLE_MODELS and not get_breaker(name).is_open()
+        ]
+        return min(candidates, key=MODEL_COSTS.get) if candidates else None
+
+    def choose(self, model_name: str, purpose: str = 'part') -> str:
+        """The model to call for a ``purpose`` ('part' or 'summary') requested on ``model_name``."""
+        target = model_name
+        if purpose == 'summary' and self.summary_model:
+            routed = self.cheapest() if self.summary_model == 'cheapest' else self.summary_model
+            if routed and routed != model_name:
+                metrics.inc('router_decisions', decision='summary', model=routed)
+                target = routed
+        fallback = self.fallback_model
+        if (
+            fallback and fallback != target and get_breaker(target).is_open()
+            and not get_breaker(fallback).is_open()
+        ):
+            metrics.inc('router_decisions', decision='fallback', model=fallback)
+            target = fallback
+        return target
+
+    def hedge_delay(self, model_name: str, kind: str = 'call') -> float:
+        tracker = self.tracker(model_name, kind)
+        if len(tracker) < self.min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, tracker.percentile(self.hedge_percentile))
+
+    def hedge_target(self, model_name: str) -> Optional[str]:
+        if not self.hedge_enabled:
+            return None
+        target = self.hedge_models.get(model_name, model_name)
+        return None if get_breaker(target).is_open() else target
+
+    async def race(self, call: Callable[[str], Awaitable[T]], model_name: str) -> T:
+        """Await ``call(model_name)``, hedged with ``call(hedge model)`` if it is slow."""
+        loop = asyncio.get_running_loop()
+        hedge = self.hedge_target(model_name)
+        delay = self.hedge_delay(model_name, 'call')
+        # Task -> (model, start time, is the hedge, stream to close)
+        tasks = {asyncio.ensure_future(call(model_name)): (model_name, loop.time(), False, None)}
+        error = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=delay if hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    metrics.inc('router_decisions', decision='hedge', model=hedge)
+                    tasks[asyncio.ensure_future(call(hedge))] = (hedge, loop.time(), True, None)
+                    hedge = None
+                    continue
+                for task in done:
+                    name, started, hedged, _ = tasks.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    self._record_win(name, 'call', loop.time() - started, hedged)
+                    return task.result()
+                # A call that failed outright (after its retries) is not worth hedging
+                hedge = None
+            raise error
+        finally:
+            await self._cancel_losers(tasks, loop, 'call')
+
+    async def race_stream(
+        self,
+        open_stream: Callable[[str], AsyncIterator[str]],
+        model_name: str
+    ) -> AsyncIterator[str]:
+        """Stream from ``open_stream(model_name)``, hedged until the first piece arrives.
+
+        The stream that yields first is the one forwarded; the other is
+        closed, which stops its model call.
+        """
+        loop = asyncio.get_running_loop()
+        hedge = self.hedge_target(model_name)
+        delay = self.hedge_delay(model_name, 'stream')
+        streams = {}
+
+        def launch(name: str, hedged: bool):
+            stream = open_stream(name).__aiter__()
+            streams[asyncio.ensure_future(stream.__anext__())] = (name, loop.time(), hedged, stream)
+
+        launch(model_name, False)
+        winner, first, error = None, None, None
+        try:
+            while streams and winner is None:
+                done, _ = await asyncio.wait(
+                    streams, timeout=delay if hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    metrics.inc('router_decisions', decision='hedge', model=hedge)
+                    launch(hedge, True)
+                    hedge = None
+                    continue
+                for task in done:
+                    name, started, hedged, stream = streams.pop(task)
+                    failure = task.exception()
+                    if failure is not None and not isinstance(failure, StopAsyncIteration):
+                        error = failure
+                        await stream.aclose()
+                        continue
+                    self._record_win(name, 'stream', loop.time() - started, hedged)
+                    winner, first = stream, None if failure is not None else task.result()
+                    break
+                else:
+                    hedge = None
+            if winner is None:
+                raise error
+        finally:
+            await self._cancel_losers(streams, loop, 'stream')
+
+        try:
+            if first is not None:
+                yield first
+                async for piece in winner:
+                    yield piece
+        finally:
+            await winner.aclose()
+
+    def _record_win(self, model_name: str, kind: str, seconds: float, hedged: bool):
+        self.tracker(model_name, kind).add(seconds)
+        if hedged:
+            metrics.inc('router_decisions', decision='hedge_won', model=model_name)
+
+    async def _cancel_losers(self, tasks: Dict[asyncio.Future, tuple], loop, kind: str):
+        for task, (name, started, _, _) in tasks.items():
+            if task.cancel():
+                metrics.inc('router_decisions', decision='cancelled', model=name)
+                self.tracker(name, kind).add(loop.time() - started)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for _, _, _, stream in tasks.values():
+            if stream is not None:
+                await stream.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            trackers = dict(self._trackers)
+        stats: Dict[str, Any] = {}
+        for (name, kind), tracker in sorted(trackers.items()):
+            stats.setdefault(name, {})[kind] = {
+                'samples': len(tracker),
+                'p50': tracker.percentile(0.5),
+                'p90': tracker.percentile(0.9),
+                'hedge_delay': round(self.hedge_delay(name, kind), 3)
+            }
+        return stats
+
+
+model_router = ModelRouter(
+    hedge_enabled=ROUTER_HEDGE_ENABLED,
+    hedge_percentile=ROUTER_HEDGE_PERCENTILE,
+    hedge_min_delay=ROUTER_HEDGE_MIN_DELAY,
+    hedge_default_delay=ROUTER_HEDGE_DEFAULT_DELAY,
+    min_samples=ROUTER_MIN_SAMPLES,
+    hedge_models=ROUTER_HEDGE_MODELS,
+    fallback_model=ROUTER_FALLBACK_MODEL,
+    summary_model=ROUTER_SUMMARY_MODEL
+)
@@ -0,0 +1,57 @@
+from typing import Dict, Optional
+from .config import MODEL_MIN_INTERVAL
+import asyncio
+import threading
+import time
+
+
+class Pacer:
+    """Spaces out calls to one model across all requests in the process.
+
+    Calls are normally only held to ``min_interval`` apart (zero by default,
+    i.e. no idle time). After a rate-limit error the gap widens
+    exponentially and then decays again as calls succeed.
+    """
+
+    def __init__(self, min_interval: float = 0.0, max_penalty: float = 30.0):
+        self.min_interval = min_interval
+        self.max_penalty = max_penalty
+        self._penalty = 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Claim the next call slot and return how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot)
+            self._next_slot = start + self.min_interval + self._penalty
+            return start - now
+
+    async def wait(self) -> float:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def record_rate_limit(self, retry_after: Optional[float] = None):
+        with self._lock:
+            self._penalty = min(max(self._penalty * 2, 1.0), self.max_penalty)
+            pause = retry_after if retry_after is not None else self._penalty
+            self._next_slot = max(self._next_slot, time.monotonic() + pause)
+
+    def record_success(self):
+        with self._lock:
+            self._penalty = self._penalty / 2 if self._penalty > 0.1 else 0.0
+
+
+_pacers: Dict[str, Pacer] = {}
+_pacers_lock = threading.Lock()
+
+
+def get_pacer(model_name: str) -> Pacer:
+    """Return the process-wide pacer for a model."""
+    with _pacers_lock:
+        if model_name not in _pacers:
+            _pacers[model_name] = Pacer(MODEL_MIN_INTERVAL)
+        return _pacers[model_name]
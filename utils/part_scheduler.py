@@ -0,0 +1,217 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from .metrics import record_stage
+from .retry_policy import classify_error
+import asyncio
+import time
+
+GeneratePart = Callable[[int, List[str]], AsyncIterator[str]]
+Summarize = Callable[[str], Awaitable[Optional[str]]]
+
+
+def closing_excerpt(text: str, max_chars: int) -> str:
+    """Return the end of ``text``, starting on a paragraph or sentence boundary."""
+    if len(text) <= max_chars:
+        return text
+    tail = text[-max_chars:]
+    for boundary in ('\n\n', '. '):
+        index = tail.find(boundary)
+        if index != -1 and index < len(tail) // 2:
+            return tail[index + len(boundary):].strip()
+    return tail.strip()
+
+
+class PartScheduler:
+    """Schedules the part and summary calls of a multi-part story.
+
+    In strict mode every part waits for the summaries of all previous parts,
+    matching the original serial behaviour. In pipelined mode part ``n``
+    starts as soon as part ``n - 1`` is finished: it receives the summaries
+    of parts ``1..n-2`` plus the closing excerpt of part ``n - 1`` verbatim,
+    while the summary of part ``n - 1`` runs concurrently and is only
+    awaited by part ``n + 1``. A part ``n - 1`` of at most
+    ``full_part_chars`` is passed in full instead, and when there are no
+    earlier summaries (part 2) part ``n`` waits for the summary of part
+    ``n - 1`` as well as its excerpt. Summaries nobody will read are not
+    requested; any still unreported are emitted before ``done``.
+
+    ``run`` yields the same events as ``StoryGenerator.stream_complete_story``,
+    plus a ``summary`` event once a summary has been consumed; the final
+    ``done`` event carries per-stage timings in seconds. An ``error`` event
+    carries the failure's retry-policy ``kind``.
+
+    ``completed_parts`` and ``completed_summaries`` (part number -> text)
+    resume a story from a checkpoint: those parts are replayed as events
+    with ``resumed`` set instead of being generated again.
+
+    ``generate_part`` may record how its prompt was fitted to the model's
+    budget in ``prompt_reports``; the report is attached to that part's
+    ``part_end`` event as ``prompt``. Parts it adds to ``truncated_parts``
+    (cut at the output budget) get ``truncated`` set on ``part_end``.
+    """
+
+    def __init__(
+        self,
+        generate_part: GeneratePart,
+        summarize: Summarize,
+        total_parts: int,
+        pipelined: bool = True,
+        time_budget: Optional[float] = None,
+        excerpt_chars: int = 800,
+        full_part_chars: int = 2000,
+        completed_parts: Optional[Dict[int, str]] = None,
+        completed_summaries: Optional[Dict[int, str]] = None
+    ):
+        self.generate_part = generate_part
+        self.summarize = summarize
+        self.total_parts = total_parts
+        self.pipelined = pipelined
+        self.time_budget = time_budget
+        self.excerpt_chars = excerpt_chars
+        self.full_part_chars = full_part_chars
+        self.timings: Dict[str, float] = {}
+        self.completed_parts = completed_parts or {}
+        self.completed_summaries = completed_summaries or {}
+        self._summary_tasks: Dict[int, asyncio.Future] = {}
+        self._reported_summaries = set()
+        self._part_texts: Dict[int, str] = {}
+        self.prompt_reports: Dict[int, Dict[str, Any]] = {}
+        self.truncated_parts = set()
+
+    def _needs_summary(self, part: int, text: str) -> bool:
+        if not self.pipelined:
+            return part < self.total_parts
+        if part + 2 <= self.total_parts:
+            return True
+        # Part 2 has no earlier summaries to lean on
+        return part == 1 and self.total_parts >= 2 and len(text) > self.full_part_chars
+
+    async def _summarize(self, part: int, text: str) -> Optional[str]:
+        started = time.monotonic()
+        try:
+            return await self.summarize(text)
+        except Exception:
+            return None
+        finally:
+            self.timings[f'summary_{part}'] = round(time.monotonic() - started, 3)
+            record_stage('summary', time.monotonic() - started)
+
+    async def _previous_parts(self, part: int) -> List[str]:
+        summarized_up_to = part - 2 if self.pipelined else part - 1
+        previous = []
+        waited = time.monotonic()
+        for earlier in range(1, summarized_up_to + 1):
+            task = self._summary_tasks.get(earlier)
+            summary = await task if task else None
+            if summary:
+                previous.append(summary)
+        waited_for_latest = False
+        if self.pipelined and part > 1:
+            latest = self._part_texts[part - 1]
+            if len(latest) <= self.full_part_chars:
+                previous.append(f"Part {part - 1}:\n{latest}")
+            else:
+                task = self._summary_tasks.get(part - 1)
+                if not previous and task:
+                    waited_for_latest = True
+                    summary = await task
+                    if summary:
+                        previous.append(summary)
+                excerpt = closing_excerpt(latest, self.excerpt_chars)
+                previous.append(f"End of part {part - 1}:\n{excerpt}")
+        if summarized_up_to >= 1 or waited_for_latest:
+            self.timings[f'summary_wait_{part}'] = round(time.monotonic() - waited, 3)
+            record_stage('summary_wait', time.monotonic() - waited)
+        return previous
+
+    def _schedule_summary(self, part: int, text: str):
+        if part in self.completed_summaries:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(self.completed_summaries[part])
+            self._reported_summaries.add(part)
+            self._summary_tasks[part] = future
+        elif self._needs_summary(part, text):
+            self._summary_tasks[part] = asyncio.ensure_future(self._summarize(part, text))
+
+    def _new_summaries(self) -> List[Dict[str, Any]]:
+        events = []
+        for part, task in sorted(self._summary_tasks.items()):
+            if part not in self._reported_summaries and task.done() and not task.cancelled():
+                self._reported_summaries.add(part)
+                if task.result():
+                    events.append({'event': 'summary', 'part': part, 'text': task.result()})
+        return events
+
+    def _out_of_time(self, started: float, part: int) -> bool:
+        part_times = [self.timings[f'part_{p}'] for p in range(1, part) if f'part_{p}' in self.timings]
+        if not self.time_budget or not part_times:
+            return False
+        expected = sum(part_times) / len(part_times)
+        return time.monotonic() - started + expected > self.time_budget
+
+    async def run(self) -> AsyncIterator[Dict[str, Any]]:
+        started = time.monotonic()
+        completed = 0
+        try:
+            for part in range(1, self.total_parts + 1):
+                if part in self.completed_parts:
+                    text = self.completed_parts[part]
+                    self._part_texts[part] = text
+                    completed = part
+                    yield {'event': 'part_start', 'part': part,
+                           'total_parts': self.total_parts, 'resumed': True}
+                    yield {'event': 'delta', 'part': part, 'text': text}
+                    yield {'event': 'part_end', 'part': part, 'chars': len(text), 'resumed': True}
+                    self._schedule_summary(part, text)
+                    continue
+
+                if self._out_of_time(started, part):
+                    yield {'event': 'budget_exhausted', 'part': part,
+                           'elapsed': round(time.monotonic() - started, 3)}
+                    break
+
+                previous_parts = await self._previous_parts(part)
+                for event in self._new_summaries():
+                    yield event
+                yield {'event': 'part_start', 'part': part, 'total_parts': self.total_parts}
+
+                part_started = time.monotonic()
+                pieces = []
+                try:
+                    async for text in self.generate_part(part, previous_parts):
+                        pieces.append(text)
+                        yield {'event': 'delta', 'part': part, 'text': text}
+                except Exception as e:
+                    yield {'event': 'error', 'part': part, 'kind': classify_error(e),
+                           'error': f"Error generating story part {part}: {str(e)}"}
+                    return
+                self.timings[f'part_{part}'] = round(time.monotonic() - part_started, 3)
+                record_stage('part', time.monotonic() - part_started)
+
+                chunk = ''.join(pieces).strip()
+                self._part_texts[part] = chunk
+                completed = part
+                end_event = {'event': 'part_end', 'part': part, 'chars': len(chunk)}
+                if part in self.prompt_reports:
+                    end_event['prompt'] = self.prompt_reports.pop(part)
+                if part in self.truncated_parts:
+                    end_event['truncated'] = True
+                yield end_event
+
+                self._schedule_summary(part, chunk)
+                if not self.pipelined and part in self._summary_tasks:
+                    await self._summary_tasks[part]
+
+            if completed == self.total_parts:
+                # Let summaries still running finish, so they are reported (and checkpointed)
+                pending = [task for task in self._summary_tasks.values() if not task.done()]
+                if pending:
+                    await asyncio.wait(pending)
+        finally:
+            for task in self._summary_tasks.values():
+                if not task.done():
+                    task.cancel()
+
+        for event in self._new_summaries():
+            yield event
+        self.timings['total'] = round(time.monotonic() - started, 3)
+        yield {'event': 'done', 'total_parts': completed, 'timings': dict(self.timings)}
@@ -1,122 +1,102 @@
-from typing import Optional
-from .config import get_topic_category
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .topic_classifier import get_topic_category
+from .tokens import estimate_tokens, truncate_to_tokens
 
-def build_story_prompt(
-    topic: str,
-    expertise: str,
-    tone: str,
-    context: Optional[str] = None,
-    part_number: int = 1,
-    total_parts: int = 1,
-    previous_parts: list[str] = None,
-    custom_template: Optional[str] = None,
-    writing_style: str = 'balanced'  # Add default writing style
-) -> str:
-    topic_category = get_topic_category(topic)
-    context_text = f"\nAdditional Context:\n{context}" if context else ""
-    previous_context = ""
-    if previous_parts and part_number > 1:
-        previous_context = "\nPrevious parts summary:\n" + "\n".join(previous_parts)
-    
-    expertise_instructions = {
-        'storyteller': 'Present the opinion in a narrative style with real-world examples',
-        'novelist': 'Provide a detailed analysis with rich context and character perspectives',
-        'journalist': 'Present factual, well-researched information with current events',
-        'poet': 'Express the opinion through metaphors and emotional resonance',
-        'screenwriter': 'Frame the opinion through dialogue and real-world scenarios',
-        'critic': 'Analyze the topic with critical thinking and balanced perspectives',
-        'researcher': 'Present in-depth analysis with academic rigor and citations',
-        'educator': 'Explain concepts clearly with examples and learning objectives',
-        'analyst': 'Provide data-driven insights and expert analysis'
-    }
+# Placeholders a prompt template may use
+TEMPLATE_PLACEHOLDERS = frozenset({
+    'part_number', 'total_parts', 'topic', 'topic_category', 'context_text',
+    'previous_context', 'expertise', 'expertise_instructions', 'tone',
+    'tone_instructions', 'category_instructions'
+})
 
-    tone_instructions = {
-        'funny': 'Include humor while maintaining respect for serious topics',
-        'serious': 'Maintain a professional and formal tone',
-        'dramatic': 'Emphasize significant impacts and consequences',
-        'sarcastic': 'Use clever observations while staying constructive',
-        'critical': 'Provide balanced analysis with supporting evidence',
-        'mysterious': 'Explore hidden aspects and implications',
-        'emotional': 'Focus on human impact and personal experiences',
-        'neutral': 'Present balanced viewpoints without bias',
-        'educational': 'Focus on clear explanations and learning outcomes',
-        'technical': 'Use precise terminology while remaining accessible',
-        'casual': 'Maintain an approachable, conversational style'
-    }
+# Placeholders whose value changes from one part of a story to the next
+PER_PART_PLACEHOLDERS = frozenset({'part_number', 'previous_context'})
+
+EXPERTISE_INSTRUCTIONS = {
+    'storyteller': 'Present the opinion in a narrative style with real-world examples',
+    'novelist': 'Provide a detailed analysis with rich context and character perspectives',
+    'journalist': 'Present factual, well-researched information with current events',
+    'poet': 'Express the opinion through metaphors and emotional resonance',
+    'screenwriter': 'Frame the opinion through dialogue and real-world scenarios',
+    'critic': 'Analyze the topic with critical thinking and balanced perspectives',
+    'researcher': 'Present in-depth analysis with academic rigor and citations',
+    'educator': 'Explain concepts clearly with examples and learning objectives',
+    'analyst': 'Provide data-driven insights and expert analysis'
+}
+
+TONE_INSTRUCTIONS = {
+    'funny': 'Include humor while maintaining respect for serious topics',
+    'serious': 'Maintain a professional and formal tone',
+    'dramatic': 'Emphasize significant impacts and consequences',
+    'sarcastic': 'Use clever observations while staying constructive',
+    'critical': 'Provide balanced analysis with supporting evidence',
+    'mysterious': 'Explore hidden aspects and implications',
+    'emotional': 'Focus on human impact and personal experiences',
+    'neutral': 'Present balanced viewpoints without bias',
+    'educational': 'Focus on clear explanations and learning outcomes',
+    'technical': 'Use precise terminology while remaining accessible',
+    'casual': 'Maintain an approachable, conversational style'
+}
 
-    category_instructions = {
-        'factual': """
+CATEGORY_INSTRUCTIONS = {
+    'factual': """
             - Focus on verified facts and data
             - Include statistics and research findings
             - Cite credible sources and studies
             - Present objective information
             - Minimize speculation and opinion
         """,
-        'relatable': """
+    'relatable': """
             - Use real-world examples and scenarios
             - Connect concepts to daily life
             - Share personal experiences and anecdotes
             - Make complex ideas accessible
             - Include practical applications
         """,
-        'analytical': """
+    'analytical': """
             - Break down complex concepts
             - Examine cause and effect relationships
             - Compare and contrast different aspects
             - Evaluate pros and cons
             - Provide detailed analysis
         """,
-        'narrative': """
+    'narrative': """
             - Tell a compelling story
             - Use character perspectives
             - Create engaging scenarios
             - Build narrative tension
             - Include descriptive details
         """,
-        'practical': """
+    'practical': """
             - Focus on actionable insights
             - Provide step-by-step guidance
             - Include hands-on examples
             - Share best practices
             - Offer practical solutions
         """,
-        'balanced': """
+    'balanced': """
             - Present multiple viewpoints
             - Consider different perspectives
             - Weigh advantages and disadvantages
             - Provide balanced analysis
             - Include diverse examples
         """
-    }
+}
 
-    # Use custom template if provided, otherwise use default
-    if custom_template:
-        prompt = custom_template.format(
-            part_number=part_number,
-            total_parts=total_parts,
-            topic=topic,
-            topic_category=topic_category,
-            context_text=context_text,
-            previous_context=previous_context,
-            expertise=expertise,
-            expertise_instructions=expertise_instructions.get(expertise, ''),
-            tone=tone,
-            tone_instructions=tone_instructions.get(tone, ''),
-            category_instructions=category_instructions.get(writing_style, category_instructions['balanced'])
-        )
-    else:
-        prompt = f"""
+DEFAULT_TEMPLATE = """
         Generate part {part_number} of {total_parts} discussing this topic: {topic}
         Category: {topic_category}
         {context_text}
         {previous_context}
         
         Writing Guidelines:
-        - Write as a {expertise}: {expertise_instructions.get(expertise, '')}
-        - Use a {tone} tone: {tone_instructions.get(tone, '')}
+        - Write as a {expertise}: {expertise_instructions}
+        - Use a {tone} tone: {tone_instructions}
         
         Writing Style Guidelines:
-        {category_instructions.get(writing_style, category_instructions['balanced'])}
+        {category_instructions}
         
         General Requirements:
         - Focus on accuracy and relevance
@@ -137,10 +117,8 @@ def build_story_prompt(
         - Maintain professional yet accessible language
         - Format for easy reading and comprehension
         """
-    
-    # Part-specific instructions to ensure progression
-    if part_number == 1:
-        prompt += """
+
+OPENING_PART_INSTRUCTIONS = """
         \nFor this opening part:
         - Introduce the topic and its significance
         - Provide essential background information
@@ -148,8 +126,8 @@ def build_story_prompt(
         - Outline the key aspects to be explored in later parts
         - Set up the framework for subsequent discussions
         """
-    elif part_number == total_parts:
-        prompt += """
+
+FINAL_PART_INSTRUCTIONS = """
         \nFor this final part:
         - Build upon previous discussions without repeating them
         - Explore advanced concepts and implications
@@ -158,10 +136,8 @@ def build_story_prompt(
         - Provide forward-looking conclusions
         - Offer unique perspectives and recommendations
         """
-    else:
-        section_focus = (part_number - 1) / (total_parts - 1)
-        if section_focus < 0.33:
-            prompt += """
+
+EARLY_MIDDLE_PART_INSTRUCTIONS = """
             \nFor this early-middle part:
             - Expand on the foundational concepts
             - Introduce new perspectives and angles
@@ -169,8 +145,8 @@ def build_story_prompt(
             - Avoid repeating basic information
             - Bridge to more complex aspects
             """
-        elif section_focus < 0.66:
-            prompt += """
+
+MIDDLE_PART_INSTRUCTIONS = """
             \nFor this middle part:
             - Focus on complex interconnections
             - Present contrasting viewpoints
@@ -178,8 +154,8 @@ def build_story_prompt(
             - Introduce advanced concepts
             - Avoid retreading earlier discussions
             """
-        else:
-            prompt += """
+
+LATE_MIDDLE_PART_INSTRUCTIONS = """
             \nFor this late-middle part:
             - Explore sophisticated implications
             - Present expert insights
@@ -187,9 +163,8 @@ def build_story_prompt(
             - Connect to broader contexts
             - Prepare for concluding insights
             """
-    
-    # Add a strong reminder about continuity
-    prompt += """
+
+CONTINUITY_REQUIREMENTS = """
     \nCRITICAL CONTINUITY REQUIREMENTS:
     - Each part must progress the discussion forward
     - Never repeat information from previous parts
@@ -198,5 +173,227 @@ def build_story_prompt(
     - Ensure a logical flow between parts
     - Maintain consistent terminology while exploring new areas
     """
-        
-    return prompt
\ No newline at end of file
+
+
+class TemplateError(ValueError):
+    """Raised when a prompt template cannot be compiled."""
+
+
+class CompiledTemplate:
+    """A prompt template validated once and bound for fast rendering.
+
+    Parsing checks the syntax and that every placeholder is a bare name from
+    ``TEMPLATE_PLACEHOLDERS`` (no format specs, conversions or nested
+    fields), so bad templates are rejected when they are saved rather than
+    when a story is generated. Rendering joins the precompiled literal and
+    placeholder pieces.
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        self.placeholders = set()
+        try:
+            parsed = list(Formatter().parse(template))
+        except ValueError as e:
+            raise TemplateError(f"Invalid template syntax: {str(e)}")
+
+        # (literal, None) or (None, placeholder name), in template order
+        self._pieces: List[Tuple[Optional[str], Optional[str]]] = []
+        for literal, field, spec, conversion in parsed:
+            if literal:
+                self._pieces.append((literal, None))
+            if field is None:
+                continue
+            if field not in TEMPLATE_PLACEHOLDERS:
+                allowed = ', '.join('{' + name + '}' for name in sorted(TEMPLATE_PLACEHOLDERS))
+                raise TemplateError(
+                    f"Unknown placeholder '{{{field}}}'. Allowed placeholders: {allowed}"
+                )
+            if conversion or spec:
+                raise TemplateError(
+                    f"Placeholder '{{{field}}}' cannot have a format spec or conversion"
+                )
+            self.placeholders.add(field)
+            self._pieces.append((None, field))
+
+    def render(self, values: Dict[str, Any]) -> str:
+        return ''.join([
+            literal if field is None else str(values[field])
+            for literal, field in self._pieces
+        ])
+
+
+@lru_cache(maxsize=128)
+def compile_template(template: str) -> CompiledTemplate:
+    """Compile a template once; later calls with the same text reuse it."""
+    return CompiledTemplate(template)
+
+
+@lru_cache(maxsize=128)
+def split_template(template: str) -> Tuple[str, str]:
+    """Split a template into the lines that are the same for every part of a
+    story and the lines that use a per-part placeholder.
+
+    Each half keeps its lines in their original order.
+    """
+    compile_template(template)  # validate
+    head, tail = [], []
+    for line in template.splitlines(keepends=True):
+        fields = {field for _, field, _, _ in Formatter().parse(line) if field}
+        (tail if fields & PER_PART_PLACEHOLDERS else head).append(line)
+    return ''.join(head), ''.join(tail)
+
+
+_DEFAULT_COMPILED = compile_template(DEFAULT_TEMPLATE)
+
+# Below this, trimmed context is dropped rather than kept as a fragment
+_MIN_CONTEXT_TOKENS = 50
+
+
+def part_instructions(part_number: int, total_parts: int) -> str:
+    """Part-specific instructions that ensure the discussion progresses."""
+    if part_number == 1:
+        return OPENING_PART_INSTRUCTIONS
+    if part_number == total_parts:
+        return FINAL_PART_INSTRUCTIONS
+    section_focus = (part_number - 1) / (total_parts - 1)
+    if section_focus < 0.33:
+        return EARLY_MIDDLE_PART_INSTRUCTIONS
+    if section_focus < 0.66:
+        return MIDDLE_PART_INSTRUCTIONS
+    return LATE_MIDDLE_PART_INSTRUCTIONS
+
+
+def build_story_prompt(
+    topic: str,
+    expertise: str,
+    tone: str,
+    context: Optional[str] = None,
+    part_number: int = 1,
+    total_parts: int = 1,
+    previous_parts: list[str] = None,
+    custom_template: Optional[str] = None,
+    writing_style: str = 'balanced',  # Add default writing style
+    max_tokens: Optional[int] = None,
+    count: Callable[[str], int] = estimate_tokens,
+    report: Optional[Dict[str, Any]] = None
+) -> str:
+    """Render the prompt for one part.
+
+    With ``max_tokens`` the prompt is fitted to that budget (as measured by
+    ``count``) by giving up its lowest-priority sections first: the oldest
+    previous-part summaries, then the tail of the additional context, then
+    the most recent previous part. If ``report`` is given it is filled with
+    the token counts and the sections that were dropped or trimmed.
+    """
+    return ''.join(_build_prompt(
+        topic, expertise, tone, context, part_number, total_parts, previous_parts,
+        custom_template, writing_style, max_tokens, count, report, split=False
+    ))
+
+
+def build_story_prompt_split(
+    topic: str,
+    expertise: str,
+    tone: str,
+    context: Optional[str] = None,
+    part_number: int = 1,
+    total_parts: int = 1,
+    previous_parts: list[str] = None,
+    custom_template: Optional[str] = None,
+    writing_style: str = 'balanced',
+    max_tokens: Optional[int] = None,
+    count: Callable[[str], int] = estimate_tokens,
+    report: Optional[Dict[str, Any]] = None
+) -> Tuple[str, str]:
+    """Like ``build_story_prompt`` but returns ``(prefix, suffix)``.
+
+    The prefix (every template line without a per-part placeholder, then
+    the continuity requirements) is identical for every part of a story,
+    so it can be cached by the provider; the suffix carries the part
+    number, previous parts and part instructions.
+    """
+    return _build_prompt(
+        topic, expertise, tone, context, part_number, total_parts, previous_parts,
+        custom_template, writing_style, max_tokens, count, report, split=True
+    )
+
+
+def _build_prompt(
+    topic, expertise, tone, context, part_number, total_parts, previous_parts,
+    custom_template, writing_style, max_tokens, count, report, split
+) -> Tuple[str, str]:
+    values = {
+        'part_number': part_number,
+        'total_parts': total_parts,
+        'topic': topic,
+        'topic_category': get_topic_category(topic),
+        'expertise': expertise,
+        'expertise_instructions': EXPERTISE_INSTRUCTIONS.get(expertise, ''),
+        'tone': tone,
+        'tone_instructions': TONE_INSTRUCTIONS.get(tone, ''),
+        'category_instructions': CATEGORY_INSTRUCTIONS.get(writing_style, CATEGORY_INSTRUCTIONS['balanced'])
+    }
+    template = custom_template or DEFAULT_TEMPLATE
+    instructions = part_instructions(part_number, total_parts)
+    if split:
+        # Stable lines and the continuity reminder first, per-part lines and
+        # part instructions last
+        head_template, body_template = split_template(template)
+        head = compile_template(head_template)
+        body = compile_template(body_template)
+        head_tail, tail = CONTINUITY_REQUIREMENTS, instructions
+    else:
+        # Use custom template if provided, otherwise use default. Part-specific
+        # instructions ensure progression, then a strong reminder about continuity.
+        head = None
+        body = compile_template(custom_template) if custom_template else _DEFAULT_COMPILED
+        head_tail, tail = '', instructions + CONTINUITY_REQUIREMENTS
+    previous = list(previous_parts) if previous_parts and part_number > 1 else []
+
+    def render(context: Optional[str], previous: List[str]) -> Tuple[str, str]:
+        values['context_text'] = f"\nAdditional Context:\n{context}" if context else ""
+        values['previous_context'] = (
+            "\nPrevious parts summary:\n" + "\n".join(previous) if previous else ""
+        )
+        prefix = head.render(values) + head_tail if head else ''
+        return prefix, body.render(values) + tail
+
+    prompt = render(context, previous)
+    if max_tokens is None:
+        return prompt
+
+    tokens = count(''.join(prompt))
+    fit = {'budget': max_tokens, 'original_tokens': tokens, 'dropped': [], 'trimmed': {}}
+
+    # Oldest summaries go first; the last entry (the latest part) is kept for now
+    if tokens > max_tokens and len(previous) > 1:
+        excess = tokens - max_tokens
+        while len(previous) > 1 and excess > 0:
+            excess -= estimate_tokens(previous.pop(0)) + 1
+            fit['dropped'].append(f"previous part {len(fit['dropped']) + 1}")
+        prompt = render(context, previous)
+        tokens = count(''.join(prompt))
+
+    if tokens > max_tokens and context:
+        keep = estimate_tokens(context) - (tokens - max_tokens)
+        trimmed = truncate_to_tokens(context, keep) if keep >= _MIN_CONTEXT_TOKENS else ''
+        if trimmed:
+            fit['trimmed']['context'] = estimate_tokens(context) - estimate_tokens(trimmed)
+        else:
+            fit['dropped'].append('context')
+        context = trimmed
+        prompt = render(context, previous)
+        tokens = count(''.join(prompt))
+
+    if tokens > max_tokens and previous:
+        fit['dropped'].append(f"previous part {len(previous_parts)}")
+        previous = []
+        prompt = render(context, previous)
+        tokens = count(''.join(prompt))
+
+    fit['final_tokens'] = tokens
+    fit['fits'] = tokens <= max_tokens
+    if report is not None:
+        report.update(fit)
+    return prompt
@@ -1,8 +1,25 @@
+from contextlib import contextmanager
 from typing import Dict, Optional
+from .prompt_builder import compile_template
+import hashlib
 import json
 import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
 
 class PromptManager:
+    """Process-wide store for prompt templates.
+
+    The prompts file is parsed once and re-read only when its mtime or size
+    changes, so edits made by other workers are still picked up. Writes hold
+    an inter-process lock and replace the file atomically.
+    """
+
     def __init__(self):
         self.prompts_file = 'data/custom_prompts.json'
         self.default_prompts = {
@@ -39,46 +56,119 @@ class PromptManager:
                 '''
             }
         }
+        self._lock = threading.RLock()
+        self._prompts: Dict = {}
+        self._stamp = None
+        self.etag = ''
+        self.version = 0
         self._ensure_data_directory()
         self.load_prompts()
 
     def _ensure_data_directory(self):
-        os.makedirs('data', exist_ok=True)
+        os.makedirs(os.path.dirname(self.prompts_file) or '.', exist_ok=True)
         if not os.path.exists(self.prompts_file):
-            with open(self.prompts_file, 'w') as f:
-                json.dump(self.default_prompts, f, indent=2)
+            self._write(self.default_prompts)
 
-    def load_prompts(self) -> Dict:
+    def _file_stamp(self):
         try:
-            with open(self.prompts_file, 'r') as f:
-                return json.load(f)
+            stat = os.stat(self.prompts_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _read_file(self):
+        stamp = self._file_stamp()
+        try:
+            with open(self.prompts_file, 'rb') as f:
+                raw = f.read()
+            prompts = json.loads(raw)
         except Exception:
-            return self.default_prompts
+            prompts = self.default_prompts
+            raw = json.dumps(prompts, sort_keys=True).encode('utf-8')
+        self._prompts = prompts
+        self._stamp = stamp
+        self.etag = hashlib.sha1(raw).hexdigest()[:16]
+        self.version += 1
+
+    def _write(self, prompts: Dict):
+        directory = os.path.dirname(self.prompts_file) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.prompts-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(prompts, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.prompts_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by all threads and processes writing the file."""
+        with self._lock:
+            if not fcntl:
+                yield
+                return
+            with open(self.prompts_file + '.lock', 'w') as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _update(self, mutate) -> Dict:
+        """Apply ``mutate`` to the freshest prompts on disk and persist them."""
+        with self._file_lock():
+            self._read_file()
+            prompts = dict(self._prompts)
+            mutate(prompts)
+            self._write(prompts)
+            self._read_file()
+            return self._prompts
+
+    def load_prompts(self) -> Dict:
+        with self._lock:
+            if self._stamp is None or self._file_stamp() != self._stamp:
+                self._read_file()
+            return self._prompts
 
     def save_prompt(self, prompt_id: str, name: str, template: str) -> Dict:
-        prompts = self.load_prompts()
-        prompts[prompt_id] = {
-            'name': name,
-            'template': template
-        }
-        with open(self.prompts_file, 'w') as f:
-            json.dump(prompts, f, indent=2)
-        return prompts[prompt_id]
+        """Validate and store a template; raises TemplateError if it is invalid."""
+        compile_template(template)
+
+        def mutate(prompts):
+            prompts[prompt_id] = {
+                'name': name,
+                'template': template
+            }
+        return self._update(mutate)[prompt_id]
 
     def get_prompt(self, prompt_id: str) -> Optional[Dict]:
         prompts = self.load_prompts()
         return prompts.get(prompt_id)
 
+    def get_prompt_etag(self, prompt_id: str) -> Optional[str]:
+        prompt = self.get_prompt(prompt_id)
+        if prompt is None:
+            return None
+        raw = json.dumps(prompt, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(raw).hexdigest()[:16]
+
     def delete_prompt(self, prompt_id: str) -> bool:
         if prompt_id == 'default':
             return False
-        prompts = self.load_prompts()
-        if prompt_id in prompts:
-            del prompts[prompt_id]
-            with open(self.prompts_file, 'w') as f:
-                json.dump(prompts, f, indent=2)
-            return True
-        return False
+        if prompt_id not in self.load_prompts():
+            return False
+
+        def mutate(prompts):
+            prompts.pop(prompt_id, None)
+        self._update(mutate)
+        return True
 
     def list_prompts(self) -> Dict:
-        return self.load_prompts()
\ No newline at end of file
+        return dict(self.load_prompts())
+
+
+prompt_manager = PromptManager()
@@ -1,12 +1,13 @@
-from flask import Blueprint, jsonify
-from .prompt_manager import PromptManager
+from flask import Blueprint, request, jsonify
+from .prompt_manager import prompt_manager
 
 prompt_preview = Blueprint('prompt_preview', __name__)
-prompt_manager = PromptManager()
 
 @prompt_preview.route('/prompts/<prompt_id>', methods=['GET'])
 def get_prompt_preview(prompt_id):
     prompt = prompt_manager.get_prompt(prompt_id)
     if prompt:
-        return jsonify(prompt)
+        response = jsonify(prompt)
+        response.set_etag(prompt_manager.get_prompt_etag(prompt_id))
+        return response.make_conditional(request)
     return jsonify({'error': 'Prompt not found'}), 404
\ No newline at end of file
@@ -1,19 +1,23 @@
 from flask import Blueprint, request, jsonify
-from .prompt_manager import PromptManager
+from .prompt_manager import prompt_manager
+from .prompt_builder import TemplateError
 
 prompt_routes = Blueprint('prompt_routes', __name__)
-prompt_manager = PromptManager()
 
 @prompt_routes.route('/prompts', methods=['GET'])
 def list_prompts():
     prompts = prompt_manager.list_prompts()
-    return jsonify(prompts)
+    response = jsonify(prompts)
+    response.set_etag(prompt_manager.etag)
+    return response.make_conditional(request)
 
 @prompt_routes.route('/prompts/<prompt_id>', methods=['GET'])
 def get_prompt(prompt_id):
     prompt = prompt_manager.get_prompt(prompt_id)
     if prompt:
-        return jsonify(prompt)
+        response = jsonify(prompt)
+        response.set_etag(prompt_manager.get_prompt_etag(prompt_id))
+        return response.make_conditional(request)
     return jsonify({'error': 'Prompt not found'}), 404
 
 @prompt_routes.route('/prompts', methods=['POST'])
@@ -22,11 +26,14 @@ def create_prompt():
     if not data or 'name' not in data or 'template' not in data or 'prompt_id' not in data:
         return jsonify({'error': 'Missing required fields'}), 400
     
-    prompt = prompt_manager.save_prompt(
-        data['prompt_id'],
-        data['name'],
-        data['template']
-    )
+    try:
+        prompt = prompt_manager.save_prompt(
+            data['prompt_id'],
+            data['name'],
+            data['template']
+        )
+    except TemplateError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(prompt), 201
 
 @prompt_routes.route('/prompts/<prompt_id>', methods=['DELETE'])
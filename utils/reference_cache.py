@@ -0,0 +1,192 @@
+from typing import Callable, Dict, Optional
+from .config import REFERENCE_CACHE_PATH, REFERENCE_CACHE_TTL, REFERENCE_CACHE_MAX_BYTES
+from .metrics import metrics
+from .storage import get_connection
+from .youtube_extractor import VideoContent, extract_video_id, fetch_video
+import threading
+import time
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS videos (
+        video_id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT NOT NULL,
+        captions TEXT,
+        size INTEGER NOT NULL,
+        expires REAL NOT NULL,
+        accessed REAL NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS analyses (
+        key TEXT PRIMARY KEY,
+        video_id TEXT NOT NULL,
+        analysis TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        expires REAL NOT NULL,
+        accessed REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS videos_accessed ON videos (accessed)',
+    'CREATE INDEX IF NOT EXISTS analyses_accessed ON analyses (accessed)'
+)
+
+
+class ReferenceCache:
+    """Persistent cache of YouTube video content and per-video analyses.
+
+    Raw video content (title, description, captions) is keyed by video id;
+    analyses are keyed by video id, model and analysis prompt version so a
+    prompt change never serves a stale analysis. Both tables expire entries
+    after ``ttl`` seconds and evict least recently used rows once their
+    combined size passes ``max_bytes``. The database is shared by every
+    worker pointing at the same file; with no ``path`` the cache is off and
+    every lookup goes to ``fetcher``.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        ttl: float = 7 * 24 * 3600,
+        max_bytes: int = 32 * 1024 * 1024,
+        fetcher: Callable[[str], VideoContent] = fetch_video
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.fetcher = fetcher
+        self._lock = threading.Lock()
+        self._stats = {
+            'video_hits': 0, 'video_misses': 0,
+            'analysis_hits': 0, 'analysis_misses': 0, 'evictions': 0
+        }
+        if path:
+            for statement in _SCHEMA:
+                self._db().execute(statement)
+
+    def _db(self):
+        return get_connection(self.path)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    @staticmethod
+    def analysis_key(video_id: str, model_name: str, prompt_version: str) -> str:
+        return f"{video_id}:{model_name}:{prompt_version}"
+
+    def get_video(self, url: str) -> VideoContent:
+        """Return the video's content, fetching and storing it on a miss.
+
+        Fetch errors propagate and are not cached.
+        """
+        video_id = extract_video_id(url)
+        if self.path and video_id:
+            try:
+                now = time.time()
+                row = self._db().execute(
+                    'SELECT title, description, captions FROM videos '
+                    'WHERE video_id = ? AND expires > ?', (video_id, now)
+                ).fetchone()
+                if row:
+                    self._db().execute(
+                        'UPDATE videos SET accessed = ? WHERE video_id = ?', (now, video_id)
+                    )
+                    self._count('video_hits')
+                    metrics.inc('cache_requests', cache='reference_video', result='hit')
+                    return VideoContent(video_id, *row)
+            except Exception as e:
+                print(f"Reference cache read failed: {str(e)}")
+
+        self._count('video_misses')
+        metrics.inc('cache_requests', cache='reference_video', result='miss')
+        video = self.fetcher(url)
+        if self.path and video.video_id:
+            try:
+                now = time.time()
+                size = sum(len(field.encode('utf-8')) for field in video[1:] if field)
+                self._db().execute(
+                    'INSERT OR REPLACE INTO videos '
+                    '(video_id, title, description, captions, size, expires, accessed) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (video.video_id, video.title, video.description, video.captions,
+                     size, now + self.ttl, now)
+                )
+                self._evict(now)
+            except Exception as e:
+                print(f"Reference cache write failed: {str(e)}")
+        return video
+
+    def get_analysis(self, video_id: str, model_name: str, prompt_version: str) -> Optional[str]:
+        if not self.path:
+            return None
+        key = self.analysis_key(video_id, model_name, prompt_version)
+        try:
+            now = time.time()
+            row = self._db().execute(
+                'SELECT analysis FROM analyses WHERE key = ? AND expires > ?', (key, now)
+            ).fetchone()
+            if row:
+                self._db().execute('UPDATE analyses SET accessed = ? WHERE key = ?', (now, key))
+                self._count('analysis_hits')
+                metrics.inc('cache_requests', cache='reference_analysis', result='hit')
+                return row[0]
+        except Exception as e:
+            print(f"Reference cache read failed: {str(e)}")
+        self._count('analysis_misses')
+        metrics.inc('cache_requests', cache='reference_analysis', result='miss')
+        return None
+
+    def set_analysis(self, video_id: str, model_name: str, prompt_version: str, analysis: str):
+        if not self.path:
+            return
+        key = self.analysis_key(video_id, model_name, prompt_version)
+        try:
+            now = time.time()
+            self._db().execute(
+                'INSERT OR REPLACE INTO analyses (key, video_id, analysis, size, expires, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, video_id, analysis, len(analysis.encode('utf-8')), now + self.ttl, now)
+            )
+            self._evict(now)
+        except Exception as e:
+            print(f"Reference cache write failed: {str(e)}")
+
+    def _evict(self, now: float):
+        db = self._db()
+        db.execute('DELETE FROM videos WHERE expires <= ?', (now,))
+        db.execute('DELETE FROM analyses WHERE expires <= ?', (now,))
+        total = db.execute(
+            'SELECT (SELECT COALESCE(SUM(size), 0) FROM videos) + '
+            '(SELECT COALESCE(SUM(size), 0) FROM analyses)'
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        rows = db.execute(
+            "SELECT 'videos', video_id, size, accessed FROM videos "
+            "UNION ALL SELECT 'analyses', key, size, accessed FROM analyses "
+            "ORDER BY accessed"
+        ).fetchall()
+        evicted = 0
+        for table, key, size, _ in rows:
+            if excess <= 0:
+                break
+            column = 'video_id' if table == 'videos' else 'key'
+            db.execute(f'DELETE FROM {table} WHERE {column} = ?', (key,))
+            excess -= size
+            evicted += 1
+        self._count('evictions', evicted)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def clear(self):
+        if self.path:
+            self._db().execute('DELETE FROM videos')
+            self._db().execute('DELETE FROM analyses')
+
+
+reference_cache = ReferenceCache(
+    REFERENCE_CACHE_PATH or None,
+    ttl=REFERENCE_CACHE_TTL,
+    max_bytes=REFERENCE_CACHE_MAX_BYTES
+)
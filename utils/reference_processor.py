@@ -1,29 +1,18 @@
-from typing import List
-from .youtube_extractor import extract_video_id, get_video_content
+from typing import Dict, List, Optional
+from .youtube_extractor import VideoContent, extract_video_id, strip_srt
+from .model_client import generate_content, run_blocking
+from .metrics import span
+from .retry_policy import call_with_retry
+from .reference_cache import ReferenceCache, reference_cache
+from .tokens import estimate_tokens, split_by_tokens, truncate_to_tokens
+from .config import (
+    REFERENCE_CONCURRENCY, REFERENCE_MODEL_CONCURRENCY, REFERENCE_VIDEO_CONCURRENCY,
+    REFERENCE_CHUNK_TOKENS, REFERENCE_TOKEN_BUDGET, REFERENCE_MAX_CHUNKS
+)
+import asyncio
+import hashlib
 
-class ReferenceProcessor:
-    def __init__(self, model):
-        self.model = model
-    
-    def process_youtube_references(self, urls: List[str]) -> str:
-        """Process multiple YouTube URLs and combine their content."""
-        if not urls:
-            return ""
-            
-        combined_content = []
-        
-        for url in urls:
-            content = get_video_content(url)
-            if not content.startswith('Error'):
-                combined_content.append(content)
-        
-        if not combined_content:
-            return ""
-            
-        # First, analyze each video's content separately
-        analyzed_contents = []
-        for content in combined_content:
-            analysis_prompt = f"""
+ANALYSIS_PROMPT = """
             Analyze this YouTube video content in detail:
 
             {content}
@@ -39,22 +28,11 @@ class ReferenceProcessor:
 
             Format as a detailed analysis that maintains all specific information.
             """
-            
-            try:
-                analysis = self.model.generate_content(analysis_prompt).text
-                analyzed_contents.append(analysis)
-            except Exception as e:
-                print(f"Error analyzing video content: {str(e)}")
-                continue
-        
-        if not analyzed_contents:
-            return ""
-        
-        # Then, combine and structure all analyzed content
-        combination_prompt = f"""
+
+COMBINATION_PROMPT = """
         Combine and structure these analyzed contents into a comprehensive reference:
 
-        {'\n\n---\n\n'.join(analyzed_contents)}
+        {analyses}
 
         Create a unified knowledge base that:
         1. Preserves all specific information from each source
@@ -66,10 +44,199 @@ class ReferenceProcessor:
         7. Maintains the context and depth of each source
 
         Format as a detailed reference that can enhance the main topic discussion.
+        Keep it under {words} words.
         """
-        
+
+# Cached analyses are keyed by this, so editing the prompts or budgets invalidates them
+ANALYSIS_PROMPT_VERSION = hashlib.sha256(
+    f"{ANALYSIS_PROMPT}{COMBINATION_PROMPT}{REFERENCE_CHUNK_TOKENS}:{REFERENCE_TOKEN_BUDGET}".encode('utf-8')
+).hexdigest()[:12]
+
+# Title and description are repeated on every chunk of a video, up to this size
+_HEADER_TOKENS = 300
+
+# Reduce rounds before falling back to truncation
+_MAX_REDUCE_ROUNDS = 4
+
+
+def video_chunks(video: VideoContent, chunk_tokens: int, max_chunks: int) -> List[str]:
+    """Split a video's text into analysis-sized chunks, each with its header.
+
+    Captions are stripped of SRT numbering and timestamps first. Videos
+    longer than ``max_chunks`` chunks are sampled evenly across their length.
+    """
+    header = truncate_to_tokens(
+        f"Title: {video.title}\nDescription: {video.description}", _HEADER_TOKENS
+    )
+    transcript = strip_srt(video.captions) if video.captions else ''
+    if not transcript:
+        return [header]
+    pieces = split_by_tokens(transcript, max(chunk_tokens - estimate_tokens(header), 1))
+    if len(pieces) > max_chunks:
+        step = len(pieces) / max_chunks
+        pieces = [pieces[int(i * step)] for i in range(max_chunks)]
+    return [f"{header}\n{piece}" for piece in pieces]
+
+
+def group_by_tokens(items: List[str], max_tokens: int) -> List[List[str]]:
+    """Pack consecutive items into groups within ``max_tokens``.
+
+    Every group holds at least two items (when there are two left) so a
+    reduce round always shrinks the list.
+    """
+    groups = []
+    current: List[str] = []
+    size = 0
+    for item in items:
+        tokens = estimate_tokens(item)
+        if len(current) >= 2 and size + tokens > max_tokens:
+            groups.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += tokens
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
+
+
+class ReferenceProcessor:
+    def __init__(self, model, model_name: Optional[str] = None, cache: Optional[ReferenceCache] = None):
+        self.model = model
+        self.model_name = model_name or getattr(model, 'model_name', 'unknown')
+        self.cache = cache or reference_cache
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    async def _generate_text(self, prompt: str) -> str:
+        return await call_with_retry(
+            lambda: self._call_model(prompt),
+            self.model_name
+        )
+
+    async def _call_model(self, prompt: str) -> str:
+        return (await generate_content(self.model, prompt)).text
+    
+    async def _analyse(
+        self, content: str, semaphore: asyncio.Semaphore, video_semaphore: asyncio.Semaphore
+    ) -> Optional[str]:
+        try:
+            async with video_semaphore, semaphore:
+                with span('reference_analysis'):
+                    return await self._generate_text(ANALYSIS_PROMPT.format(content=content))
+        except Exception as e:
+            print(f"Error analyzing video content: {str(e)}")
+            return None
+
+    async def _combine(self, analyses: List[str], max_tokens: int, semaphore: asyncio.Semaphore) -> str:
+        prompt = COMBINATION_PROMPT.format(
+            analyses='\n\n---\n\n'.join(analyses),
+            words=max(max_tokens * 3 // 4, 50)
+        )
+        async with semaphore:
+            return await self._generate_text(prompt)
+
+    async def condense(self, analyses: List[str], max_tokens: int, semaphore: asyncio.Semaphore) -> str:
+        """Merge analyses hierarchically until the result fits ``max_tokens``.
+
+        Each round combines groups that fit one model call, in parallel; the
+        result of the last round is truncated if the model overshoots.
+        """
+        with span('reference_condense'):
+            for _ in range(_MAX_REDUCE_ROUNDS):
+                if len(analyses) == 1 and estimate_tokens(analyses[0]) <= max_tokens:
+                    break
+                groups = group_by_tokens(analyses, REFERENCE_CHUNK_TOKENS)
+                analyses = list(await asyncio.gather(
+                    *(self._combine(group, max_tokens, semaphore) for group in groups)
+                ))
+        return truncate_to_tokens('\n\n'.join(analyses), max_tokens)
+
+    async def _ingest_video(
+        self, url: str, fetch_semaphore: asyncio.Semaphore, semaphore: asyncio.Semaphore
+    ) -> Optional[str]:
+        """Fetch one video and map-reduce it to a budgeted analysis, via the cache.
+
+        ``fetch_semaphore`` bounds fetches and ``semaphore`` model calls; at
+        most ``REFERENCE_VIDEO_CONCURRENCY`` of this video's chunks are
+        analysed at once. Returns None if the video cannot be fetched or no
+        chunk could be analysed.
+        """
+        video_id = extract_video_id(url)
+        if video_id:
+            cached = await run_blocking(
+                self.cache.get_analysis, video_id, self.model_name, ANALYSIS_PROMPT_VERSION
+            )
+            if cached is not None:
+                return cached
+
+        try:
+            async with fetch_semaphore:
+                with span('reference_fetch'):
+                    video = await run_blocking(self.cache.get_video, url)
+        except Exception as e:
+            print(f"Error getting video content: {str(e)}")
+            return None
+
+        chunks = video_chunks(video, REFERENCE_CHUNK_TOKENS, REFERENCE_MAX_CHUNKS)
+        video_semaphore = asyncio.Semaphore(REFERENCE_VIDEO_CONCURRENCY)
+        results = await asyncio.gather(
+            *(self._analyse(chunk, semaphore, video_semaphore) for chunk in chunks)
+        )
+        analyses = [analysis for analysis in results if analysis]
+        if not analyses:
+            return None
+
+        try:
+            analysis = await self.condense(analyses, REFERENCE_TOKEN_BUDGET, semaphore)
+        except Exception as e:
+            print(f"Error condensing video analysis: {str(e)}")
+            return None
+        await run_blocking(
+            self.cache.set_analysis, video.video_id, self.model_name, ANALYSIS_PROMPT_VERSION, analysis
+        )
+        return analysis
+
+    async def process_youtube_references(self, urls: List[str]) -> str:
+        """Process multiple YouTube URLs and combine their content.
+
+        Concurrent calls for the same set of videos on the same event loop
+        share one run, so batch items with common references do the work once.
+        """
+        if not urls:
+            return ""
+
+        # One entry per video, in first-seen order
+        videos = {}
+        for url in urls:
+            videos.setdefault(extract_video_id(url) or url, url)
+
+        key = (id(asyncio.get_running_loop()), frozenset(videos))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._process_references(list(videos.values())))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _process_references(self, urls: List[str]) -> str:
+        # Fetch every video concurrently and analyse its chunks as soon as its
+        # content arrives, so wall time tracks the slowest video. Fetches and
+        # model calls are bounded separately, so chunk analyses never hold up
+        # another video's fetch.
+        fetch_semaphore = asyncio.Semaphore(REFERENCE_CONCURRENCY)
+        semaphore = asyncio.Semaphore(REFERENCE_MODEL_CONCURRENCY)
+        results = await asyncio.gather(
+            *(self._ingest_video(url, fetch_semaphore, semaphore) for url in urls)
+        )
+        analyzed_contents = [analysis for analysis in results if analysis]
+
+        if not analyzed_contents:
+            return ""
+
+        # Then merge all videos into one reference within the context budget
         try:
-            structured_content = self.model.generate_content(combination_prompt).text
-            return structured_content
+            return await self.condense(analyzed_contents, REFERENCE_TOKEN_BUDGET, semaphore)
         except Exception as e:
-            return f"Error processing references: {str(e)}"
\ No newline at end of file
+            return f"Error processing references: {str(e)}"
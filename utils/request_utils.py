@@ -0,0 +1,43 @@
+from flask import jsonify, request, session
+from .admission import admission, admission_key, expected_model_calls
+from .config import ADMISSION_PER_IP, MAX_STORY_PARTS
+import math
+import os
+
+def get_api_key():
+    return os.getenv('GEMINI_API_KEY') or session.get('api_key')
+
+def parse_generation_request(data, max_parts=MAX_STORY_PARTS):
+    """Extract generation parameters from a request payload."""
+    return {
+        'topic': data.get('topic'),
+        'model_name': data.get('model', 'gemini-2.0-flash-exp'),
+        'expertise': data.get('expertise'),
+        'tone': data.get('tone'),
+        'context': data.get('context', ''),
+        'youtube_urls': data.get('youtube_urls', []),
+        'total_parts': max(1, min(int(data.get('total_parts', 2)), max_parts)),  # Limit parts
+        'prompt_id': data.get('prompt_id', 'default'),
+        'writing_style': data.get('writing_style', 'balanced'),
+        'pipelined': data.get('pipelined'),
+        'summarizer': data.get('summarizer'),
+        'use_cache': not data.get('no_cache', False)
+    }
+
+async def admit_story_request(api_key, params):
+    """Charge a story request to its rate-limit bucket, waiting if needed.
+
+    Returns None once admitted, or a 429 response with Retry-After.
+    """
+    key = admission_key(api_key, request.remote_addr if ADMISSION_PER_IP else None)
+    admitted, seconds = await admission.admit(key, expected_model_calls(params))
+    if admitted:
+        return None
+    retry_after = max(1, math.ceil(seconds))
+    response = jsonify({
+        'error': 'Too many story requests for this API key; please retry later',
+        'retry_after': retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
@@ -0,0 +1,302 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from .config import (
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+from .metrics import metrics
+import asyncio
+import random
+import re
+import threading
+import time
+
+T = TypeVar('T')
+
+# Error kinds
+RATE_LIMIT = 'rate_limit'
+SERVER = 'server'
+EMPTY = 'empty'
+FATAL = 'fatal'
+
+_RATE_LIMIT_NAMES = {'ResourceExhausted', 'TooManyRequests'}
+_SERVER_NAMES = {
+    'ServiceUnavailable', 'InternalServerError', 'DeadlineExceeded', 'BadGateway',
+    'GatewayTimeout', 'Aborted', 'Unknown', 'ServerError'
+}
+_FATAL_NAMES = {
+    'InvalidArgument', 'BadRequest', 'PermissionDenied', 'Unauthenticated',
+    'Unauthorized', 'Forbidden', 'NotFound', 'FailedPrecondition', 'BlockedPromptException',
+    'StopCandidateException'
+}
+
+
+class EmptyResponseError(ValueError):
+    """The model answered but returned no text."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the model while its circuit breaker is open."""
+
+    def __init__(self, model_name: str, retry_in: float):
+        super().__init__(
+            f"Model {model_name} is temporarily unavailable after repeated failures; "
+            f"retry in {retry_in:.0f}s"
+        )
+        self.model_name = model_name
+        self.retry_in = retry_in
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when there is not enough request budget left for another attempt."""
+
+
+def classify_error(error: Exception) -> str:
+    """Sort a model-call failure into rate_limit, server, empty or fatal."""
+    if isinstance(error, EmptyResponseError):
+        return EMPTY
+    name = type(error).__name__
+    code = getattr(error, 'code', None)
+    code = getattr(code, 'value', code)
+    if name in _RATE_LIMIT_NAMES or code == 429:
+        return RATE_LIMIT
+    if name in _FATAL_NAMES or (isinstance(code, int) and 400 <= code < 500):
+        return FATAL
+    if name in _SERVER_NAMES or (isinstance(code, int) and code >= 500):
+        return SERVER
+    message = str(error).lower()
+    if '429' in message or 'quota' in message or 'rate limit' in message:
+        return RATE_LIMIT
+    if isinstance(error, (ValueError, TypeError, KeyError)):
+        return FATAL
+    # Connection resets, timeouts and anything unrecognised are worth retrying
+    return SERVER
+
+
+def retry_after_hint(error: Exception) -> Optional[float]:
+    """Extract a server-provided retry delay in seconds, if any."""
+    for detail in getattr(error, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            return getattr(delay, 'seconds', 0) + getattr(delay, 'nanos', 0) / 1e9
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    if headers.get('Retry-After', '').strip().isdigit():
+        return float(headers['Retry-After'])
+    match = re.search(r'retry(?:_delay| in| after)[^0-9]*([0-9]+(?:\.[0-9]+)?)\s*s', str(error), re.I)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class Deadline:
+    """Absolute point in time by which a request must be finished."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter and per-error-kind handling.
+
+    Rate limits honour the server's retry hint and back off from a larger
+    base than server errors; empty responses are retried once, immediately;
+    fatal errors (bad request, auth, blocked prompt) are never retried.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        rate_limit_base_delay: float = 2.0
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_base_delay = rate_limit_base_delay
+
+    def should_retry(self, kind: str, attempt: int) -> bool:
+        """``attempt`` is the zero-based index of the attempt that just failed."""
+        if kind == FATAL or attempt + 1 >= self.max_attempts:
+            return False
+        if kind == EMPTY:
+            return attempt == 0
+        return True
+
+    def delay(self, kind: str, attempt: int, hint: Optional[float] = None) -> float:
+        if kind == EMPTY:
+            return 0.0
+        base = self.rate_limit_base_delay if kind == RATE_LIMIT else self.base_delay
+        ceiling = min(self.max_delay, base * (2 ** attempt))
+        delay = random.uniform(ceiling / 2, ceiling) if kind == RATE_LIMIT else random.uniform(0, ceiling)
+        if hint is not None:
+            delay = max(delay, hint + random.uniform(0, base))
+        return delay
+
+
+class CircuitBreaker:
+    """Per-model breaker: opens after consecutive failures, probes after a cool-down."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, model_name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.model_name = model_name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.total_failures = 0
+        self.total_rejections = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                waited = time.monotonic() - self.opened_at
+                if waited < self.reset_timeout:
+                    self.total_rejections += 1
+                    raise CircuitOpenError(self.model_name, self.reset_timeout - waited)
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self.total_rejections += 1
+                    raise CircuitOpenError(self.model_name, 1)
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """The call was abandoned (e.g. a hedged call that lost); it says nothing about health."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'total_failures': self.total_failures,
+                'total_rejections': self.total_rejections,
+                'retry_in': round(retry_in, 1)
+            }
+
+
+default_policy = RetryPolicy(RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model_name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker(
+                model_name, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+            )
+        return _breakers[model_name]
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.model_name: breaker.snapshot() for breaker in breakers}
+
+
+def record_outcome(breaker: CircuitBreaker, error: Optional[Exception], pacer=None) -> str:
+    """Update the breaker (and pacer) after an attempt; returns the error kind."""
+    if error is None:
+        breaker.record_success()
+        if pacer:
+            pacer.record_success()
+        return ''
+    kind = classify_error(error)
+    metrics.inc('model_errors', model=breaker.model_name, kind=kind)
+    if kind in (RATE_LIMIT, SERVER):
+        breaker.record_failure()
+    else:
+        # The service answered; a bad request or empty answer says nothing about its health
+        breaker.record_success()
+    if kind == RATE_LIMIT and pacer:
+        pacer.record_rate_limit(retry_after_hint(error))
+    return kind
+
+
+async def wait_before_retry(
+    error: Exception,
+    kind: str,
+    attempt: int,
+    policy: RetryPolicy,
+    deadline: Optional[Deadline] = None
+) -> bool:
+    """Sleep before the next attempt; False if it should not be retried."""
+    if not policy.should_retry(kind, attempt):
+        return False
+    delay = policy.delay(kind, attempt, retry_after_hint(error))
+    if deadline is not None and deadline.remaining() <= delay:
+        return False
+    metrics.inc('model_retries', kind=kind)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return True
+
+
+async def call_with_retry(
+    call: Callable[[], Awaitable[T]],
+    model_name: str,
+    policy: Optional[RetryPolicy] = None,
+    deadline: Optional[Deadline] = None,
+    pacer=None
+) -> T:
+    """Run ``call`` under the retry policy and the model's circuit breaker."""
+    policy = policy or default_policy
+    breaker = get_breaker(model_name)
+    attempt = 0
+    while True:
+        if deadline is not None and deadline.remaining() <= 0:
+            raise DeadlineExceededError(f"Request deadline reached before calling {model_name}")
+        if pacer:
+            await pacer.wait()
+        # No await between taking a half-open probe and the try that releases it
+        breaker.before_call()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
+        except Exception as e:
+            kind = record_outcome(breaker, e, pacer)
+            if not await wait_before_retry(e, kind, attempt, policy, deadline):
+                raise
+            attempt += 1
+            continue
+        record_outcome(breaker, None, pacer)
+        return result
@@ -0,0 +1,26 @@
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def get_connection(path: str) -> sqlite3.Connection:
+    """Return this thread's connection to the SQLite database at ``path``.
+
+    Databases are opened in WAL mode with a busy timeout so that several
+    gunicorn workers can share one file.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    connection = connections.get(path)
+    if connection is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(path, timeout=10, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connections[path] = connection
+    return connection
@@ -1,120 +1,476 @@
-from typing import Optional, List
-from .config import init_gemini, AVAILABLE_MODELS, EXPERTISE_LEVELS, TONE_STYLES
-from .prompt_builder import build_story_prompt
-from .summary_generator import generate_summary
+from typing import Optional, List, AsyncIterator, Dict, Any, Tuple
+from .config import (
+    AVAILABLE_MODELS, EXPERTISE_LEVELS, TONE_STYLES, SUMMARIZERS, SUMMARIZER,
+    EXTRACTIVE_SUMMARY_WORDS, OUTPUT_CHUNK_CHARS, PART_MAX_CHARS,
+    MAX_STORY_PARTS, MAX_EXECUTION_TIME, PIPELINE_PARTS, PIPELINE_FULL_PART_CHARS,
+    ENABLE_YOUTUBE_REFERENCES, TOKEN_COUNT_MODE,
+    CLIENT_POOL_IDLE_TIMEOUT, CLIENT_POOL_MAX_SIZE
+)
+from .prompt_builder import build_story_prompt, build_story_prompt_split
+from .summary_generator import Summarizer, LLMSummarizer, ExtractiveSummarizer
 from .reference_processor import ReferenceProcessor
-from .prompt_manager import PromptManager
+from .prompt_manager import prompt_manager
+from .model_client import generate_content, stream_content, run_blocking
+from .tokens import count_tokens, estimate_tokens, prompt_budget
+from .pacing import get_pacer
+from .model_router import model_router
+from .part_scheduler import PartScheduler
+from .generation_cache import generation_cache
+from .context_cache import context_cache
+from .client_pool import ClientPool
+from .model_backends import create_model
+from .metrics import span
+from .chunker import OutputBudget, fit_chunks, iter_chunks
+from .retry_policy import (
+    Deadline, EmptyResponseError, DeadlineExceededError, call_with_retry, default_policy,
+    get_breaker, record_outcome, wait_before_retry
+)
+from dataclasses import dataclass, field
 import time
 import json
 import asyncio
 
+model_pool = ClientPool(create_model, CLIENT_POOL_IDLE_TIMEOUT, CLIENT_POOL_MAX_SIZE)
+
+
+@dataclass
+class StoryPart:
+    number: int
+    chunks: List[str]
+    truncated: bool = False
+    resumed: bool = False
+
+    @property
+    def text(self) -> str:
+        return '\n\n'.join(self.chunks)
+
+    def to_dict(self) -> Dict[str, Any]:
+        text = self.text
+        return {
+            'part': self.number,
+            'text': text,
+            'chars': len(text),
+            'chunks': len(self.chunks),
+            'truncated': self.truncated
+        }
+
+
+@dataclass
+class StoryResult:
+    """Outcome of ``StoryGenerator.generate_story``.
+
+    ``error`` is set if generation failed; the parts finished before the
+    failure are kept. ``budget_exhausted`` means the time budget ran out
+    before ``requested_parts`` were written.
+    """
+    requested_parts: int = 0
+    parts: List[StoryPart] = field(default_factory=list)
+    summaries: Dict[int, str] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    budget_exhausted: bool = False
+    error: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return '\n\n'.join(part.text for part in self.parts)
+
+    @property
+    def truncated(self) -> bool:
+        return self.budget_exhausted or any(part.truncated for part in self.parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'story': self.text,
+            'parts': [part.to_dict() for part in self.parts],
+            'summaries': {str(number): text for number, text in sorted(self.summaries.items())},
+            'requested_parts': self.requested_parts,
+            'completed_parts': len(self.parts),
+            'truncated': self.truncated,
+            'budget_exhausted': self.budget_exhausted,
+            'timings': self.timings
+        }
+
 class StoryGenerator:
     def __init__(self, model_name: str = 'gemini-2.0-flash-exp', api_key: Optional[str] = None):
         if model_name not in AVAILABLE_MODELS:
             raise ValueError(f"Model {model_name} not supported")
-        self.model = init_gemini(model_name, api_key)
+        self.model = model_pool.get(model_name, api_key)
         self.model_name = model_name
         self.api_key = api_key
-        self.reference_processor = ReferenceProcessor(self.model)
-        self.prompt_manager = PromptManager()
-        self.max_retries = 2  # Reduced retries for faster response
-        self.chunk_size = 1500  # Smaller chunks for faster processing
+        self.reference_processor = ReferenceProcessor(self.model, model_name)
+        self.prompt_manager = prompt_manager
+        self.retry_policy = default_policy
+        self.chunk_size = OUTPUT_CHUNK_CHARS
+        self.pacer = get_pacer(model_name)
 
-    def validate_inputs(self, expertise: str, tone: str):
+    def validate_inputs(self, expertise: str, tone: str, summarizer: Optional[str] = None):
         if expertise not in EXPERTISE_LEVELS:
             raise ValueError(f"Expertise level '{expertise}' not supported")
         if tone not in TONE_STYLES:
             raise ValueError(f"Tone style '{tone}' not supported")
+        if summarizer and summarizer not in SUMMARIZERS:
+            raise ValueError(f"Summarizer '{summarizer}' not supported")
+
+    def model_for(self, model_name: str):
+        """The client for ``model_name`` under this generator's API key."""
+        if model_name == self.model_name:
+            return self.model
+        return model_pool.get(model_name, self.api_key)
 
-    async def safe_generate_content(self, prompt: str) -> str:
-        """Asynchronously generate content with optimized retry logic."""
-        for attempt in range(self.max_retries):
+    async def _generate_text(self, prompt: str, model_name: Optional[str] = None) -> str:
+        response = await generate_content(self.model_for(model_name or self.model_name), prompt)
+        if not response or not response.text:
+            raise EmptyResponseError("Empty response received")
+        return response.text.strip()
+
+    async def safe_generate_content(
+        self,
+        prompt: str,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        purpose: str = 'part'
+    ) -> str:
+        """Asynchronously generate content under the retry policy and circuit breaker.
+
+        The model is picked and the call hedged by the model router.
+        """
+        target = model_router.choose(self.model_name, purpose)
+        cache_key = generation_cache.make_key(target, prompt)
+        if use_cache:
+            cached = await generation_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        try:
+            text = await model_router.race(
+                lambda model_name: call_with_retry(
+                    lambda: self._generate_text(prompt, model_name),
+                    model_name,
+                    policy=self.retry_policy,
+                    deadline=deadline,
+                    pacer=get_pacer(model_name)
+                ),
+                target
+            )
+        except Exception as e:
+            return json.dumps({"error": f"Failed to generate content: {str(e)}"})
+
+        await generation_cache.set(cache_key, text)
+        return text
+
+    def count_tokens(self, text: str) -> int:
+        if TOKEN_COUNT_MODE == 'exact':
+            return count_tokens(text, self.model)
+        return estimate_tokens(text)
+
+    def build_prompt(
+        self,
+        topic: str,
+        expertise: str,
+        tone: str,
+        context: Optional[str],
+        part_number: int,
+        total_parts: int,
+        previous_parts: Optional[List[str]],
+        prompt_id: str = 'default',
+        writing_style: str = 'balanced',
+        report: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Build the prompt for one part, using the custom template if specified.
+
+        The prompt is fitted to this model's prompt budget; ``report`` (if
+        given) receives what had to be dropped or trimmed.
+        """
+        return self._build_prompt(
+            build_story_prompt, topic, expertise, tone, context,
+            part_number, total_parts, previous_parts, prompt_id, writing_style, report
+        )
+
+    def build_prompt_split(
+        self,
+        topic: str,
+        expertise: str,
+        tone: str,
+        context: Optional[str],
+        part_number: int,
+        total_parts: int,
+        previous_parts: Optional[List[str]],
+        prompt_id: str = 'default',
+        writing_style: str = 'balanced',
+        report: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, str]:
+        """Like ``build_prompt`` but split into a stable prefix and a per-part suffix."""
+        return self._build_prompt(
+            build_story_prompt_split, topic, expertise, tone, context,
+            part_number, total_parts, previous_parts, prompt_id, writing_style, report
+        )
+
+    def _build_prompt(
+        self, build, topic, expertise, tone, context,
+        part_number, total_parts, previous_parts, prompt_id, writing_style, report
+    ):
+        custom_prompt = self.prompt_manager.get_prompt(prompt_id)
+        return build(
+            topic, expertise, tone, context,
+            part_number, total_parts, previous_parts,
+            custom_template=custom_prompt['template'] if custom_prompt else None,
+            writing_style=writing_style,
+            max_tokens=prompt_budget(self.model_name),
+            count=self.count_tokens,
+            report=report
+        )
+
+    async def stream_generate_content(
+        self,
+        prompt: str,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None,
+        cached_prefix: Optional[Tuple[Any, str]] = None
+    ) -> AsyncIterator[str]:
+        """Stream generated text as it arrives from the model.
+
+        The model is picked and the stream hedged by the model router.
+        Retries (per the retry policy) only while nothing has been yielded
+        yet; once text has been forwarded to the caller a failure is raised
+        instead of restarting. A cached response is yielded as a single piece.
+
+        ``cached_prefix`` is ``(model, suffix)`` from the context cache: the
+        suffix is sent to a model bound to the already-cached prefix of
+        ``prompt`` instead of sending ``prompt`` in full.
+        """
+        target = model_router.choose(self.model_name)
+        cache_key = generation_cache.make_key(target, prompt)
+        if use_cache:
+            cached = await generation_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        def open_stream(model_name: str) -> AsyncIterator[str]:
+            if cached_prefix and model_name == self.model_name:
+                return self._stream_with_retry(model_name, *cached_prefix, deadline)
+            return self._stream_with_retry(model_name, self.model_for(model_name), prompt, deadline)
+
+        pieces = []
+        async for text in model_router.race_stream(open_stream, target):
+            pieces.append(text)
+            yield text
+        await generation_cache.set(cache_key, ''.join(pieces).strip())
+
+    async def _stream_with_retry(
+        self,
+        model_name: str,
+        model: Any,
+        prompt: str,
+        deadline: Optional[Deadline]
+    ) -> AsyncIterator[str]:
+        breaker = get_breaker(model_name)
+        pacer = get_pacer(model_name)
+        attempt = 0
+        while True:
+            if deadline is not None and deadline.remaining() <= 0:
+                raise DeadlineExceededError(f"Request deadline reached before calling {model_name}")
+            await pacer.wait()
+            # No await between taking a half-open probe and the try that releases it
+            breaker.before_call()
+            pieces = []
             try:
-                response = self.model.generate_content(prompt)
-                if not response or not response.text:
-                    raise ValueError("Empty response received")
-                return response.text.strip()
+                async for text in stream_content(model, prompt):
+                    pieces.append(text)
+                    yield text
+                if not pieces:
+                    raise EmptyResponseError("Empty response received")
+            except (asyncio.CancelledError, GeneratorExit):
+                breaker.record_cancelled()
+                raise
             except Exception as e:
-                if attempt == self.max_retries - 1:
-                    return json.dumps({"error": f"Failed to generate content: {str(e)}"})
-                await asyncio.sleep(1)  # Reduced wait time
-        
-        return json.dumps({"error": "Failed to generate content after multiple attempts"})
-
-    def process_long_content(self, content: str) -> str:
-        """Process long content into smaller chunks."""
-        if len(content) <= self.chunk_size:
-            return content
-
-        chunks = []
-        current_chunk = ""
-        paragraphs = content.split('\n\n')
-
-        for paragraph in paragraphs:
-            if len(current_chunk) + len(paragraph) + 2 <= self.chunk_size:
-                current_chunk += ('\n\n' + paragraph if current_chunk else paragraph)
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk)
-                current_chunk = paragraph
-
-        if current_chunk:
-            chunks.append(current_chunk)
-
-        return '\n\n'.join(chunks[:3])  # Limit to first 3 chunks for faster response
-
-    async def generate_story_chunk(
+                kind = record_outcome(breaker, e, pacer)
+                if pieces or not await wait_before_retry(e, kind, attempt, self.retry_policy, deadline):
+                    raise
+                attempt += 1
+                continue
+            record_outcome(breaker, None, pacer)
+            return
+
+    def split_content(self, content: str) -> Tuple[List[str], bool]:
+        """Split content into paragraph-aligned chunks within ``PART_MAX_CHARS``.
+
+        Returns the chunks and whether the content was cut to fit.
+        """
+        return fit_chunks(iter_chunks([content], self.chunk_size), PART_MAX_CHARS)
+
+    async def prepare_context(self, context: Optional[str], youtube_urls: Optional[List[str]]) -> Optional[str]:
+        """Append processed YouTube reference material to the user's context."""
+        if not (ENABLE_YOUTUBE_REFERENCES and youtube_urls):
+            return context
+        with span('references'):
+            references = await self.reference_processor.process_youtube_references(youtube_urls)
+        if not references or references.startswith('Error'):
+            return context
+        if context:
+            return f"{context}\n\nReference material:\n{references}"
+        return f"Reference material:\n{references}"
+
+    async def summarize_part(
+        self,
+        prompt: str,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        """Run an ``LLMSummarizer`` prompt for a finished part; None if the call fails."""
+        summary = await self.safe_generate_content(prompt, use_cache, deadline, purpose='summary')
+        if summary.startswith('{"error"'):
+            return None
+        return summary
+
+    def get_summarizer(
+        self,
+        name: Optional[str] = None,
+        use_cache: bool = True,
+        deadline: Optional[Deadline] = None
+    ) -> Summarizer:
+        """Return the summarizer strategy ``name`` (default: ``SUMMARIZER``)."""
+        name = name or SUMMARIZER
+        if name == 'extractive':
+            return ExtractiveSummarizer(EXTRACTIVE_SUMMARY_WORDS)
+        if name == 'llm':
+            return LLMSummarizer(lambda prompt: self.summarize_part(prompt, use_cache, deadline))
+        raise ValueError(f"Summarizer '{name}' not supported")
+
+    def create_scheduler(
         self,
         topic: str,
         expertise: str,
         tone: str,
         context: Optional[str] = None,
-        youtube_urls: Optional[List[str]] = None,
-        part_number: int = 1,
-        total_parts: int = 1,
-        previous_parts: list[str] = None,
+        total_parts: int = 2,
         prompt_id: str = 'default',
-        writing_style: str = 'balanced'
-    ) -> str:
-        try:
-            self.validate_inputs(expertise, tone)
-            
-            # Skip YouTube processing in Vercel environment
-            youtube_content = ""
-            
-            # Get custom prompt if specified
-            custom_prompt = self.prompt_manager.get_prompt(prompt_id)
-            if custom_prompt:
-                prompt = build_story_prompt(
-                    topic, expertise, tone, context,
-                    part_number, total_parts, previous_parts,
-                    custom_template=custom_prompt['template'],
-                    writing_style=writing_style
-                )
-            else:
-                prompt = build_story_prompt(
-                    topic, expertise, tone, context,
-                    part_number, total_parts, previous_parts,
-                    writing_style=writing_style
+        writing_style: str = 'balanced',
+        pipelined: Optional[bool] = None,
+        use_cache: bool = True,
+        summarizer: Optional[str] = None,
+        time_budget: Optional[float] = MAX_EXECUTION_TIME,
+        completed_parts: Optional[Dict[int, str]] = None,
+        completed_summaries: Optional[Dict[int, str]] = None
+    ) -> PartScheduler:
+        """Create the scheduler that drives part and summary calls for one story.
+
+        ``completed_parts``/``completed_summaries`` resume from a checkpoint;
+        pass ``time_budget=None`` for work not bound to a request deadline.
+        """
+        deadline = Deadline(time_budget) if time_budget else None
+
+        async def generate_part(part: int, previous_parts: List[str]) -> AsyncIterator[str]:
+            # Stop reading the model once the part reaches its output budget
+            budget = OutputBudget(PART_MAX_CHARS)
+            async for text in budget.limit(stream_part(part, previous_parts)):
+                yield text
+            if budget.truncated:
+                scheduler.truncated_parts.add(part)
+
+        async def stream_part(part: int, previous_parts: List[str]) -> AsyncIterator[str]:
+            report = {}
+            args = (
+                topic, expertise, tone, context,
+                part, total_parts, previous_parts, prompt_id, writing_style, report
+            )
+            # Split off the stable prefix only when it can be cached
+            build = self.build_prompt_split if context_cache.enabled else self.build_prompt
+            with span('prompt_build'):
+                if TOKEN_COUNT_MODE == 'exact':
+                    # Exact counts are network calls; keep them off the event loop
+                    built = await run_blocking(build, *args)
+                else:
+                    built = build(*args)
+            prefix, suffix = built if context_cache.enabled else ('', built)
+            prompt = prefix + suffix
+            if report['dropped'] or report['trimmed']:
+                print(
+                    f"Prompt for part {part} fitted from {report['original_tokens']} to "
+                    f"{report['final_tokens']} tokens (budget {report['budget']}): "
+                    f"dropped {report['dropped']}, trimmed {report['trimmed']}"
                 )
+                scheduler.prompt_reports[part] = report
 
-            # Generate content with safety checks
-            content = await self.safe_generate_content(prompt)
-            
-            # Check if there was an error
-            try:
-                error_check = json.loads(content)
-                if isinstance(error_check, dict) and 'error' in error_check:
-                    return error_check['error']
-            except json.JSONDecodeError:
-                # Not an error message, continue processing
-                pass
+            if prefix:
+                async with context_cache.use(self.model, self.model_name, self.api_key, prefix) as cached_model:
+                    if cached_model is not None:
+                        sent = False
+                        try:
+                            async for text in self.stream_generate_content(
+                                prompt, use_cache, deadline, (cached_model, suffix)
+                            ):
+                                sent = True
+                                yield text
+                            return
+                        except Exception as e:
+                            if sent:
+                                raise
+                            # The provider may have dropped the handle; send the prompt in full
+                            print(f"Cached prefix call failed, sending full prompt: {str(e)}")
+                            context_cache.invalidate(self.model_name, self.api_key, prefix)
+            async for text in self.stream_generate_content(prompt, use_cache, deadline):
+                yield text
 
-            # Process long content if needed
-            return self.process_long_content(content)
+        scheduler = PartScheduler(
+            generate_part,
+            self.get_summarizer(summarizer, use_cache, deadline).summarize,
+            total_parts,
+            pipelined=PIPELINE_PARTS if pipelined is None else pipelined,
+            time_budget=time_budget,
+            full_part_chars=PIPELINE_FULL_PART_CHARS,
+            completed_parts=completed_parts,
+            completed_summaries=completed_summaries
+        )
+        return scheduler
 
-        except Exception as e:
-            return json.dumps({"error": f"Error generating story part {part_number}: {str(e)}"})
+    async def generate_story(
+        self,
+        topic: str,
+        expertise: str,
+        tone: str,
+        context: Optional[str] = None,
+        youtube_urls: Optional[List[str]] = None,
+        total_parts: int = 2,  # Reduced default parts
+        prompt_id: str = 'default',
+        writing_style: str = 'balanced',
+        pipelined: Optional[bool] = None,
+        use_cache: bool = True,
+        summarizer: Optional[str] = None,
+        time_budget: Optional[float] = MAX_EXECUTION_TIME
+    ) -> StoryResult:
+        """Generate all parts and return them with summaries, sizes and timings.
+
+        ``time_budget`` is as for ``create_scheduler``.
+        """
+        result = StoryResult(requested_parts=max(1, min(total_parts, MAX_STORY_PARTS)))
+        pieces = []
+
+        async for event in self.stream_complete_story(
+            topic, expertise, tone, context, youtube_urls,
+            total_parts, prompt_id, writing_style, pipelined, use_cache, summarizer, time_budget
+        ):
+            if event['event'] == 'delta':
+                pieces.append(event['text'])
+            elif event['event'] == 'part_end':
+                chunks, cut = self.split_content(''.join(pieces))
+                result.parts.append(StoryPart(
+                    event['part'], chunks,
+                    truncated=cut or event.get('truncated', False),
+                    resumed=event.get('resumed', False)
+                ))
+                pieces = []
+            elif event['event'] == 'summary':
+                result.summaries[event['part']] = event['text']
+            elif event['event'] == 'budget_exhausted':
+                result.budget_exhausted = True
+            elif event['event'] == 'error':
+                result.error = event['error']
+                return result
+            elif event['event'] == 'done':
+                result.timings = event['timings']
+
+        return result
 
     async def generate_complete_story(
         self,
@@ -125,31 +481,83 @@ class StoryGenerator:
         youtube_urls: Optional[List[str]] = None,
         total_parts: int = 2,  # Reduced default parts
         prompt_id: str = 'default',
-        writing_style: str = 'balanced'
+        writing_style: str = 'balanced',
+        pipelined: Optional[bool] = None,
+        use_cache: bool = True,
+        summarizer: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None
     ) -> str:
-        story_parts = []
-        summaries = []
+        """Generate all parts and return them joined (see ``generate_story``).
 
-        # Limit total parts in Vercel environment
-        total_parts = min(total_parts, 2)
+        If ``timings`` is given it is filled with per-stage durations in seconds.
+        """
+        result = await self.generate_story(
+            topic, expertise, tone, context, youtube_urls,
+            total_parts, prompt_id, writing_style, pipelined, use_cache, summarizer
+        )
+        if result.error:
+            return json.dumps({"error": result.error})
+        if timings is not None:
+            timings.update(result.timings)
+        return result.text
 
-        for part in range(1, total_parts + 1):
-            chunk = await self.generate_story_chunk(
-                topic, expertise, tone, context, youtube_urls,
-                part, total_parts, summaries, prompt_id, writing_style
-            )
-            
-            try:
-                error_check = json.loads(chunk)
-                if isinstance(error_check, dict) and 'error' in error_check:
-                    return json.dumps({"error": error_check['error']})
-            except json.JSONDecodeError:
-                story_parts.append(chunk)
-
-            if part < total_parts:
-                summary = await self.safe_generate_content(f"Summarize briefly: {chunk}")
-                if not summary.startswith('{"error"'):
-                    summaries.append(summary)
-                await asyncio.sleep(1)
-
-        return "\n\n".join(story_parts)
+    async def stream_complete_story(
+        self,
+        topic: str,
+        expertise: str,
+        tone: str,
+        context: Optional[str] = None,
+        youtube_urls: Optional[List[str]] = None,
+        total_parts: int = 2,
+        prompt_id: str = 'default',
+        writing_style: str = 'balanced',
+        pipelined: Optional[bool] = None,
+        use_cache: bool = True,
+        summarizer: Optional[str] = None,
+        time_budget: Optional[float] = MAX_EXECUTION_TIME
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Generate the story part by part, yielding events as text arrives.
+
+        Events are dicts with an ``event`` key: ``references`` (when YouTube
+        references are enabled), ``part_start``, ``delta`` (carrying
+        ``text``), ``part_end``, ``summary``, ``budget_exhausted``, ``done``
+        (carrying ``timings``) and ``error``.
+        """
+        total_parts = max(1, min(total_parts, MAX_STORY_PARTS))
+
+        try:
+            self.validate_inputs(expertise, tone, summarizer)
+        except ValueError as e:
+            yield {'event': 'error', 'error': str(e)}
+            return
+
+        if ENABLE_YOUTUBE_REFERENCES and youtube_urls:
+            started = time.monotonic()
+            context = await self.prepare_context(context, youtube_urls)
+            yield {'event': 'references', 'seconds': round(time.monotonic() - started, 3)}
+
+        scheduler = self.create_scheduler(
+            topic, expertise, tone, context,
+            total_parts, prompt_id, writing_style, pipelined, use_cache, summarizer,
+            time_budget=time_budget
+        )
+        async for event in scheduler.run():
+            yield event
+
+
+generator_pool = ClientPool(
+    lambda model_name, api_key: StoryGenerator(model_name, api_key),
+    CLIENT_POOL_IDLE_TIMEOUT,
+    CLIENT_POOL_MAX_SIZE
+)
+
+
+def get_story_generator(model_name: str, api_key: Optional[str] = None) -> StoryGenerator:
+    """Return a shared StoryGenerator for this model and API key.
+
+    Generators hold no per-request state, so one instance serves every
+    request made with the same key and model.
+    """
+    if model_name not in AVAILABLE_MODELS:
+        raise ValueError(f"Model {model_name} not supported")
+    return generator_pool.get(model_name, api_key)
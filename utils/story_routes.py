@@ -0,0 +1,109 @@
+from flask import Blueprint, request, jsonify, send_file
+from .client_pool import key_fingerprint
+from .config import STORY_LIST_MAX_LIMIT
+from .request_utils import get_api_key, parse_generation_request
+from .story_store import FORMATS, slugify, story_store
+from .topic_index import topic_index
+
+story_routes = Blueprint('story_routes', __name__)
+
+def _missing_key():
+    return jsonify({'error': 'API key not found. Please set up your API key first.'}), 401
+
+@story_routes.route('/stories', methods=['GET'])
+def list_stories():
+    """The caller's stored stories, newest first."""
+    if not story_store.enabled:
+        return jsonify({'error': 'The story store is disabled on this server'}), 503
+    api_key = get_api_key()
+    if not api_key:
+        return _missing_key()
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), STORY_LIST_MAX_LIMIT))
+        stories, next_cursor = story_store.list(
+            key_fingerprint(api_key),
+            limit,
+            cursor=request.args.get('cursor'),
+            topic=request.args.get('topic'),
+            model_name=request.args.get('model')
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
+    return jsonify({'stories': stories, 'next_cursor': next_cursor})
+
+@story_routes.route('/stories/similar', methods=['GET'])
+def similar_stories():
+    """The caller's stored stories close to a would-be request (same query fields as /generate)."""
+    if not story_store.enabled:
+        return jsonify({'error': 'The story store is disabled on this server'}), 503
+    api_key = get_api_key()
+    if not api_key:
+        return _missing_key()
+    if not request.args.get('topic'):
+        return jsonify({'error': 'Missing required field: topic'}), 400
+    try:
+        params = parse_generation_request(request.args.to_dict())
+        params['youtube_urls'] = request.args.getlist('youtube_urls')
+        threshold = request.args.get('threshold', type=float)
+        limit = max(1, min(int(request.args.get('limit', 5)), STORY_LIST_MAX_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'Invalid total_parts, threshold or limit'}), 400
+
+    model_name = params.pop('model_name')
+    return jsonify({
+        'stories': topic_index.find(
+            params['topic'], model_name, params, key_fingerprint(api_key), threshold, limit
+        ),
+        'index': topic_index.stats()
+    })
+
+@story_routes.route('/stories/<story_id>', methods=['GET'])
+def get_story(story_id):
+    api_key = get_api_key()
+    if not api_key:
+        return _missing_key()
+    story = story_store.get(story_id, key_fingerprint(api_key)) if story_store.enabled else None
+    if not story:
+        return jsonify({'error': 'Story not found'}), 404
+    return jsonify(story)
+
+@story_routes.route('/download/<story_id>', methods=['GET'])
+def download_stored_story(story_id):
+    """Send a stored story as txt, md or html (``?format=``), gzipped if accepted.
+
+    Supports conditional requests (ETag/If-None-Match) and byte ranges. Only
+    the story's owner can download it.
+    """
+    api_key = get_api_key()
+    if not api_key:
+        return _missing_key()
+    fmt = request.args.get('format', 'txt')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"Format must be one of: {', '.join(FORMATS)}"}), 400
+    if not story_store.enabled:
+        return jsonify({'error': 'Story not found'}), 404
+
+    owner = key_fingerprint(api_key)
+    compressed = 'gzip' in request.accept_encodings
+    found = story_store.file_for(story_id, fmt, compressed, owner)
+    if found is None and compressed:
+        compressed = False
+        found = story_store.file_for(story_id, fmt, owner=owner)
+    if found is None:
+        return jsonify({'error': 'Story not found'}), 404
+
+    path, etag, topic = found
+    mimetype, extension = FORMATS[fmt]
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=f"{slugify(topic)}.{extension}",
+        conditional=True,
+        etag=etag,
+        max_age=86400  # Stored stories never change
+    )
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,331 @@
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from .config import STORY_STORE_PATH, STORY_STORE_DIR
+from .model_client import run_blocking
+from .storage import get_connection
+import gzip
+import hashlib
+import html
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+# Download formats: mimetype and file extension
+FORMATS = {
+    'txt': ('text/plain', 'txt'),
+    'md': ('text/markdown', 'md'),
+    'html': ('text/html', 'html')
+}
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS stories (
+        id TEXT PRIMARY KEY,
+        topic TEXT NOT NULL,
+        model TEXT NOT NULL,
+        params TEXT NOT NULL,
+        parts INTEGER NOT NULL,
+        chars INTEGER NOT NULL,
+        created REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS stories_created ON stories (created, id)',
+    'CREATE INDEX IF NOT EXISTS stories_topic ON stories (topic, created)',
+    'CREATE INDEX IF NOT EXISTS stories_model ON stories (model, created)',
+    '''CREATE TABLE IF NOT EXISTS story_files (
+        story_id TEXT NOT NULL,
+        format TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        gzip_size INTEGER NOT NULL,
+        PRIMARY KEY (story_id, format)
+    )'''
+)
+
+
+def render(text: str, topic: str, fmt: str) -> bytes:
+    """Render a story as ``txt``, ``md`` or ``html``."""
+    if fmt == 'md':
+        body = f"# {topic}\n\n{text}\n"
+    elif fmt == 'html':
+        paragraphs = ''.join(
+            f"<p>{html.escape(paragraph).replace(chr(10), '<br>')}</p>\n"
+            for paragraph in text.split('\n\n') if paragraph.strip()
+        )
+        title = html.escape(topic)
+        body = (
+            f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{title}</title></head>\n'
+            f"<body>\n<h1>{title}</h1>\n{paragraphs}</body></html>\n"
+        )
+    else:
+        body = f"{text}\n"
+    return body.encode('utf-8')
+
+
+def context_digest(context: Optional[str]) -> str:
+    """Digest of a request's context, ignoring case and spacing; '' if there is none."""
+    context = ' '.join((context or '').lower().split())
+    return hashlib.sha256(context.encode('utf-8')).hexdigest()[:16] if context else ''
+
+
+def stored_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """The request parameters kept with a story.
+
+    The user's context is replaced by its digest, so it can still be
+    matched but is never stored or returned.
+    """
+    kept = {name: value for name, value in params.items() if name not in ('context', 'use_cache')}
+    kept['context_hash'] = context_digest(params.get('context'))
+    return kept
+
+
+def slugify(text: str, default: str = 'story') -> str:
+    slug = re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')[:60].strip('-')
+    return slug or default
+
+
+class StoryStore:
+    """Generated stories saved under an id, with indexed metadata.
+
+    Each story is rendered once per download format; the rendered bytes and
+    a gzip copy are written to content-addressed files under ``directory``
+    (identical renderings share one file), so downloads are served straight
+    from disk with Range and ETag support. Metadata lives in SQLite.
+
+    Every story belongs to the fingerprint of the API key that created it
+    (``owner``), and only that owner can list, read or download it.
+    """
+
+    def __init__(self, path: str, directory: str):
+        self.path = path
+        self.directory = directory
+        if self.enabled:
+            for statement in _SCHEMA:
+                self._db().execute(statement)
+            self._migrate()
+
+    def _migrate(self):
+        db = self._db()
+        columns = {row[1] for row in db.execute('PRAGMA table_info(stories)')}
+        if 'owner' not in columns:
+            # Stories saved before owners existed stay hidden from everyone,
+            # and the contexts they were saved with are dropped
+            db.execute('ALTER TABLE stories ADD COLUMN owner TEXT')
+            db.execute("UPDATE stories SET params = json_remove(params, '$.context')")
+        if 'part_chars' not in columns:
+            # JSON list of each part's length; older stories read back as one part
+            db.execute('ALTER TABLE stories ADD COLUMN part_chars TEXT')
+        db.execute('CREATE INDEX IF NOT EXISTS stories_owner ON stories (owner, created, id)')
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path and self.directory)
+
+    def _db(self):
+        return get_connection(self.path)
+
+    def blob_path(self, digest: str, fmt: str, compressed: bool = False) -> str:
+        suffix = '.gz' if compressed else ''
+        return os.path.join(self.directory, digest[:2], f"{digest}.{FORMATS[fmt][1]}{suffix}")
+
+    def _write_blob(self, path: str, data: bytes):
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def save(
+        self, parts: List[str], topic: str, model_name: str, params: Dict[str, Any], owner: str
+    ) -> str:
+        """Store a story's parts for ``owner`` and return its id."""
+        story_id = uuid.uuid4().hex
+        text = '\n\n'.join(parts)
+        topic = topic or ''
+        files = []
+        for fmt in FORMATS:
+            data = render(text, topic, fmt)
+            digest = hashlib.sha256(data).hexdigest()
+            compressed = gzip.compress(data, compresslevel=6, mtime=0)
+            self._write_blob(self.blob_path(digest, fmt), data)
+            self._write_blob(self.blob_path(digest, fmt, compressed=True), compressed)
+            files.append((story_id, fmt, digest, len(data), len(compressed)))
+
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'INSERT INTO stories (id, topic, model, params, parts, chars, created, owner, part_chars) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (story_id, topic, model_name, json.dumps(stored_params(params), sort_keys=True),
+                 len(parts), len(text), time.time(), owner, json.dumps([len(part) for part in parts]))
+            )
+            db.executemany(
+                'INSERT INTO story_files (story_id, format, hash, size, gzip_size) '
+                'VALUES (?, ?, ?, ?, ?)', files
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return story_id
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        story_id, topic, model, params, parts, chars, created = row
+        params = {name: value for name, value in json.loads(params).items() if name != 'context_hash'}
+        return {
+            'id': story_id, 'topic': topic, 'model': model, 'params': params,
+            'parts': parts, 'chars': chars, 'created': created
+        }
+
+    def get(self, story_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        row = self._db().execute(
+            'SELECT id, topic, model, params, parts, chars, created FROM stories '
+            'WHERE id = ? AND owner = ?', (story_id, owner)
+        ).fetchone()
+        if not row:
+            return None
+        story = self._row(row)
+        story['formats'] = {
+            fmt: {'size': size, 'gzip_size': gzip_size}
+            for fmt, size, gzip_size in self._db().execute(
+                'SELECT format, size, gzip_size FROM story_files WHERE story_id = ?', (story_id,)
+            )
+        }
+        return story
+
+    def list(
+        self,
+        owner: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        topic: Optional[str] = None,
+        model_name: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """``owner``'s newest stories first; returns a page and the cursor for the next one.
+
+        Raises ValueError for a malformed cursor.
+        """
+        clauses, args = ['owner = ?'], [owner]
+        if topic:
+            clauses.append('topic = ?')
+            args.append(topic)
+        if model_name:
+            clauses.append('model = ?')
+            args.append(model_name)
+        if cursor:
+            created, _, story_id = cursor.partition(':')
+            created = float(created)
+            clauses.append('(created < ? OR (created = ? AND id < ?))')
+            args += [created, created, story_id]
+        where = f"WHERE {' AND '.join(clauses)}"
+        rows = self._db().execute(
+            'SELECT id, topic, model, params, parts, chars, created FROM stories '
+            f'{where} ORDER BY created DESC, id DESC LIMIT ?', (*args, limit + 1)
+        ).fetchall()
+        stories = [self._row(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = stories[-1]
+            next_cursor = f"{last['created']!r}:{last['id']}"
+        return stories, next_cursor
+
+    def file_for(
+        self, story_id: str, fmt: str, compressed: bool = False, owner: Optional[str] = None
+    ) -> Optional[Tuple[str, str, str]]:
+        """Return ``(path, etag, topic)`` for a stored rendering, or None.
+
+        With ``owner``, only that owner's stories are found.
+        """
+        query = (
+            'SELECT f.hash, s.topic FROM story_files f JOIN stories s ON s.id = f.story_id '
+            'WHERE f.story_id = ? AND f.format = ?'
+        )
+        args = (story_id, fmt)
+        if owner is not None:
+            query += ' AND s.owner = ?'
+            args += (owner,)
+        row = self._db().execute(query, args).fetchone()
+        if not row:
+            return None
+        digest, topic = row
+        path = self.blob_path(digest, fmt, compressed)
+        if not os.path.exists(path):
+            return None
+        return path, digest + ('-gz' if compressed else ''), topic
+
+    def text(self, story_id: str) -> Optional[str]:
+        """The stored story's text, or None."""
+        found = self.file_for(story_id, 'txt')
+        if found is None:
+            return None
+        with open(found[0], 'rb') as f:
+            return f.read().decode('utf-8')[:-1]  # render() adds a final newline
+
+    def part_texts(self, story_id: str) -> Optional[List[str]]:
+        """The stored story's parts as they were saved, or None."""
+        row = self._db().execute('SELECT part_chars FROM stories WHERE id = ?', (story_id,)).fetchone()
+        text = self.text(story_id) if row else None
+        if text is None:
+            return None
+        if not row[0]:
+            return [text]
+        parts, start = [], 0
+        for length in json.loads(row[0]):
+            parts.append(text[start:start + length])
+            start += length + 2  # the blank line between parts
+        return parts
+
+    def rows_after(self, rowid: int, limit: int) -> List[Tuple[int, str, str, str, Dict[str, Any], Optional[str]]]:
+        """``(rowid, id, topic, model, params, owner)`` of stories saved after ``rowid``, oldest first."""
+        rows = self._db().execute(
+            'SELECT rowid, id, topic, model, params, owner FROM stories '
+            'WHERE rowid > ? ORDER BY rowid LIMIT ?', (rowid, limit)
+        ).fetchall()
+        return [(row[0], row[1], row[2], row[3], json.loads(row[4]), row[5]) for row in rows]
+
+
+async def store_streamed_story(
+    events: AsyncIterator[Dict[str, Any]],
+    store: StoryStore,
+    model_name: str,
+    params: Dict[str, Any],
+    owner: str,
+    on_saved: Optional[Callable[[str], Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Pass story events through and save the finished story for ``owner``.
+
+    A ``stored`` event carrying ``story_id`` is sent just before ``done``.
+    ``on_saved(story_id)`` is called after the save, if given.
+    """
+    parts: List[str] = []
+    pieces: List[str] = []
+    async for event in events:
+        if event['event'] == 'delta':
+            pieces.append(event['text'])
+        elif event['event'] == 'part_end':
+            parts.append(''.join(pieces).strip())
+            pieces = []
+        elif event['event'] == 'done' and parts and store.enabled:
+            try:
+                story_id = await run_blocking(
+                    store.save, parts, params.get('topic'), model_name, params, owner
+                )
+                if on_saved is not None:
+                    await run_blocking(on_saved, story_id)
+                yield {'event': 'stored', 'story_id': story_id}
+            except Exception as e:
+                print(f"Story store write failed: {str(e)}")
+        yield event
+
+
+story_store = StoryStore(STORY_STORE_PATH, STORY_STORE_DIR)
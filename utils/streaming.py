@@ -0,0 +1,65 @@
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+import asyncio
+import json
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a single Server-Sent Event frame."""
+    payload = json.dumps(data, ensure_ascii=False)
+    lines = ''.join(f"data: {line}\n" for line in payload.splitlines() or [''])
+    return f"event: {event}\n{lines}\n"
+
+
+class SSEStream:
+    """Server-Sent Events body over an async event generator.
+
+    Iterating it synchronously (WSGI) drives the generator on a private
+    event loop; iterating it asynchronously (ASGI, see ``asgi_server``)
+    runs it on the server's loop instead. Each event dict must carry an
+    ``event`` key naming the SSE event type; the remaining keys are sent as
+    the JSON payload.
+    """
+
+    def __init__(self, events: AsyncIterator[Dict[str, Any]]):
+        self.events = events
+        self._sync: Optional[Iterator[str]] = None
+
+    def __iter__(self) -> Iterator[str]:
+        self._sync = self._iter_sync()
+        return self._sync
+
+    def close(self):
+        # Called by the WSGI server, also when the client disconnects
+        if self._sync is not None:
+            self._sync.close()
+
+    def _iter_sync(self) -> Iterator[str]:
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                try:
+                    event = loop.run_until_complete(self.events.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield _frame(event)
+        finally:
+            # Runs on completion and when the client disconnects mid-stream.
+            loop.run_until_complete(self.events.aclose())
+            loop.close()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        try:
+            async for event in self.events:
+                yield _frame(event)
+        finally:
+            await self.events.aclose()
+
+
+def _frame(event: Dict[str, Any]) -> str:
+    event = dict(event)
+    return format_sse(event.pop('event'), event)
+
+
+def iter_sse(events: AsyncIterator[Dict[str, Any]]) -> SSEStream:
+    """Wrap an async event generator as a response body for WSGI or ASGI."""
+    return SSEStream(events)
@@ -1,6 +1,9 @@
-def generate_summary(text: str, model) -> str:
-    try:
-        summary_prompt = f"""
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Awaitable, Callable, Optional
+import re
+
+SUMMARY_PROMPT = """
         Create a concise summary (maximum 400 words) of the following content segment.
         Focus on:
         1. Key points and main arguments presented
@@ -18,7 +21,96 @@ def generate_summary(text: str, model) -> str:
         
         Provide a focused summary that highlights the unique contributions of this segment and sets up for the next part.
         """
-        summary = model.generate_content(summary_prompt).text
-        return summary
-    except Exception as e:
-        return f"Summary unavailable: {str(e)}"
\ No newline at end of file
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(])')
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers herself him himself his how i if in into is it
+its itself just me more most my myself no nor not now of off on once only or other our ours
+ourselves out over own same she should so some such than that the their theirs them
+themselves then there these they this those through to too under until up very was we were
+what when where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+
+def extractive_summary(text: str, max_words: int = 150) -> str:
+    """Pick the most representative sentences of ``text``, in their original order.
+
+    Sentences are scored by the average document frequency of their content
+    words, with a bonus for the opening and closing sentences; the best ones
+    are kept until ``max_words`` is reached. No model call is made.
+    """
+    sentences = [' '.join(s.split()) for s in _SENTENCE_END.split(text.strip()) if s.strip()]
+    if not sentences:
+        return ''
+
+    sentence_words = [
+        [word for word in _WORD.findall(sentence.lower()) if word not in _STOPWORDS]
+        for sentence in sentences
+    ]
+    frequencies = Counter(word for words in sentence_words for word in words)
+    top = max(frequencies.values(), default=1)
+
+    scores = []
+    last = len(sentences) - 1
+    for index, words in enumerate(sentence_words):
+        score = sum(frequencies[word] for word in words) / (top * (len(words) + 1)) if words else 0.0
+        if index == 0 or index == last:
+            score *= 1.5
+        scores.append(score)
+
+    chosen = []
+    used = 0
+    for index in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+        length = len(sentences[index].split())
+        if chosen and used + length > max_words:
+            continue
+        chosen.append(index)
+        used += length
+        if used >= max_words:
+            break
+    return ' '.join(sentences[index] for index in sorted(chosen))
+
+
+class Summarizer(ABC):
+    """Strategy for condensing a finished part into context for later parts."""
+
+    name = 'base'
+
+    @abstractmethod
+    async def summarize(self, text: str) -> Optional[str]:
+        """Return the summary of ``text``, or None if there is none."""
+
+
+class LLMSummarizer(Summarizer):
+    """Asks the model for the summary (one extra call per summarized part).
+
+    ``generate`` sends ``prompt``, filled in with the part's text, to the model.
+    """
+
+    name = 'llm'
+
+    def __init__(
+        self,
+        generate: Callable[[str], Awaitable[Optional[str]]],
+        prompt: str = SUMMARY_PROMPT
+    ):
+        self.generate = generate
+        self.prompt = prompt
+
+    async def summarize(self, text: str) -> Optional[str]:
+        return await self.generate(self.prompt.format(text=text))
+
+
+class ExtractiveSummarizer(Summarizer):
+    """Local sentence-scoring summary; no network round-trip."""
+
+    name = 'extractive'
+
+    def __init__(self, max_words: int = 150):
+        self.max_words = max_words
+
+    async def summarize(self, text: str) -> Optional[str]:
+        return extractive_summary(text, self.max_words) or None
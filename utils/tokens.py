@@ -0,0 +1,86 @@
+from typing import List
+from .config import MODEL_LIMITS, PROMPT_TOKEN_BUDGET
+
+# Rough size of one token in characters for English prose
+CHARS_PER_TOKEN = 4
+
+# Boundaries to split at, from coarsest to finest
+_SEPARATORS = ('\n\n', '\n', '. ', ' ')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, offline token estimate (about four characters per token)."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_tokens(text: str, model=None) -> int:
+    """Exact token count from the model's tokenizer, or the estimate without one.
+
+    Falls back to the estimate if the count call fails.
+    """
+    if model is None:
+        return estimate_tokens(text)
+    try:
+        return model.count_tokens(text).total_tokens
+    except Exception as e:
+        print(f"Token count failed, using estimate: {str(e)}")
+        return estimate_tokens(text)
+
+
+def prompt_budget(model_name: str) -> int:
+    """Tokens a story prompt may use: the configured budget, capped so the
+    prompt plus a full-length answer fits the model's context window."""
+    limits = MODEL_LIMITS.get(model_name)
+    if not limits:
+        return PROMPT_TOKEN_BUDGET
+    return min(PROMPT_TOKEN_BUDGET, limits['context_tokens'] - limits['output_tokens'])
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to roughly ``max_tokens``, preferring a word boundary."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(' ', 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip()
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """Split ``text`` into chunks of at most ``max_tokens`` (estimated).
+
+    Chunks break at paragraph, line, sentence or word boundaries, trying the
+    coarsest first; a single word longer than the budget is hard-cut.
+    """
+    text = text.strip()
+    if estimate_tokens(text) <= max_tokens:
+        return [text] if text else []
+    return _split(text, max_tokens * CHARS_PER_TOKEN, 0)
+
+
+def _split(text: str, limit: int, level: int) -> List[str]:
+    if len(text) <= limit:
+        return [text]
+    if level == len(_SEPARATORS):
+        return [text[i:i + limit] for i in range(0, len(text), limit)]
+
+    separator = _SEPARATORS[level]
+    chunks = []
+    current = ''
+    for piece in text.split(separator):
+        if len(piece) > limit:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.extend(_split(piece, limit, level + 1))
+        elif not current:
+            current = piece
+        elif len(current) + len(separator) + len(piece) <= limit:
+            current += separator + piece
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
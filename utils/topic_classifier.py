@@ -0,0 +1,174 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from .config import TOPIC_TAXONOMY_PATH, TOPIC_CLASSIFIER_CACHE_SIZE
+import json
+import os
+import re
+import threading
+import unicodedata
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def topic_words(text: str) -> List[str]:
+    """Lowercase ASCII words of ``text`` with a plural 's' removed.
+
+    Keywords and topics go through the same function, so "Algorithms"
+    matches the keyword "algorithm" and "e-commerce" matches "e commerce".
+    """
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').lower()
+    words = []
+    for word in _TOKEN.findall(text):
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+class TopicClassifier:
+    """Scores topics against a keyword taxonomy with an Aho-Corasick automaton.
+
+    The automaton runs over words rather than characters, so keywords only
+    match whole words ("art" does not match "start") and phrases match
+    consecutive words. One pass over the topic finds every keyword, so the
+    cost depends on the topic's length, not on the size of the taxonomy.
+    Where keywords overlap only the longest counts ("machine learning", not
+    also "learning"). Each category scores the sum of its matched keywords'
+    weights; the best score wins, ties going to the category listed first.
+
+    ``taxonomy`` maps category names to ``{keyword: weight}``.
+    """
+
+    def __init__(
+        self,
+        taxonomy: Dict[str, Dict[str, float]],
+        default: str = 'general',
+        cache_size: int = 4096
+    ):
+        self.default = default
+        self.categories = list(taxonomy)
+        # Node i: _goto[i] maps a word to the next node, _fail[i] is the
+        # longest proper suffix node, _output[i] lists (length, weights)
+        # for keywords ending here (own first, then via fail links)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, Dict[str, float]]]] = [[]]
+        phrases: Dict[Tuple[str, ...], Dict[str, float]] = {}
+        for category, keywords in taxonomy.items():
+            for keyword, weight in keywords.items():
+                words = tuple(topic_words(keyword))
+                if words:
+                    scores = phrases.setdefault(words, {})
+                    # Spellings that normalize alike ("art", "arts") count once
+                    scores[category] = max(scores.get(category, 0), float(weight))
+        for words, scores in phrases.items():
+            self._insert(words, scores)
+        self.keywords = len(phrases)
+        self._link()
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, Dict[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str, cache_size: int = 4096) -> 'TopicClassifier':
+        """Load a taxonomy file: ``{"default": ..., "categories": {name: {keyword: weight}}}``."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['categories'], data.get('default', 'general'), cache_size)
+
+    def _insert(self, words: Tuple[str, ...], scores: Dict[str, float]):
+        node = 0
+        for word in words:
+            following = self._goto[node].get(word)
+            if following is None:
+                following = len(self._goto)
+                self._goto[node][word] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = following
+        self._output[node].append((len(words), scores))
+
+    def _link(self):
+        # Breadth-first, so a node's fail target is finished before the node
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for word, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+                queue.append(child)
+
+    def _matches(self, words: List[str]) -> List[Tuple[int, int, Dict[str, float]]]:
+        """``(start, end, weights)`` of every keyword occurrence in ``words``."""
+        matches = []
+        node = 0
+        for end, word in enumerate(words, 1):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for length, scores in self._output[node]:
+                matches.append((end - length, end, scores))
+        return matches
+
+    def _score(self, topic: str) -> Dict[str, float]:
+        matches = self._matches(topic_words(topic))
+        # Longest keywords first; shorter ones inside them are skipped
+        matches.sort(key=lambda match: (match[0] - match[1], match[0]))
+        taken = set()
+        totals: Dict[str, float] = {}
+        for start, end, scores in matches:
+            span = range(start, end)
+            if taken.intersection(span):
+                continue
+            taken.update(span)
+            for category, weight in scores.items():
+                totals[category] = totals.get(category, 0) + weight
+        return totals
+
+    def scores(self, topic: str) -> Dict[str, float]:
+        """Category scores for ``topic`` (only categories with a match)."""
+        key = topic.strip().lower()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return dict(cached)
+        totals = self._score(key)
+        if self.cache_size:
+            with self._lock:
+                self._cache[key] = totals
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return dict(totals)
+
+    def classify(self, topic: str) -> str:
+        totals = self.scores(topic)
+        if not totals:
+            return self.default
+        best = max(totals.values())
+        return next(category for category in self.categories if totals.get(category) == best)
+
+
+_classifier: Optional[TopicClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier() -> TopicClassifier:
+    """The classifier for ``TOPIC_TAXONOMY_PATH``, built on first use."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            if os.path.exists(TOPIC_TAXONOMY_PATH):
+                _classifier = TopicClassifier.from_file(TOPIC_TAXONOMY_PATH, TOPIC_CLASSIFIER_CACHE_SIZE)
+            else:
+                print(f"Topic taxonomy {TOPIC_TAXONOMY_PATH} not found; every topic is 'general'")
+                _classifier = TopicClassifier({}, cache_size=0)
+        return _classifier
+
+
+def get_topic_category(topic: str) -> str:
+    """Determine the most likely category for a given topic."""
+    return get_classifier().classify(topic)
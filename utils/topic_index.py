@@ -0,0 +1,281 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from .background import background_loop
+from .config import (
+    TOPIC_REUSE, TOPIC_REUSE_MODES, TOPIC_MATCH_THRESHOLD, TOPIC_LSH_BANDS, TOPIC_LSH_ROWS,
+    TOPIC_INDEX_REFRESH, TOPIC_INDEX_BATCH
+)
+from .model_client import run_blocking
+from .story_store import StoryStore, context_digest, story_store
+from .topic_classifier import topic_words
+import asyncio
+import hashlib
+import json
+import random
+import threading
+
+_STOPWORDS = frozenset(
+    'a an and are as at be by for from how in into is it its of on or the their to what '
+    'when where which who why with about'.split()
+)
+_PRIME = (1 << 61) - 1
+
+# Parameters that must match exactly for a stored story to be reused
+MATCH_PARAMS = ('expertise', 'tone', 'writing_style', 'prompt_id', 'total_parts', 'summarizer')
+
+
+def normalize_topic(topic: str) -> Tuple[str, ...]:
+    """Reduce a topic to its sorted content words.
+
+    Case, accents, punctuation, spacing, word order, stop words and plural
+    's' are ignored: "AI in Education " and "education, AI" both become
+    ('ai', 'education').
+    """
+    return tuple(sorted(set(topic_words(topic)) - _STOPWORDS))
+
+
+def fingerprint(model_name: str, params: Dict[str, Any], owner: str) -> str:
+    """Digest of everything besides the topic that shapes a story, and its owner.
+
+    ``params`` are a request's (with ``context``) or a stored story's (with
+    ``context_hash``; see ``stored_params``). ``owner`` is the API key
+    fingerprint, so stories only ever match requests from the same key.
+    """
+    if 'context' in params:
+        context = context_digest(params['context'])
+    else:
+        context = params.get('context_hash', '')
+    key = {name: params.get(name) for name in MATCH_PARAMS}
+    key.update(
+        owner=owner,
+        model=model_name,
+        context=context,
+        youtube_urls=sorted(params.get('youtube_urls') or [])
+    )
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def jaccard(a: Tuple[str, ...], b: Tuple[str, ...]) -> float:
+    if not a and not b:
+        return 1.0
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b)
+
+
+class TopicIndex:
+    """MinHash/LSH index of stored stories' topics, per parameter fingerprint.
+
+    A topic's words are MinHashed into ``bands * rows`` values; stories that
+    agree on all values of at least one band (and on the fingerprint) are
+    candidates, and candidates are confirmed by their exact Jaccard
+    similarity. Lookups touch ``bands`` dict entries plus the candidates, so
+    their cost does not grow with the number of stories.
+
+    The index fills incrementally from the story store in the background
+    (``start``), then polls for stories saved by other workers. Stories
+    without an owner are not indexed.
+    """
+
+    def __init__(
+        self,
+        store: StoryStore,
+        threshold: float = 0.6,
+        bands: int = 12,
+        rows: int = 3,
+        refresh_interval: float = 30,
+        batch_size: int = 5000
+    ):
+        self.store = store
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        rng = random.Random(1)
+        self._coefficients = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(bands * rows)
+        ]
+        # Entry id -> (story id, topic words); band key -> entry id or list of ids
+        self._entries: List[Tuple[str, Tuple[str, ...]]] = []
+        self._buckets: Dict[int, Any] = {}
+        self._word_cache: Dict[str, Tuple[int, ...]] = {}
+        self._last_rowid = 0
+        self._started = False
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+
+    def _word_hashes(self, word: str) -> Tuple[int, ...]:
+        cached = self._word_cache.get(word)
+        if cached is None:
+            h = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'big')
+            cached = tuple((a * h + b) % _PRIME for a, b in self._coefficients)
+            if len(self._word_cache) >= 100000:
+                self._word_cache.clear()
+            self._word_cache[word] = cached
+        return cached
+
+    def _band_keys(self, words: Tuple[str, ...], fingerprint: str) -> List[int]:
+        # Topic vocabularies are small, so each word's hashes are computed once
+        signature = [min(column) for column in zip(*map(self._word_hashes, words or ('',)))]
+        return [
+            hash((fingerprint, band, *signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def add(self, story_id: str, topic: str, model_name: str, params: Dict[str, Any], owner: str):
+        words = normalize_topic(topic)
+        keys = self._band_keys(words, fingerprint(model_name, params, owner))
+        with self._lock:
+            entry = len(self._entries)
+            self._entries.append((story_id, words))
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    # Most buckets hold one story; lists only on collision
+                    self._buckets[key] = entry
+                elif isinstance(bucket, list):
+                    bucket.append(entry)
+                else:
+                    self._buckets[key] = [bucket, entry]
+
+    def find(
+        self,
+        topic: str,
+        model_name: str,
+        params: Dict[str, Any],
+        owner: str,
+        threshold: Optional[float] = None,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """``owner``'s stored stories with the same parameters and a similar topic, best first."""
+        threshold = self.threshold if threshold is None else threshold
+        words = normalize_topic(topic)
+        keys = self._band_keys(words, fingerprint(model_name, params, owner))
+        candidates = set()
+        with self._lock:
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                if isinstance(bucket, list):
+                    candidates.update(bucket)
+                else:
+                    candidates.add(bucket)
+            found = [self._entries[entry] for entry in candidates]
+        matches = {}
+        for story_id, stored_words in found:
+            similarity = jaccard(words, stored_words)
+            if similarity >= threshold:
+                matches[story_id] = similarity
+        best = sorted(matches.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{'story_id': story_id, 'similarity': round(similarity, 3)} for story_id, similarity in best]
+
+    def _load_batch(self) -> int:
+        rows = self.store.rows_after(self._last_rowid, self.batch_size)
+        for rowid, story_id, topic, model_name, params, owner in rows:
+            if owner:
+                self.add(story_id, topic, model_name, params, owner)
+            self._last_rowid = rowid
+        return len(rows)
+
+    def refresh(self, *_) -> bool:
+        """Index the stories saved since the last refresh.
+
+        Returns False at once if another thread is already loading; that thread
+        picks the new stories up.
+        """
+        if not self._loading.acquire(blocking=False):
+            return False
+        try:
+            while self._load_batch() == self.batch_size:
+                pass
+        finally:
+            self._loading.release()
+        return True
+
+    def start(self):
+        """Load the index in the background and keep it in sync (idempotent)."""
+        if self._started or not self.store.enabled:
+            return
+        self._started = True
+        background_loop.submit(self._sync())
+
+    async def _sync(self):
+        while True:
+            try:
+                if await run_blocking(self.refresh) and not self.loaded:
+                    self.loaded = True
+                    print(f"Topic index loaded: {len(self._entries)} stories")
+            except Exception as e:
+                print(f"Topic index refresh failed: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'stories': len(self._entries),
+                'buckets': len(self._buckets),
+                'loaded': self.loaded,
+                'threshold': self.threshold
+            }
+
+
+def reuse_mode(requested: Optional[str]) -> str:
+    """The request's reuse mode if valid, else the configured default."""
+    return requested if requested in TOPIC_REUSE_MODES else TOPIC_REUSE
+
+
+async def find_reusable(
+    index: TopicIndex,
+    topic: str,
+    model_name: str,
+    params: Dict[str, Any],
+    owner: str,
+    mode: str
+) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Dict[str, Any], List[str]]]]:
+    """Look up ``owner``'s stored near-duplicates of a request.
+
+    Returns the matches to offer and, in 'serve' mode, the best match with
+    its parts. Requests with ``use_cache`` off are never served a match.
+    """
+    if mode == 'off' or not index.store.enabled:
+        return [], None
+    similar = index.find(topic, model_name, params, owner)
+    if mode != 'serve' or not params.get('use_cache', True):
+        return similar, None
+    for match in similar:
+        parts = await run_blocking(index.store.part_texts, match['story_id'])
+        if parts is not None:
+            return similar, (match, parts)
+    return similar, None
+
+
+async def replay_story(match: Dict[str, Any], parts: List[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Stream events for a stored story, part by part, shaped like a generated one."""
+    yield {'event': 'reused', **match}
+    for number, text in enumerate(parts, 1):
+        yield {'event': 'part_start', 'part': number, 'total_parts': len(parts)}
+        yield {'event': 'delta', 'part': number, 'text': text}
+        yield {'event': 'part_end', 'part': number, 'chars': len(text)}
+    yield {'event': 'stored', 'story_id': match['story_id']}
+    yield {'event': 'done', 'total_parts': len(parts), 'timings': {}}
+
+
+async def offer_similar(
+    similar: List[Dict[str, Any]],
+    events: AsyncIterator[Dict[str, Any]]
+) -> AsyncIterator[Dict[str, Any]]:
+    """Send a ``similar`` event listing stored near-duplicates, then the story's events."""
+    yield {'event': 'similar', 'stories': similar}
+    async for event in events:
+        yield event
+
+
+topic_index = TopicIndex(
+    story_store,
+    threshold=TOPIC_MATCH_THRESHOLD,
+    bands=TOPIC_LSH_BANDS,
+    rows=TOPIC_LSH_ROWS,
+    refresh_interval=TOPIC_INDEX_REFRESH,
+    batch_size=TOPIC_INDEX_BATCH
+)
@@ -1,28 +1,22 @@
 from pytube import YouTube
+from typing import NamedTuple, Optional
+from .metrics import span
 import re
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse
 
-def is_valid_youtube_url(url: str) -> bool:
-    """Validate if the URL is a valid YouTube video URL."""
+class VideoContent(NamedTuple):
+    video_id: str
+    title: str
+    description: str
+    captions: Optional[str]
+
+def is_youtube_url(url: str) -> bool:
+    """Check the URL's shape (domain and video ID) without any network access."""
     try:
-        # Parse the URL
         parsed_url = urlparse(url)
-        
-        # Check if domain is youtube.com or youtu.be
         if not ('youtube.com' in parsed_url.netloc or 'youtu.be' in parsed_url.netloc):
             return False
-            
-        # Get video ID
-        video_id = extract_video_id(url)
-        if not video_id:
-            return False
-            
-        # Try to initialize YouTube object to verify video exists
-        yt = YouTube(url)
-        # Access title to verify video is accessible
-        _ = yt.title
-        return True
-        
+        return bool(extract_video_id(url))
     except Exception:
         return False
 
@@ -40,27 +34,42 @@ def extract_video_id(url: str) -> str:
             return match.group(1)
     return None
 
-def get_video_content(url: str) -> str:
-    """Get video content from YouTube URL."""
-    if not is_valid_youtube_url(url):
-        return "Error: Invalid or inaccessible YouTube URL"
-        
-    try:
+def fetch_video(url: str) -> VideoContent:
+    """Fetch title, description and English captions with a single YouTube object.
+
+    Raises ValueError for malformed URLs; pytube errors propagate.
+    """
+    if not is_youtube_url(url):
+        raise ValueError("Invalid YouTube URL")
+
+    with span('youtube_fetch'):
         yt = YouTube(url)
-        content = []
-        
-        # Get title and description
-        content.append(f"Title: {yt.title}")
-        content.append(f"Description: {yt.description}")
-        
-        # Get captions if available
+        # Accessing the title loads the metadata and verifies the video exists
+        title = yt.title
+        captions = None
         try:
-            captions = yt.captions.get_by_language_code('en')
-            if captions:
-                content.append(captions.generate_srt_captions())
-        except:
+            caption_track = yt.captions.get_by_language_code('en')
+            if caption_track:
+                captions = caption_track.generate_srt_captions()
+        except Exception:
             pass
-            
-        return "\n".join(content)
-    except Exception as e:
-        return f"Error getting video content: {str(e)}"
\ No newline at end of file
+    return VideoContent(extract_video_id(url), title, yt.description or '', captions)
+
+_SRT_TIMESTAMP = re.compile(r'^\d{1,2}:\d{2}:\d{2}[,.]\d{3}\s*-->')
+_MARKUP = re.compile(r'<[^>]+>')
+
+def strip_srt(srt: str) -> str:
+    """Reduce SRT captions to their spoken text.
+
+    Drops cue numbers, timestamps and markup, and the repeated lines that
+    auto-generated captions carry over from one cue to the next.
+    """
+    lines = []
+    for line in srt.splitlines():
+        line = _MARKUP.sub('', line).strip()
+        if not line or line.isdigit() or _SRT_TIMESTAMP.match(line):
+            continue
+        if lines and lines[-1] == line:
+            continue
+        lines.append(line)
+    return ' '.join(lines)